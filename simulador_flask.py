@@ -1,17 +1,1835 @@
-from flask import Flask, render_template, request, jsonify, redirect
+from flask import Flask, render_template, request, jsonify, redirect, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 import numpy as np
 import control as ctl
 import scipy.signal  # Adicione esta linha junto com os outros imports
+import scipy.linalg
+import scipy.fft
+import scipy.optimize
+import scipy.spatial
+import scipy.sparse
+import scipy.sparse.linalg
 import io
+import os
 import base64
 import matplotlib
 matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import smtplib
 from email.mime.text import MIMEText
+import hashlib
+import re
+import json
+import threading
+import time
+import uuid
+import queue
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
 
 app = Flask(__name__)
 
+
+class ProvedorJSON(DefaultJSONProvider):
+    """Serializa arrays e escalares do NumPy, para as rotas devolverem arrays sem .tolist()."""
+    @staticmethod
+    def default(o):
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        if isinstance(o, np.generic):
+            return o.item()
+        return DefaultJSONProvider.default(o)
+
+
+app.json = ProvedorJSON(app)
+
+
+# ---------------------------------------------------------------------------
+# Camada de modelos LTI
+# Todas as rotas montam planta/controlador a partir das mesmas listas de polos,
+# zeros e ganhos. Os modelos são colocados em forma canônica, identificados por
+# um hash do conteúdo e guardados num cache LRU com expiração, de modo que uma
+# mesma interação (várias requisições com os mesmos parâmetros) monte o sistema
+# uma única vez.
+# ---------------------------------------------------------------------------
+
+class CacheLRU:
+    """
+    Cache LRU limitado em número de itens (e, opcionalmente, em bytes para
+    valores bytes/str) e com expiração por inatividade (TTL).
+    Seguro para uso por várias threads.
+    """
+    def __init__(self, max_itens=256, ttl=600, max_bytes=None):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            valor, instante = item
+            agora = time.monotonic()
+            if agora - instante > self.ttl:
+                self._descartar(chave)
+                return None
+            self._dados[chave] = (valor, agora)
+            self._dados.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._inserir(chave, valor)
+        return valor
+
+    def obter_ou_criar(self, chave, fabrica):
+        valor = self.obter(chave)
+        if valor is None:
+            novo = fabrica()
+            with self._lock:
+                # Outra thread pode ter criado o mesmo item enquanto isso
+                item = self._dados.get(chave)
+                valor = item[0] if item is not None else novo
+                self._inserir(chave, valor)
+        return valor
+
+    def _inserir(self, chave, valor):
+        if chave in self._dados:
+            self._descartar(chave)
+        self._dados[chave] = (valor, time.monotonic())
+        self.bytes += self._tamanho(valor)
+        while len(self._dados) > self.max_itens or (
+                self.max_bytes is not None and self.bytes > self.max_bytes and len(self._dados) > 1):
+            self._descartar(next(iter(self._dados)))
+
+    def _descartar(self, chave):
+        valor, _ = self._dados.pop(chave)
+        self.bytes -= self._tamanho(valor)
+
+    @staticmethod
+    def _tamanho(valor):
+        return len(valor) if isinstance(valor, (bytes, str)) else 0
+
+    def remover(self, chave):
+        with self._lock:
+            if chave in self._dados:
+                self._descartar(chave)
+
+    def __len__(self):
+        return len(self._dados)
+
+
+def _canonizar_raizes(raizes):
+    # A ordem das raízes não altera o polinômio; -0.0 vira 0.0
+    return tuple(sorted(round(float(r), 12) + 0.0 for r in raizes))
+
+
+def _hash_conteudo(*partes):
+    return hashlib.sha1(repr(partes).encode()).hexdigest()[:16]
+
+
+def _poly(raizes, ganho=1.0):
+    coeffs = ganho * np.atleast_1d(np.poly(raizes)) if raizes else np.array([float(ganho)])
+    coeffs.flags.writeable = False
+    return coeffs
+
+
+# Itens memorizados por grade (ω ou T) guardados em cada modelo, família ou fator
+MAX_GRADES_MEMO = 8
+
+
+class _Memorizador:
+    """Base dos objetos que memorizam itens derivados (ver _memo e _memo_grade)."""
+    def __init__(self):
+        self._derivados = {}
+        self._travas = {}
+        self._lock = threading.Lock()
+        self._por_grade = CacheLRU(max_itens=MAX_GRADES_MEMO, ttl=600)
+
+    def _memo(self, nome, fabrica):
+        # Uma trava por item derivado: análises paralelas sobre o mesmo modelo
+        # calculam cada objeto uma única vez, sem serializar itens diferentes.
+        valor = self._derivados.get(nome)
+        if valor is None:
+            with self._lock:
+                trava = self._travas.setdefault(nome, threading.Lock())
+            with trava:
+                valor = self._derivados.get(nome)
+                if valor is None:
+                    valor = fabrica()
+                    self._derivados[nome] = valor
+        return valor
+
+    def _memo_grade(self, nome, grade, fabrica):
+        # Itens que dependem da grade pedida (ω ou T) variam de requisição para
+        # requisição: ficam num LRU limitado, e não no dict que nunca esvazia.
+        # Mesma trava por item do _memo; ela sai do dict assim que o valor está
+        # no LRU (quem chegar depois já o encontra lá).
+        chave = "%s_%s" % (nome, _hash_conteudo(grade.tobytes()))
+        valor = self._por_grade.obter(chave)
+        if valor is None:
+            with self._lock:
+                trava = self._travas.setdefault(chave, threading.Lock())
+            with trava:
+                valor = self._por_grade.obter(chave)
+                if valor is None:
+                    valor = self._por_grade.guardar(chave, fabrica())
+            with self._lock:
+                self._travas.pop(chave, None)
+        return valor
+
+
+class FatorLTI(_Memorizador):
+    """Um fator (planta ou controlador) de ganho unitário: polinômios e resposta em frequência."""
+    def __init__(self, polos, zeros):
+        super().__init__()
+        self.polos = polos
+        self.zeros = zeros
+
+    def polinomios(self):
+        return self._memo("polinomios", lambda: (_poly(self.zeros), _poly(self.polos)))
+
+    def frequencia(self, omega):
+        """(log10|F|, arg F) de ganho unitário na grade omega."""
+        return self._memo_grade("freq", omega, lambda: _avaliar_fatorada(self.polos, self.zeros, 1.0, 1j * omega))
+
+
+class FamiliaLTI(_Memorizador):
+    """
+    Parte de um modelo que não depende dos ganhos: polos e zeros da planta e do
+    controlador. Guarda os polinômios de ganho unitário (e seus produtos), a
+    resposta em frequência de ganho unitário por grade de ω e o lugar das
+    raízes de ganho unitário. Todos os ModeloLTI que só diferem no ganho
+    compartilham a mesma família, e a mudança de ganho vira uma escala.
+    Planta e controlador são FatorLTI compartilhados entre famílias: mudar só
+    o controlador não recalcula nada da planta, e vice-versa.
+    """
+    def __init__(self, polos_planta, zeros_planta, polos_controlador, zeros_controlador):
+        super().__init__()
+        self.polos_planta = polos_planta
+        self.zeros_planta = zeros_planta
+        self.polos_controlador = polos_controlador
+        self.zeros_controlador = zeros_controlador
+        self.planta = obter_fator(polos_planta, zeros_planta)
+        self.controlador = obter_fator(polos_controlador, zeros_controlador)
+
+    def fatores(self, qual):
+        if qual == "planta":
+            return self.polos_planta, self.zeros_planta
+        if qual == "controlador":
+            return self.polos_controlador, self.zeros_controlador
+        return self.polos_planta + self.polos_controlador, self.zeros_planta + self.zeros_controlador
+
+    def polinomios(self, qual):
+        """(num, den) de ganho unitário de 'planta', 'controlador' ou 'aberta'."""
+        if qual != "aberta":
+            return getattr(self, qual).polinomios()
+
+        def calcular():
+            num_p, den_p = self.planta.polinomios()
+            num_c, den_c = self.controlador.polinomios()
+            num, den = np.polymul(num_p, num_c), np.polymul(den_p, den_c)
+            num.flags.writeable = den.flags.writeable = False
+            return num, den
+        return self._memo("polinomios_aberta", calcular)
+
+    def frequencia(self, qual, omega):
+        """(log10|L|, arg L) de ganho unitário na grade omega; a malha aberta soma os dois fatores."""
+        if qual != "aberta":
+            return getattr(self, qual).frequencia(omega)
+
+        def calcular():
+            (mag_p, fase_p), (mag_c, fase_c) = self.planta.frequencia(omega), self.controlador.frequencia(omega)
+            return mag_p + mag_c, fase_p + fase_c
+        return self._memo_grade("freq_aberta", omega, calcular)
+
+    def grade_frequencia(self, qual, decada_max=None):
+        """
+        Grade adaptativa de ganho unitário (ver grade_frequencia), estendida até
+        10^decada_max: é a base comum a todos os modelos da família com o
+        cruzamento de ganho na mesma década (cada um só refina o seu cruzamento).
+        """
+        return self._memo("grade_freq_%s_%s" % (qual, decada_max),
+                          lambda: grade_frequencia(*self.fatores(qual), 1.0, decada_max=decada_max))
+
+    def lugar_raizes(self, qual, previa=False):
+        opcoes = {"n_inicial": 12, "niveis": 2} if previa else {}
+        return self._memo("lgr_%s_%s" % (qual, previa),
+                          lambda: lugar_raizes(*self.polinomios(qual), **opcoes))
+
+
+class ModeloLTI(_Memorizador):
+    """
+    Planta G(s) e controlador Gc(s) em forma fatorada canônica. Polinômios,
+    malha aberta/fechada, objetos do python-control, raízes e realizações em
+    espaço de estados são calculados sob demanda e memorizados no próprio modelo.
+    O que não depende dos ganhos vem da FamiliaLTI compartilhada: com ganho K,
+    a malha fechada é D + K·N sobre os produtos já prontos, a resposta em
+    frequência de malha aberta é a de ganho unitário escalada, e o lugar das
+    raízes é o de ganho unitário com os ganhos divididos por K.
+    Os arrays devolvidos são somente leitura (compartilhados entre requisições).
+    """
+    def __init__(self, polos_planta, zeros_planta, ganho_planta,
+                 polos_controlador, zeros_controlador, ganho_controlador, chave, familia=None):
+        super().__init__()
+        self.polos_planta = polos_planta
+        self.zeros_planta = zeros_planta
+        self.ganho_planta = ganho_planta
+        self.polos_controlador = polos_controlador
+        self.zeros_controlador = zeros_controlador
+        self.ganho_controlador = ganho_controlador
+        self.chave = chave
+        self.familia = familia or FamiliaLTI(polos_planta, zeros_planta, polos_controlador, zeros_controlador)
+
+    def ganho(self, qual):
+        if qual == "planta":
+            return self.ganho_planta
+        if qual == "controlador":
+            return self.ganho_controlador
+        return self.ganho_planta * self.ganho_controlador
+
+    def _escalado(self, qual):
+        # K·N de ganho unitário, somente leitura
+        def calcular():
+            num = self.ganho(qual) * self.familia.polinomios(qual)[0]
+            num.flags.writeable = False
+            return num
+        return self._memo("num_" + qual, calcular)
+
+    # Polinômios
+    @property
+    def num_planta(self):
+        return self._escalado("planta")
+
+    @property
+    def den_planta(self):
+        return self.familia.polinomios("planta")[1]
+
+    @property
+    def num_controlador(self):
+        return self._escalado("controlador")
+
+    @property
+    def den_controlador(self):
+        return self.familia.polinomios("controlador")[1]
+
+    @property
+    def num_aberta(self):
+        return self._escalado("aberta")
+
+    @property
+    def den_aberta(self):
+        return self.familia.polinomios("aberta")[1]
+
+    @property
+    def num_fechada(self):
+        return self.num_aberta
+
+    @property
+    def den_fechada(self):
+        # Realimentação unitária negativa: D_aberta + N_aberta
+        return self._memo("den_fechada", lambda: np.polyadd(self.den_aberta, self.num_aberta))
+
+    def polinomios(self, qual):
+        """Retorna (num, den) de 'planta', 'controlador', 'aberta' ou 'fechada'."""
+        return getattr(self, "num_" + qual), getattr(self, "den_" + qual)
+
+    def fatores(self, qual):
+        """Retorna (polos, zeros, ganho) em forma fatorada, sem passar por np.roots."""
+        if qual == "planta":
+            return self.polos_planta, self.zeros_planta, self.ganho_planta
+        if qual == "controlador":
+            return self.polos_controlador, self.zeros_controlador, self.ganho_controlador
+        if qual == "aberta":
+            return (self.polos_planta + self.polos_controlador,
+                    self.zeros_planta + self.zeros_controlador,
+                    self.ganho_planta * self.ganho_controlador)
+        zeros, polos = self.raizes("fechada")
+        num = self.num_fechada
+        ganho = float(num[np.flatnonzero(num)[0]] / self.den_fechada[0]) if np.any(num) else 0.0
+        return tuple(polos), tuple(zeros), ganho
+
+    # Objetos derivados
+    def tf(self, qual):
+        return self._memo("tf_" + qual, lambda: ctl.tf(*self.polinomios(qual)))
+
+    def ss(self, qual):
+        return self._memo("ss_" + qual, lambda: ctl.tf2ss(self.tf(qual)))
+
+    def frequencia(self, qual, omega):
+        """Resposta em frequência (ver resposta_frequencia), memorizada por grade de ω."""
+        omega = np.asarray(omega, dtype=float)
+        chave = "freq_" + qual
+        if qual == "fechada":
+            return self._memo_grade(chave, omega, lambda: resposta_frequencia(*self.fatores(qual), omega))
+
+        def escalar():
+            log_mag, fase = self.familia.frequencia(qual, omega)
+            ganho = self.ganho(qual)
+            with np.errstate(divide="ignore"):
+                return _montar_resposta(omega, log_mag + np.log10(abs(ganho)), fase + np.angle(ganho))
+        return self._memo_grade(chave, omega, escalar)
+
+    def grade_frequencia(self, qual):
+        """
+        Grade adaptativa de ω. Fora da malha fechada, a grade de ganho unitário
+        da família (o ganho só fixa a década final), bissectada em torno do
+        cruzamento |K·L₁(jω)| = 1 deste ganho (ver refinar_cruzamento_ganho).
+        """
+        if qual == "fechada":
+            return self._memo("grade_freq_" + qual, lambda: grade_frequencia(*self.fatores(qual)))
+
+        def calcular():
+            polos, zeros, ganho = self.fatores(qual)
+            base = self.familia.grade_frequencia(qual, _decada_cruzamento(polos, zeros, ganho))
+            log_mag, _ = self.familia.frequencia(qual, base)
+            return refinar_cruzamento_ganho(polos, zeros, ganho, base, log_mag)
+        return self._memo("grade_freq_" + qual, calcular)
+
+    def simular(self, qual, T, U):
+        """Resposta de `qual` a um ou mais sinais de entrada na grade T (ver simular_tf)."""
+        return simular_tf(*self.polinomios(qual), T, U)
+
+    def degrau(self, qual, T):
+        """Resposta ao degrau unitário, memorizada por grade T."""
+        T = np.asarray(T, dtype=float)
+        def calcular():
+            y = self.simular(qual, T, np.ones(len(T)))
+            y.setflags(write=False)
+            return y
+        return self._memo_grade("degrau_" + qual, T, calcular)
+
+    def info_degrau(self, qual):
+        """Métricas exatas da resposta ao degrau (ver info_degrau)."""
+        return self._memo("info_degrau_" + qual, lambda: info_degrau(*self.polinomios(qual)))
+
+    def degraus(self, qual, T, degraus):
+        """Resposta a uma entrada constante por partes [(tᵢ, aᵢ), ...] (ver resposta_degraus)."""
+        num, den = (np.trim_zeros(np.atleast_1d(p), 'f') for p in self.polinomios(qual))
+        exata = None
+        if 0 < len(num) <= len(den):
+            analitica = self._memo("degrau_analitico_" + qual, lambda: _RespostaDegrauAnalitica(num, den))
+            exata = lambda tau: analitica.avaliar(tau)[0]
+        return resposta_degraus(T, self.degrau(qual, T), degraus, degrau_em=exata)
+
+    def lugar_raizes(self, qual, previa=False):
+        opcoes = {"n_inicial": 12, "niveis": 2} if previa else {}
+        ganho = self.ganho(qual)
+        if qual == "fechada" or ganho <= 0:
+            return self._memo("lgr_%s_%s" % (qual, previa),
+                              lambda: lugar_raizes(*self.polinomios(qual), **opcoes))
+        # 1 + k·K·N₁/D = 0: o lugar de ganho unitário, com k = k₁/K
+        def escalar():
+            lgr = self.familia.lugar_raizes(qual, previa)
+            return dict(lgr, ganhos=lgr["ganhos"] / ganho,
+                        separacao=[dict(p, k=p["k"] / ganho) for p in lgr["separacao"]],
+                        cruzamentos=[dict(c, k=c["k"] / ganho) for c in lgr["cruzamentos"]])
+        return self._memo("lgr_%s_%s" % (qual, previa), escalar)
+
+    def indice_lgr(self, qual):
+        return self._memo("indice_lgr_" + qual,
+                          lambda: IndiceLGR(*self.polinomios(qual), self.lugar_raizes(qual)))
+
+    def nyquist(self, qual="aberta"):
+        return self._memo("nyquist_" + qual, lambda: diagrama_nyquist(*self.fatores(qual)))
+
+    def raizes(self, qual):
+        """Retorna (zeros, polos) como arrays complexos."""
+        def calcular():
+            num, den = self.polinomios(qual)
+            return np.roots(num), np.roots(den)
+        return self._memo("raizes_" + qual, calcular)
+
+
+_cache_modelos = CacheLRU(max_itens=256, ttl=600)
+_cache_familias = CacheLRU(max_itens=64, ttl=600)
+_cache_fatores = CacheLRU(max_itens=128, ttl=600)
+
+
+def obter_fator(polos, zeros):
+    """FatorLTI compartilhado para raízes já canônicas (ver _canonizar_raizes)."""
+    return _cache_fatores.obter_ou_criar(_hash_conteudo("fator", polos, zeros), lambda: FatorLTI(polos, zeros))
+
+
+def obter_modelo(polos_planta=(), zeros_planta=(), ganho_planta=1.0,
+                 polos_controlador=(), zeros_controlador=(), ganho_controlador=1.0):
+    """
+    Retorna o ModeloLTI (do cache, se já existir) para os parâmetros dados.
+    Parâmetros equivalentes (mesmas raízes em outra ordem, por exemplo)
+    levam ao mesmo modelo.
+    """
+    canonico = (
+        _canonizar_raizes(polos_planta), _canonizar_raizes(zeros_planta), float(ganho_planta),
+        _canonizar_raizes(polos_controlador), _canonizar_raizes(zeros_controlador), float(ganho_controlador),
+    )
+    chave = _hash_conteudo(*canonico)
+
+    def criar():
+        # Só o ganho mudou: o novo modelo herda a família já calculada
+        estrutura = (canonico[0], canonico[1], canonico[3], canonico[4])
+        familia = _cache_familias.obter_ou_criar(_hash_conteudo(*estrutura), lambda: FamiliaLTI(*estrutura))
+        return ModeloLTI(*canonico, chave=chave, familia=familia)
+    return _cache_modelos.obter_ou_criar(chave, criar)
+
+
+# ---------------------------------------------------------------------------
+# Resposta em frequência a partir da forma fatorada
+# ---------------------------------------------------------------------------
+
+def _avaliar_fatorada(polos, zeros, ganho, s):
+    """Retorna (log10|L(s)|, arg L(s) em rad) para um vetor de pontos s do plano complexo."""
+    fz = s - np.asarray(zeros, dtype=complex).reshape(-1, 1)
+    fp = s - np.asarray(polos, dtype=complex).reshape(-1, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_mag = (np.log10(abs(ganho)) + np.sum(np.log10(np.abs(fz)), axis=0)
+                   - np.sum(np.log10(np.abs(fp)), axis=0))
+        fase = np.angle(ganho) + np.sum(np.angle(fz), axis=0) - np.sum(np.angle(fp), axis=0)
+    return log_mag, fase
+
+
+def resposta_frequencia(polos, zeros, ganho, omega):
+    """
+    Avalia L(jω) = K·Π(jω - z)/Π(jω - p) diretamente dos polos, zeros e ganho,
+    com um único produto vetorizado sobre todo o vetor de frequências.
+    Magnitude e fase são somadas fator a fator (em log e em ângulo), o que evita
+    o polinômio expandido e dá uma fase contínua sem precisar de unwrap.
+
+    Retorna um dict com omega, L, S = 1/(1+L), T = L/(1+L), mag_db e fase (graus).
+    """
+    omega = np.asarray(omega, dtype=float)
+    return _montar_resposta(omega, *_avaliar_fatorada(polos, zeros, ganho, 1j * omega))
+
+
+def _montar_resposta(omega, log_mag, fase):
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        L = np.power(10.0, log_mag) * np.exp(1j * fase)
+        S = 1.0 / (1.0 + L)
+        T = L * S
+
+    return {
+        "omega": omega,
+        "L": L,
+        "S": S,
+        "T": T,
+        "mag_db": 20.0 * log_mag,
+        "fase": np.degrees(fase),
+    }
+
+
+def _afastar_do_eixo(w, raizes, folga=1e-6):
+    """
+    Desloca de `folga` (relativa) os pontos de w que caem sobre uma raiz no
+    eixo imaginário (polo ou zero não amortecido), onde |L| seria ±∞.
+    """
+    raizes = np.asarray(raizes, dtype=complex)
+    modulos = np.abs(raizes)
+    no_eixo = np.abs(raizes.real) <= 1e-9 * np.maximum(modulos, 1.0)
+    for wr in np.unique(np.abs(raizes.imag[no_eixo & (modulos > 1e-9)])):
+        sobre = np.abs(w - wr) <= folga * wr
+        w = np.where(sobre, wr * (1 + np.where(w >= wr, folga, -folga)), w)
+    return w
+
+
+def _decada_cruzamento(polos, zeros, ganho):
+    """
+    Década (inteira) até onde a grade precisa ir para conter o cruzamento de
+    0 dB: |L| ≈ |K|·ω^-(excesso) acima das quebras. None sem excesso de polos.
+    """
+    excesso = len(polos) - len(zeros)
+    if excesso <= 0 or ganho == 0:
+        return None
+    return int(np.ceil(np.log10(abs(ganho)) / excesso) + 1)
+
+
+def grade_frequencia(polos, zeros, ganho, n_inicial=60, tol_db=0.25, tol_fase=2.0,
+                     largura_cruzamento=1e-3, decadas_margem=2, n_max=800, niveis=12, decada_max=None):
+    """
+    Grade adaptativa em ω para Bode/Nyquist. A faixa cobre as frequências de
+    quebra (|p|, |z|) com `decadas_margem` décadas de folga e a frequência onde
+    a assíntota de alta frequência cruza 0 dB. Parte de uma grade log-espaçada
+    curta (mais as frequências naturais dos polos/zeros amortecidos) e subdivide
+    recursivamente cada intervalo em que o ponto médio geométrico se afasta da
+    interpolação linear (em log ω) por mais de tol_db ou tol_fase (graus), e os
+    intervalos em que |L| cruza 0 dB ou a fase cruza -180° + k·360°, até
+    `largura_cruzamento` décadas. decada_max estende a faixa até 10^decada_max.
+    Retorna o vetor ω ordenado.
+    """
+    polos = np.asarray(polos, dtype=complex)
+    zeros = np.asarray(zeros, dtype=complex)
+    raizes = np.concatenate([polos, zeros])
+    modulos = np.abs(raizes[np.abs(raizes) > 1e-9])
+    if modulos.size:
+        log_min = np.floor(np.log10(modulos.min())) - decadas_margem
+        log_max = np.ceil(np.log10(modulos.max())) + decadas_margem
+    else:
+        log_min, log_max = -2.0, 2.0
+    for decada in (_decada_cruzamento(polos, zeros, ganho), decada_max):
+        if decada is not None:
+            log_max = max(log_max, decada)
+
+    amortecidas = raizes[(np.abs(raizes.imag) > 1e-9) & (np.abs(raizes.real) > 1e-9)]
+    w = np.unique(np.concatenate([
+        np.logspace(log_min, log_max, n_inicial),
+        np.abs(amortecidas), np.abs(amortecidas.imag),
+    ]))
+    w = np.unique(_afastar_do_eixo(w[(w >= 10.0 ** log_min) & (w <= 10.0 ** log_max)], raizes))
+
+    def avaliar(omega):
+        log_mag, fase = _avaliar_fatorada(polos, zeros, ganho, 1j * omega)
+        return 20.0 * log_mag, np.degrees(fase)
+
+    mag, fase = avaliar(w)
+    ativos = np.ones(len(w) - 1, dtype=bool)
+    prioridade = np.full(len(w) - 1, np.inf)
+    for _ in range(niveis):
+        idx = np.flatnonzero(ativos)
+        restante = n_max - len(w)
+        if idx.size == 0 or restante <= 0:
+            break
+        if idx.size > restante:
+            idx = np.sort(idx[np.argsort(-prioridade[idx])[:restante]])
+
+        wm = _afastar_do_eixo(np.sqrt(w[idx] * w[idx + 1]), raizes)
+        mag_m, fase_m = avaliar(wm)
+        with np.errstate(invalid="ignore"):
+            erro = np.maximum(np.abs(mag_m - (mag[idx] + mag[idx + 1]) / 2) / tol_db,
+                              np.abs(fase_m - (fase[idx] + fase[idx + 1]) / 2) / tol_fase)
+            cruza = ((np.sign(mag[idx]) != np.sign(mag[idx + 1]))
+                     | (np.floor((fase[idx] + 180) / 360) != np.floor((fase[idx + 1] + 180) / 360)))
+        erro = np.where(np.isfinite(erro), erro, 0.0)
+        estreito = np.log10(w[idx + 1] / w[idx]) < 2 * largura_cruzamento
+        refinar = (erro > 1.0) | (cruza & ~estreito)
+
+        # Cada intervalo dividido vira dois, herdando a decisão de continuar refinando
+        w = np.concatenate([w, wm])
+        mag = np.concatenate([mag, mag_m])
+        fase = np.concatenate([fase, fase_m])
+        ordem = np.argsort(w, kind="stable")
+        novos_ativos = np.zeros(len(w) - 1, dtype=bool)
+        nova_prioridade = np.zeros(len(w) - 1)
+        posicao = np.empty(len(w), dtype=int)
+        posicao[ordem] = np.arange(len(w))
+        esquerda = posicao[idx]
+        for deslocamento in (0, 1):
+            novos_ativos[esquerda + deslocamento] = refinar
+            nova_prioridade[esquerda + deslocamento] = np.where(cruza, np.inf, erro)
+        w, mag, fase = w[ordem], mag[ordem], fase[ordem]
+        ativos, prioridade = novos_ativos, nova_prioridade
+    return w
+
+
+def refinar_cruzamento_ganho(polos, zeros, ganho, w, log_mag, largura_cruzamento=1e-3, max_bissecoes=60):
+    """
+    Acrescenta à grade w (com log10|L₁| de ganho unitário em log_mag) os pontos
+    de bisseção em log ω que estreitam cada intervalo onde |K·L₁(jω)| cruza 1
+    até `largura_cruzamento` décadas, como o refinamento de grade_frequencia
+    faria com o ganho K. Retorna a nova grade ordenada.
+    """
+    if ganho == 0:
+        return w
+    with np.errstate(invalid="ignore"):
+        acima = log_mag + np.log10(abs(ganho)) > 0
+    idx = np.flatnonzero(acima[1:] != acima[:-1])
+    if idx.size == 0:
+        return w
+    raizes = np.concatenate([np.asarray(polos, dtype=complex), np.asarray(zeros, dtype=complex)])
+    a, b, lado_a = w[idx], w[idx + 1], acima[idx]
+    novos = []
+    for _ in range(max_bissecoes):
+        largos = np.log10(b / a) > largura_cruzamento
+        if not largos.any():
+            break
+        a, b, lado_a = a[largos], b[largos], lado_a[largos]
+        m = _afastar_do_eixo(np.sqrt(a * b), raizes)
+        with np.errstate(invalid="ignore"):
+            acima_m = _avaliar_fatorada(polos, zeros, ganho, 1j * m)[0] > 0
+        novos.append(m)
+        # o cruzamento fica na metade em que o lado muda
+        a, b = np.where(acima_m == lado_a, m, a), np.where(acima_m == lado_a, b, m)
+    return np.unique(np.concatenate([w] + novos)) if novos else w
+
+
+def escolher_omega(data, adaptativa):
+    """
+    Grade de ω pedida na requisição: a adaptativa (função sem argumentos) por
+    padrão, ou a antiga grade fixa de 0,01 a 100 rad/s com "grade_frequencia": "fixa".
+    Numa prévia ("previa": true) a mesma faixa vai com só 48 pontos, tirados da
+    grade adaptativa (que já evita os polos e zeros no eixo imaginário).
+    """
+    if data.get("grade_frequencia") == "fixa":
+        return np.logspace(-2, 2, 48 if data.get("previa") else 500)
+    omega = adaptativa()
+    if data.get("previa"):
+        alvos = np.geomspace(omega[0], omega[-1], 48)
+        indices = np.clip(np.searchsorted(omega, alvos), 1, len(omega) - 1)
+        mais_perto = np.where(np.abs(np.log(omega[indices - 1] / alvos)) < np.abs(np.log(omega[indices] / alvos)),
+                              indices - 1, indices)
+        return omega[np.unique(mais_perto)]
+    return omega
+
+
+def montar_bode(resposta, sensibilidade=False):
+    """
+    Monta o dict Plotly do diagrama de Bode a partir de resposta_frequencia.
+    Com sensibilidade=True inclui |S| e |T| (dB) no eixo de magnitude.
+    """
+    omega = resposta["omega"]
+    data = [
+        {
+            "x": omega,
+            "y": resposta["mag_db"],
+            "type": "scatter",
+            "mode": "lines",
+            "name": "Magnitude"
+        },
+        {
+            "x": omega,
+            "y": resposta["fase"],
+            "type": "scatter",
+            "mode": "lines",
+            "name": "Fase",
+            "yaxis": "y2"
+        }
+    ]
+    if sensibilidade:
+        with np.errstate(divide="ignore"):
+            data.append({"x": omega, "y": (20 * np.log10(np.abs(resposta["S"]))),
+                         "type": "scatter", "mode": "lines", "name": "|S| (sensibilidade)", "line": {"dash": "dot"}})
+            data.append({"x": omega, "y": (20 * np.log10(np.abs(resposta["T"]))),
+                         "type": "scatter", "mode": "lines", "name": "|T| (sensib. complementar)", "line": {"dash": "dash"}})
+    return {
+        "data": data,
+        "layout": {
+            "title": "Diagrama de Bode",
+            "xaxis": {"title": "Frequência (rad/s)", "type": "log"},
+            "yaxis": {"title": "Magnitude (dB)"},
+            "yaxis2": {
+                "title": "Fase (graus)",
+                "overlaying": "y",
+                "side": "right"
+            },
+            "legend": {"x": 0, "y": 1.1, "orientation": "h"}
+        }
+    }
+
+
+# ---------------------------------------------------------------------------
+# Renderização PNG com matplotlib
+# Usa a API orientada a objetos (Figure + FigureCanvasAgg) em vez do pyplot,
+# cujo estado global não é seguro entre threads. As figuras são reaproveitadas
+# de um pool e as imagens prontas ficam num cache limitado em bytes.
+# ---------------------------------------------------------------------------
+
+class PoolFiguras:
+    """Reserva de figuras pré-dimensionadas; cada figura é usada por uma thread por vez."""
+    def __init__(self, tamanho=(7, 4), dpi=100, max_figuras=4):
+        self.tamanho = tamanho
+        self.dpi = dpi
+        self._livres = queue.LifoQueue(maxsize=max_figuras)
+
+    @contextmanager
+    def figura(self):
+        try:
+            fig = self._livres.get_nowait()
+        except queue.Empty:
+            fig = Figure(figsize=self.tamanho, dpi=self.dpi)
+            FigureCanvasAgg(fig)
+        try:
+            yield fig
+        finally:
+            fig.clear()
+            try:
+                self._livres.put_nowait(fig)
+            except queue.Full:
+                pass
+
+    def png(self, desenhar):
+        with self.figura() as fig:
+            desenhar(fig)
+            buf = io.BytesIO()
+            fig.savefig(buf, format="png")
+        return buf.getvalue()
+
+
+_pool_figuras = PoolFiguras()
+_cache_imagens = CacheLRU(max_itens=512, ttl=1800, max_bytes=32 * 1024 * 1024)
+
+
+def imagem_png(chave, desenhar):
+    """
+    Retorna o PNG em base64 para `chave` (hash do modelo + opções do gráfico),
+    rasterizando com `desenhar(fig)` apenas quando não está no cache.
+    """
+    chave = _hash_conteudo(*chave)
+    return _cache_imagens.obter_ou_criar(
+        chave, lambda: base64.b64encode(_pool_figuras.png(desenhar)).decode('utf-8'))
+
+
+# ---------------------------------------------------------------------------
+# Transporte binário de arrays (opcional)
+# Com "Accept: application/vnd.sisco.binario+json" ou ?binario=1 (?binario=f4
+# para float32), a resposta JSON vira um envelope
+#   {"formato": "binario/1", "arrays": [...], "dados": ...}
+# em que cada array numérico de `dados` é trocado por {"$array": i}. Os arrays
+# vão como base64 de float little-endian; eixos uniformes vão só como
+# {"eixo": [início, fim, n]} e arrays iguais (o mesmo eixo em vários traços)
+# são enviados uma vez. static/js/binario.js faz a decodificação no navegador.
+# ---------------------------------------------------------------------------
+
+TIPO_BINARIO = "application/vnd.sisco.binario+json"
+_MIN_ITENS_BINARIO = 16
+
+
+def _precisao_binaria():
+    """Retorna None (JSON comum), '<f8' ou '<f4', conforme a requisição."""
+    flag = request.args.get("binario")
+    if flag in ("f4", "32"):
+        return "<f4"
+    if flag not in (None, "", "0") or TIPO_BINARIO in request.headers.get("Accept", ""):
+        return "<f8"
+    return None
+
+
+def codificar_binario(dados, dtype="<f8"):
+    """Monta o envelope binário (ver acima) a partir de um dict de resposta."""
+    arrays = []
+    indices = {}
+
+    def registrar(a):
+        a = np.ascontiguousarray(a, dtype=dtype)
+        chave = (a.shape, hashlib.sha1(a.tobytes()).digest())
+        if chave in indices:
+            return {"$array": indices[chave]}
+        descricao = None
+        if a.ndim == 1 and a.size >= 3 and np.all(np.isfinite(a[[0, -1]])):
+            eixo = np.linspace(a[0], a[-1], a.size, dtype=dtype)
+            if np.array_equal(eixo, a):
+                descricao = {"eixo": [float(a[0]), float(a[-1]), int(a.size)]}
+        if descricao is None:
+            descricao = {"dtype": dtype, "shape": list(a.shape),
+                         "dados": base64.b64encode(a.tobytes()).decode("ascii")}
+        indices[chave] = len(arrays)
+        arrays.append(descricao)
+        return {"$array": indices[chave]}
+
+    def visitar(v):
+        if isinstance(v, dict):
+            return {k: visitar(x) for k, x in v.items()}
+        if isinstance(v, np.ndarray):
+            if v.dtype.kind in "fiu" and v.size >= _MIN_ITENS_BINARIO:
+                return registrar(v)
+            return v
+        if isinstance(v, (list, tuple)):
+            if (len(v) >= _MIN_ITENS_BINARIO
+                    and all(isinstance(x, (float, int)) and not isinstance(x, bool) for x in v)):
+                return registrar(v)
+            return [visitar(x) for x in v]
+        return v
+
+    return {"formato": "binario/1", "arrays": arrays, "dados": visitar(dados)}
+
+
+# ---------------------------------------------------------------------------
+# Redução de pontos para exibição (opcional)
+# O navegador desenha poucas centenas de pixels por curva. Com ?pontos=N ou
+# "max_pontos": N no corpo da requisição, cada curva da resposta é reduzida a
+# no máximo N pontos por LTTB (largest-triangle-three-buckets), que preserva a
+# forma; máximos e mínimos de cada série são sempre mantidos (pico, sobressinal).
+# As simulações continuam na resolução completa; só o que vai para o cliente muda.
+# ---------------------------------------------------------------------------
+
+_EIXOS_X = ("x", "t", "T")
+
+
+def lttb(x, y, n):
+    """Índices dos n pontos escolhidos pelo LTTB (primeiro e último incluídos)."""
+    N = len(y)
+    if n >= N or n < 3:
+        return np.arange(N)
+    bordas = np.linspace(1, N - 1, n - 1).astype(int)
+    escolhidos = np.empty(n, dtype=int)
+    escolhidos[0], escolhidos[-1] = 0, N - 1
+    a = 0
+    for i in range(n - 2):
+        ini, fim = bordas[i], bordas[i + 1]
+        prox_fim = bordas[i + 2] if i + 2 < n - 1 else N
+        cx = x[fim:prox_fim].mean()
+        cy = y[fim:prox_fim].mean()
+        area = np.abs((x[a] - cx) * (y[ini:fim] - y[a]) - (x[a] - x[ini:fim]) * (cy - y[a]))
+        a = ini + int(np.argmax(area))
+        escolhidos[i + 1] = a
+    return escolhidos
+
+
+def _serie_numerica(v, n):
+    if isinstance(v, (list, tuple, np.ndarray)) and len(v) == n:
+        try:
+            a = np.asarray(v, dtype=float)
+        except (TypeError, ValueError):
+            return None
+        return a if a.ndim == 1 and np.all(np.isfinite(a)) else None
+    return None
+
+
+def reduzir_curvas(dados, max_pontos):
+    """
+    Percorre a resposta e reduz cada grupo {eixo x (x, t ou T) + séries y do
+    mesmo tamanho} a ~max_pontos por série. Séries que compartilham o eixo
+    ficam com a união dos índices escolhidos, para continuarem alinhadas.
+    Curvas com valores não finitos são deixadas como estão.
+    """
+    if isinstance(dados, list):
+        return [reduzir_curvas(v, max_pontos) for v in dados]
+    if not isinstance(dados, dict):
+        return dados
+
+    saida = {k: reduzir_curvas(v, max_pontos) for k, v in dados.items()}
+    chave_x = next((k for k in _EIXOS_X if k in saida), None)
+    if chave_x is None:
+        return saida
+    n = len(saida[chave_x]) if isinstance(saida[chave_x], (list, tuple, np.ndarray)) else 0
+    x = _serie_numerica(saida[chave_x], n) if n > max_pontos else None
+    if x is None:
+        return saida
+    series = {k: _serie_numerica(v, n) for k, v in saida.items() if k != chave_x}
+    series = {k: y for k, y in series.items() if y is not None}
+    if not series:
+        return saida
+
+    indices = [np.array([0, n - 1])]
+    for y in series.values():
+        indices.append(lttb(x, y, max_pontos))
+        indices.append([np.argmax(y), np.argmin(y)])
+    indices = np.unique(np.concatenate(indices))
+    saida[chave_x] = x[indices]
+    for k, y in series.items():
+        saida[k] = y[indices]
+    return saida
+
+
+def _orcamento_pontos():
+    """Máximo de pontos por curva pedido na requisição, ou None."""
+    valor = request.args.get("pontos")
+    if valor is None:
+        corpo = request.get_json(silent=True)
+        valor = corpo.get("max_pontos") if isinstance(corpo, dict) else None
+    try:
+        return max(int(valor), 3) if valor is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def responder(dados):
+    """
+    jsonify(dados), com as curvas reduzidas ao orçamento de pontos e/ou no
+    envelope binário quando a requisição pede.
+    """
+    max_pontos = _orcamento_pontos()
+    if max_pontos is not None:
+        dados = reduzir_curvas(dados, max_pontos)
+    dtype = _precisao_binaria()
+    if dtype is None:
+        return jsonify(dados)
+    return jsonify(codificar_binario(dados, dtype))
+
+
+# ---------------------------------------------------------------------------
+# Diagrama de Nyquist vetorial (sem matplotlib)
+# ---------------------------------------------------------------------------
+
+def diagrama_nyquist(polos, zeros, ganho, pontos_arco=60):
+    """
+    Percorre o contorno de Nyquist (eixo jω com indentações à direita dos polos
+    sobre o eixo imaginário, mais o arco no infinito) e mapeia por L(s).
+    O número de voltas em torno de -1 vem do princípio do argumento, somando as
+    variações de arg(1 + L) ao longo da curva fechada: Z = P + N, com N no
+    sentido horário e P os polos de malha aberta no semiplano direito.
+
+    Retorna um dict com o ramo ω > 0 (L_pos, na ordem do contorno), L no
+    infinito, voltas N, P, Z e os polos de malha aberta sobre o eixo jω.
+    """
+    polos = np.asarray(polos, dtype=complex)
+    zeros = np.asarray(zeros, dtype=complex)
+    raizes = np.concatenate([polos, zeros])
+    modulos = np.abs(raizes[np.abs(raizes) > 1e-9])
+    w = grade_frequencia(polos, zeros, ganho)
+    w_max = w[-1]
+    tol = 1e-9 * max(1.0, w_max)
+
+    no_eixo = polos[np.abs(polos.real) <= tol]
+    w_eixo = np.unique(np.round(np.abs(no_eixo.imag), 12))
+    eps = 1e-3 * (modulos.min() if modulos.size else 1.0)
+
+    # Grade adaptativa em ω, sem os pontos que caem dentro das indentações
+    for wk in w_eixo:
+        w = w[np.abs(w - wk) > eps]
+
+    # Monta o contorno s(ω) em ordem crescente de ω, inserindo os semicírculos
+    teta = np.linspace(-np.pi / 2, np.pi / 2, pontos_arco)
+    trechos = []
+    inicio = 0.0
+    if w_eixo.size and w_eixo[0] == 0.0:
+        trechos.append(eps * np.exp(1j * teta[pontos_arco // 2:]))
+        w_eixo = w_eixo[1:]
+        inicio = eps
+    else:
+        trechos.append(np.array([0j]))
+    for wk in w_eixo:
+        trechos.append(1j * w[(w > inicio) & (w < wk)])
+        trechos.append(1j * wk + eps * np.exp(1j * teta))
+        inicio = wk
+    trechos.append(1j * w[w > inicio])
+    s = np.concatenate(trechos)
+
+    log_mag, fase = _avaliar_fatorada(polos, zeros, ganho, s)
+    with np.errstate(over="ignore", invalid="ignore"):
+        L_pos = np.power(10.0, log_mag) * np.exp(1j * fase)
+
+    # Valor no arco do infinito
+    if len(zeros) < len(polos):
+        L_inf = 0j
+    elif len(zeros) == len(polos):
+        L_inf = complex(ganho)
+    else:
+        L_inf = None
+
+    P = int(np.sum(polos.real > tol))
+    if L_inf is not None and np.all(np.isfinite(L_pos)):
+        curva = np.concatenate([L_pos, [L_inf], np.conj(L_pos[::-1])]) + 1.0
+        voltas = np.sum(np.angle(curva[1:] / curva[:-1])) / (2 * np.pi)
+        N = -int(np.round(voltas))
+        Z = P + N
+    else:
+        # L impróprio: o arco do infinito não tem imagem finita; usa as raízes de malha fechada
+        den = np.polyadd(np.poly(polos) if len(polos) else np.array([1.0]),
+                         ganho * np.poly(zeros) if len(zeros) else np.array([float(ganho)]))
+        Z = int(np.sum(np.roots(den).real > tol))
+        N = Z - P
+
+    return {
+        "s": s,
+        "L_pos": L_pos,
+        "L_inf": L_inf,
+        "voltas": N,
+        "polos_instaveis_aberta": P,
+        "polos_instaveis_fechada": Z,
+        "polos_eixo": no_eixo,
+        "passa_por_menos_um": bool(np.min(np.abs(L_pos + 1.0)) < 1e-6),
+    }
+
+
+def montar_nyquist(resultado, raio_max=None):
+    """
+    Monta o dict Plotly do diagrama de Nyquist. Trechos que vão ao infinito
+    (indentações em polos sobre o eixo jω) são comprimidos radialmente para um
+    círculo de raio raio_max, como no nyquist_plot do python-control.
+    """
+    L = resultado["L_pos"]
+    if resultado["L_inf"] is not None:
+        L = np.append(L, resultado["L_inf"])
+    finitos = np.abs(L[np.isfinite(L)])
+    if raio_max is None:
+        raio_max = 20.0 * max(1.0, float(np.median(finitos))) if finitos.size else 20.0
+    L = np.where(np.isfinite(L), L, raio_max)
+    modulo = np.abs(L)
+    comprimido = modulo > raio_max
+    L = np.where(comprimido, L / np.maximum(modulo, 1e-300) * raio_max, L)
+
+    N = resultado["voltas"]
+    Z = resultado["polos_instaveis_fechada"]
+    titulo = "Diagrama de Nyquist (N = %d, P = %d, Z = %d)" % (N, resultado["polos_instaveis_aberta"], Z)
+    return {
+        "data": [
+            {"x": L.real, "y": L.imag, "mode": "lines", "name": "ω > 0",
+             "line": {"color": "#0074d9"}},
+            {"x": L.real[::-1], "y": (-L.imag[::-1]), "mode": "lines", "name": "ω < 0",
+             "line": {"color": "#0074d9", "dash": "dash"}},
+            {"x": [-1], "y": [0], "mode": "markers", "name": "-1",
+             "marker": {"color": "red", "size": 10, "symbol": "x"}}
+        ],
+        "layout": {
+            "title": titulo,
+            "xaxis": {"title": "Re", "zeroline": True},
+            "yaxis": {"title": "Im", "zeroline": True, "scaleanchor": "x", "scaleratio": 1},
+            "showlegend": True
+        }
+    }
+
+
+def resumo_nyquist(resultado):
+    """Campos numéricos do critério de Nyquist para incluir nas respostas JSON."""
+    return {
+        "voltas": resultado["voltas"],
+        "polos_instaveis_aberta": resultado["polos_instaveis_aberta"],
+        "polos_instaveis_fechada": resultado["polos_instaveis_fechada"],
+        "estavel": resultado["polos_instaveis_fechada"] == 0 and not resultado["passa_por_menos_um"],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Simulação no tempo com ZOH exato
+# As matrizes discretas (expm de [[A, B], [0, 0]]·dt) são calculadas uma vez por
+# (sistema, dt) e guardadas em cache. Para uma grade de n pontos, os parâmetros
+# de Markov g[i] = C·Ad^i·Bd também ficam em cache, e qualquer número de sinais
+# de entrada é simulado de uma vez como uma convolução discreta em lote (FFT).
+# Em aritmética exata a convolução é a recorrência x[k+1] = Ad·x[k] + Bd·u[k];
+# em ponto flutuante o erro da FFT é relativo ao maior |g|, então respostas que
+# crescem (raio espectral de Ad >= 1) ou núcleos com grande faixa dinâmica
+# perderiam as amostras iniciais: nesses casos a simulação usa a recorrência.
+# ---------------------------------------------------------------------------
+
+_cache_zoh = CacheLRU(max_itens=256, ttl=600)
+_cache_markov = CacheLRU(max_itens=128, ttl=600)
+# Acima desta razão entre o maior |g| e o maior |g| no início do núcleo, a FFT
+# não representa bem as amostras iniciais
+FAIXA_MAX_FFT = 1e3
+
+
+def matrizes_zoh(A, B, dt):
+    """Discretização ZOH exata: retorna (Ad, Bd). Aceita A e B empilhados (..., n, n)."""
+    n = A.shape[-1]
+    m = B.shape[-1]
+    M = np.zeros(A.shape[:-2] + (n + m, n + m))
+    M[..., :n, :n] = A
+    M[..., :n, n:] = B
+    E = scipy.linalg.expm(M * dt)
+    return E[..., :n, :n], E[..., :n, n:]
+
+
+def _markov(Ad, Bd, C, n):
+    """
+    g[i] = C·Ad^i·Bd para i = 0..n-1, por duplicação (log2(n) produtos em lote).
+    Aceita sistemas empilhados (..., n, n); retorna (n, ..., p, m).
+    """
+    Q = np.empty((n,) + Bd.shape)
+    Q[0] = Bd
+    potencia = Ad
+    feito = 1
+    while feito < n:
+        passo = min(feito, n - feito)
+        Q[feito:feito + passo] = potencia @ Q[:passo]
+        potencia = potencia @ potencia
+        feito += passo
+    return np.einsum('...pk,i...km->i...pm', C, Q)
+
+
+def _grade_uniforme(T):
+    T = np.asarray(T, dtype=float)
+    if len(T) < 2:
+        return None
+    dt = T[1] - T[0]
+    if dt <= 0 or not np.allclose(np.diff(T), dt, rtol=1e-6, atol=1e-12):
+        return None
+    return dt
+
+
+def _convolucao_segura(Ad, g):
+    """A FFT só é usada com Ad estável e núcleo g sem grande faixa dinâmica."""
+    if Ad.shape[-1] and np.abs(np.linalg.eigvals(Ad)).max() >= 1.0:
+        return False
+    modulo = np.abs(g).reshape(len(g), -1).max(axis=1)
+    inicio = modulo[:max(1, len(g) // 10)].max()
+    return modulo.max() <= FAIXA_MAX_FFT * inicio if inicio > 0 else not modulo.any()
+
+
+def _simular_recorrencia(Ad, Bd, C, D, U):
+    """x[k+1] = Ad·x[k] + Bd·u[k], y[k] = C·x[k] + D·u[k], passo a passo (com os mesmos lotes de simular_ss)."""
+    n_t = U.shape[-1]
+    lote = np.broadcast_shapes(Ad.shape[:-2], U.shape[:-2])
+    x = np.zeros(lote + (Ad.shape[-1], 1))
+    y = np.empty(lote + (C.shape[-2], n_t))
+    for k in range(n_t):
+        u = U[..., :, k:k + 1]
+        y[..., :, k:k + 1] = C @ x + D @ u
+        x = Ad @ x + Bd @ u
+    return y
+
+
+def simular_ss(A, B, C, D, T, U, chave=None, memorizar=True):
+    """
+    Simula x' = Ax + Bu, y = Cx + Du (x(0) = 0) na grade uniforme T com entrada
+    segurada entre amostras (ZOH). U tem forma (..., m, n_t); retorna (..., p, n_t).
+    A, B, C e D podem ser pilhas de sistemas (s, n, n) etc.; nesse caso as
+    dimensões de lote de U se alinham com s, e a família inteira é simulada de
+    uma vez. `chave` identifica o sistema para reaproveitar as matrizes discretas;
+    com memorizar=False (sistemas que não se repetem) os caches são ignorados.
+    """
+    dt = _grade_uniforme(T)
+    U = np.asarray(U, dtype=float)
+    n_t = U.shape[-1]
+    if not memorizar:
+        Ad, Bd = matrizes_zoh(A, B, dt)
+        g = _markov(Ad, Bd, C, max(n_t - 1, 1))
+    else:
+        if chave is None:
+            chave = _hash_conteudo(A.tobytes(), B.tobytes(), C.tobytes(), A.shape, B.shape)
+        Ad, Bd = _cache_zoh.obter_ou_criar((chave, dt), lambda: matrizes_zoh(A, B, dt))
+        g = _cache_markov.obter_ou_criar((chave, dt, n_t), lambda: _markov(Ad, Bd, C, max(n_t - 1, 1)))
+
+    if not _convolucao_segura(Ad, g):
+        return _simular_recorrencia(Ad, Bd, C, D, U)
+
+    # y[k] = D·u[k] + Σ_{j<k} g[k-1-j]·u[j], via FFT em todos os sinais de uma vez
+    n_fft = scipy.fft.next_fast_len(2 * n_t)
+    G = np.fft.rfft(g[:n_t - 1], n=n_fft, axis=0)          # (f, ..., p, m)
+    Uf = np.fft.rfft(U, n=n_fft, axis=-1)                   # (..., m, f)
+    Y = np.fft.irfft(np.einsum('f...pm,...mf->...pf', G, Uf), n=n_fft, axis=-1)
+    y = np.einsum('...pm,...mk->...pk', D, U)
+    y[..., 1:] += Y[..., :n_t - 1]
+    return y
+
+
+def simular_tf(num, den, T, U):
+    """
+    Resposta de num/den a um ou mais sinais de entrada na grade T.
+    U tem forma (n_t,) ou (k, n_t); o resultado tem a mesma forma.
+    Grades não uniformes ou sistemas impróprios caem no forced_response.
+    """
+    num = np.trim_zeros(np.atleast_1d(np.asarray(num, dtype=float)), 'f')
+    den = np.trim_zeros(np.atleast_1d(np.asarray(den, dtype=float)), 'f')
+    T = np.asarray(T, dtype=float)
+    U = np.asarray(U, dtype=float)
+    lote = np.atleast_2d(U)
+
+    if len(num) == 0:
+        return np.zeros_like(U)
+    if len(num) > len(den) or _grade_uniforme(T) is None:
+        G = ctl.tf(num, den)
+        y = np.array([ctl.forced_response(G, T, u).outputs for u in lote])
+        return y.reshape(U.shape)
+
+    chave = _hash_conteudo("tf", num.tobytes(), den.tobytes())
+    if len(den) == 1:
+        y = num[0] / den[0] * lote
+    else:
+        A, B, C, D = scipy.signal.tf2ss(num, den)
+        y = simular_ss(A, B, C, D, T, lote[:, None, :], chave=chave)[:, 0, :]
+    return y.reshape(U.shape)
+
+
+PONTOS_PREVIA = 64
+
+
+def opcoes_grade(data):
+    """Opções de grade de tempo da requisição: "horizonte": "auto" e "previa"."""
+    return {"automatico": data.get("horizonte") == "auto", "previa": bool(data.get("previa"))}
+
+
+def grade_tempo(polos, t_final, n_pontos, automatico=False, previa=False, apos=0.0,
+                fator_assentamento=6.0, pontos_por_ciclo=30, pontos_por_tau=5,
+                n_min=200, n_max=2000):
+    """
+    Grade de tempo para respostas no tempo. Sem `automatico`, é a grade fixa
+    linspace(0, t_final, n_pontos) de sempre. Com `automatico`, o horizonte vem
+    do polo dominante (fator_assentamento/|Re p|, contado a partir de `apos`, o
+    instante do último degrau) e o passo vem do polo mais rápido e da maior
+    frequência de oscilação, limitado a [n_min, n_max] pontos.
+    Sistemas com polos instáveis mostram o crescimento até ~e^7; polos no eixo
+    imaginário mantêm o horizonte t_final. Com `previa`, o mesmo horizonte é
+    amostrado com só PONTOS_PREVIA pontos.
+    """
+    polos = np.asarray(polos, dtype=complex)
+    if not automatico or len(polos) == 0:
+        return np.linspace(0, t_final, PONTOS_PREVIA if previa else n_pontos)
+
+    reais = polos.real
+    modulos = np.abs(polos)
+    tol = 1e-9 * max(1.0, modulos.max())
+    if np.any(reais > tol):
+        horizonte = apos + 7.0 / reais.max()
+    elif np.any(np.abs(reais) <= tol):
+        horizonte = t_final
+    else:
+        horizonte = apos + fator_assentamento / np.abs(reais).min()
+
+    passo = horizonte / (n_min - 1)
+    if modulos.max() > 0:
+        passo = min(passo, 1.0 / (pontos_por_tau * modulos.max()))
+    omega_max = np.abs(polos.imag).max()
+    if omega_max > 0:
+        passo = min(passo, 2 * np.pi / (pontos_por_ciclo * omega_max))
+    n = int(np.clip(np.ceil(horizonte / passo) + 1, n_min, n_max))
+    return np.linspace(0, horizonte, PONTOS_PREVIA if previa else n)
+
+
+def resposta_degraus(T, degrau, degraus, degrau_em=None):
+    """
+    Resposta de um sistema LTI à entrada u(t) = Σ aᵢ·1(t − tᵢ), com
+    degraus = [(tᵢ, aᵢ), ...], por superposição: cada termo é a resposta ao
+    degrau unitário `degrau` (já calculada na grade T) deslocada de tᵢ e
+    escalada por aᵢ. Em grade uniforme, um tᵢ sobre uma amostra é só um
+    deslocamento de índices; um tᵢ entre amostras pede y(t − tᵢ) fora da
+    grade, que sai exato de degrau_em(τ) (resposta ao degrau em instantes
+    τ ≥ 0 arbitrários) ou, na falta dele, por interpolação linear.
+    Degraus antes de T[0] começam em T[0].
+    """
+    T = np.asarray(T, dtype=float)
+    degrau = np.asarray(degrau, dtype=float)
+    instantes, amplitudes = np.asarray(degraus, dtype=float).reshape(-1, 2).T
+    tau = T - T[0]
+    dt = _grade_uniforme(T)
+    y = np.zeros(len(T))
+    for instante, amplitude in zip(instantes, amplitudes):
+        atraso = max(instante, T[0]) - T[0]
+        apos = tau >= atraso
+        passos = atraso / dt if dt else 0.0
+        if dt and abs(passos - round(passos)) < 1e-9:
+            deslocada = degrau[:np.count_nonzero(apos)]
+        elif degrau_em is not None:
+            deslocada = degrau_em(tau[apos] - atraso)
+        else:
+            deslocada = np.interp(tau[apos] - atraso, tau, degrau)
+        y[apos] += amplitude * deslocada
+    return y
+
+
+# ---------------------------------------------------------------------------
+# Métricas da resposta ao degrau
+# Calculadas sobre a expressão analítica de y(t), não sobre uma simulação:
+# o valor final vem do ganho DC, e tempos de subida, de pico e de assentamento
+# são raízes isoladas por varredura e refinadas com brentq.
+# ---------------------------------------------------------------------------
+
+class _RespostaDegrauAnalitica:
+    """
+    y(t) e y'(t) da resposta ao degrau de num/den (própria, t ≥ 0). Com polos
+    simples bem condicionados usa a forma modal y(t) = y_f + Σ cᵢ·e^{pᵢt};
+    com polos repetidos (ou quase) cai na exponencial de matriz do sistema
+    aumentado [[A, B], [0, 0]], que não depende da multiplicidade.
+    """
+    def __init__(self, num, den):
+        self.direto = num[0] / den[0] if len(num) == len(den) else 0.0
+        resto = np.polysub(num, self.direto * den) if len(num) == len(den) else num
+        resto = np.trim_zeros(np.atleast_1d(resto), 'f')
+        if len(resto) == 0:
+            resto = np.zeros(1)
+        self.polos = np.roots(den)
+        self.y0 = self.direto
+
+        derivada = np.polyder(den)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.final = np.polyval(num, 0.0) / np.polyval(den, 0.0)
+            self.coef = np.polyval(resto, self.polos) / (self.polos * np.polyval(derivada, self.polos))
+        escala = max(abs(self.final), abs(self.direto), 1e-300)
+        distancias = np.abs(self.polos[:, None] - self.polos[None, :])
+        np.fill_diagonal(distancias, np.inf)
+        distintos = len(self.polos) < 2 or distancias.min() > 1e-6 * max(1.0, np.abs(self.polos).max())
+        # y(0⁺) = D confere a decomposição (falha com resíduos enormes que se cancelam)
+        self.modal = bool(distintos and np.all(np.isfinite(self.coef))
+                          and abs(self.final + self.coef.sum().real - self.direto) <= 1e-8 * (escala + np.abs(self.coef).sum()))
+        if not self.modal:
+            A, B, C, D = (m[0] for m in _ss_canonica_em_lote(
+                np.pad(num, (len(den) - len(num), 0))[None, :], np.asarray(den, dtype=float)[None, :]))
+            n = A.shape[0]
+            self._M = np.zeros((n + 1, n + 1))
+            self._M[:n, :n] = A
+            self._M[:n, n:] = B
+            self._A, self._B, self._C = A, B, C
+
+    def log_envelope(self, t):
+        """log de uma cota superior de |y(t) − y_f| (só na forma modal)."""
+        with np.errstate(divide="ignore"):
+            return np.logaddexp.reduce(np.log(np.abs(self.coef)) + self.polos.real * t)
+
+    def avaliar(self, t):
+        """(y, y') nos instantes t (array)."""
+        t = np.atleast_1d(np.asarray(t, dtype=float))
+        if self.modal:
+            E = self.coef[:, None] * np.exp(np.outer(self.polos, t))
+            return self.final + E.sum(axis=0).real, (self.polos @ E).real
+        n = self._A.shape[0]
+        dt = _grade_uniforme(t)
+        if dt is not None and t[0] == 0.0:
+            # Grade uniforme a partir de 0: recorrência exata x[k+1] = Φ·x[k] + Γ
+            Phi = scipy.linalg.expm(self._M * dt)
+            X = np.zeros((len(t), n))
+            for k in range(1, len(t)):
+                X[k] = Phi[:n, :n] @ X[k - 1] + Phi[:n, n]
+        else:
+            X = np.array([scipy.linalg.expm(self._M * tk)[:n, n] for tk in t])
+        y = X @ self._C[0] + self.direto
+        dy = (X @ self._A.T + self._B[:, 0]) @ self._C[0]
+        return y, dy
+
+
+def _extremo(T, dy, k, derivada):
+    """Instante do extremo amostrado em T[k], refinado no zero de y' entre as amostras vizinhas."""
+    if 0 < k < len(T) - 1 and np.sign(dy[k - 1]) != np.sign(dy[k + 1]):
+        return float(scipy.optimize.brentq(derivada, T[k - 1], T[k + 1], xtol=1e-12))
+    return float(T[k])
+
+
+def _primeira_passagem(T, valores, nivel, funcao):
+    """Primeiro instante em que `valores` (na grade T) atinge `nivel`, refinado em funcao(t) − nivel."""
+    acima = np.flatnonzero(valores >= nivel)
+    if len(acima) == 0:
+        return None
+    k = acima[0]
+    if k == 0:
+        return float(T[0])
+    return float(scipy.optimize.brentq(lambda t: funcao(t) - nivel, T[k - 1], T[k], xtol=1e-12))
+
+
+def info_degrau(num, den, faixas=(0.02, 0.05), n_max=50000):
+    """
+    Métricas da resposta ao degrau de num/den: valor final (ganho DC), tempo de
+    subida (10–90%), instante e valor de pico, sobressinal e subsinal (%) e
+    tempo de assentamento para cada faixa relativa em `faixas`. Sistemas
+    instáveis ou marginalmente estáveis devolvem "estavel": False e métricas None.
+    """
+    num = np.trim_zeros(np.atleast_1d(np.asarray(num, dtype=float)), 'f')
+    den = np.trim_zeros(np.atleast_1d(np.asarray(den, dtype=float)), 'f')
+    rotulos = {f"{100 * faixa:g}%": None for faixa in faixas}
+    info = {"estavel": False, "valor_final": None, "valor_inicial": None, "tempo_subida": None,
+            "tempo_pico": None, "pico": None, "sobressinal": None, "subsinal": None,
+            "tempo_assentamento": dict(rotulos)}
+    if len(num) == 0:
+        num = np.zeros(1)
+    if len(num) > len(den):
+        return info
+    polos = np.roots(den)
+    if len(polos) and np.any(polos.real >= -1e-12 * max(1.0, np.abs(polos).max())):
+        return info
+
+    resposta = _RespostaDegrauAnalitica(num, den)
+    y_f, y_0 = float(resposta.final), float(resposta.y0)
+    info.update(estavel=True, valor_final=y_f, valor_inicial=y_0)
+    if len(polos) == 0 or not np.any(resposta.coef):
+        info.update(pico=y_f, sobressinal=0.0, subsinal=0.0,
+                    tempo_assentamento={rotulo: 0.0 for rotulo in rotulos})
+        return info
+
+    # Horizonte: onde a cota |y − y_f| cai abaixo da faixa mais estreita
+    sigma = np.abs(polos.real).min()
+    amplitude = max(abs(y_f), abs(y_0), np.abs(resposta.coef).sum() if resposta.modal else 0.0)
+    alvo = min(faixas) * (abs(y_f) if abs(y_f) > 1e-9 * amplitude else amplitude)
+    horizonte = (np.log(1.0 / min(faixas)) + 5 + 2 * len(polos)) / sigma
+    if resposta.modal and resposta.log_envelope(0.0) > np.log(0.5 * alvo):
+        horizonte = scipy.optimize.brentq(
+            lambda t: resposta.log_envelope(t) - np.log(0.5 * alvo), 0.0, 50 * horizonte)
+        horizonte *= 1.05
+    passo = min(horizonte / 400, 1.0 / (10 * np.abs(polos).max()))
+    if np.abs(polos.imag).max() > 0:
+        passo = min(passo, 2 * np.pi / (40 * np.abs(polos.imag).max()))
+    T = np.linspace(0.0, horizonte, int(min(np.ceil(horizonte / passo), n_max)) + 1)
+    y, dy = resposta.avaliar(T)
+    y_t = lambda t: resposta.avaliar([t])[0][0]
+    dy_t = lambda t: resposta.avaliar([t])[1][0]
+
+    amplitude = max(amplitude, np.abs(y).max())
+    referencia = abs(y_f) if abs(y_f) > 1e-9 * amplitude else amplitude
+
+    # Assentamento: última saída da faixa, refinada entre as amostras vizinhas
+    erro = np.abs(y - y_f)
+    assentamento = {}
+    for faixa, rotulo in zip(faixas, rotulos):
+        limite = faixa * referencia
+        fora = np.flatnonzero(erro > limite)
+        if len(fora) == 0:
+            assentamento[rotulo] = 0.0
+        elif fora[-1] == len(T) - 1:
+            assentamento[rotulo] = None
+        else:
+            k = fora[-1]
+            assentamento[rotulo] = float(scipy.optimize.brentq(
+                lambda t: abs(y_t(t) - y_f) - limite, T[k], T[k + 1], xtol=1e-12))
+    info["tempo_assentamento"] = assentamento
+
+    if abs(y_f) <= 1e-9 * amplitude:
+        return info
+
+    # Subida de 10% a 90% do caminho entre y(0⁺) e y_f
+    normal = lambda t: (y_t(t) - y_0) / (y_f - y_0)
+    if abs(y_f - y_0) > 1e-12 * amplitude:
+        yn = (y - y_0) / (y_f - y_0)
+        t10 = _primeira_passagem(T, yn, 0.1, normal)
+        t90 = _primeira_passagem(T, yn, 0.9, normal)
+        if t10 is not None and t90 is not None:
+            info["tempo_subida"] = t90 - t10
+
+    # Pico: máximo no sentido de y_f, refinado no zero de y'
+    sinal = np.sign(y_f)
+    k = int(np.argmax(sinal * y))
+    if sinal * y[k] > sinal * y_f and 0 < k < len(T) - 1:
+        t_pico = _extremo(T, dy, k, dy_t)
+        pico = y_t(t_pico)
+        info.update(tempo_pico=t_pico, pico=float(pico), sobressinal=float(100 * (pico - y_f) / y_f))
+    else:
+        info.update(pico=y_f, sobressinal=0.0)
+
+    # Subsinal: excursão no sentido oposto a y_f (fase não mínima)
+    k = int(np.argmin(sinal * y))
+    vale = sinal * y_t(_extremo(T, dy, k, dy_t)) if sinal * y[k] < -1e-9 * amplitude else 0.0
+    info["subsinal"] = float(max(0.0, -vale) / abs(y_f) * 100)
+    return info
+
+
+# ---------------------------------------------------------------------------
+# Discretização
+# c2d por ZOH, FOH, Tustin (com pré-distorção opcional) e casamento de polos e
+# zeros, memorizada por (planta, Ts, método). Os coeficientes saem na forma em
+# z⁻¹ com o mesmo comprimento em b e a (a[0] = 1), prontos para lfilter.
+# ---------------------------------------------------------------------------
+
+METODOS_C2D = ("zoh", "foh", "tustin", "casado")
+_cache_c2d = CacheLRU(max_itens=512, ttl=600)
+
+
+def _normalizar_z(b, a):
+    b = np.trim_zeros(np.atleast_1d(np.real(np.asarray(b, dtype=complex))), 'f')
+    a = np.trim_zeros(np.atleast_1d(np.real(np.asarray(a, dtype=complex))), 'f')
+    b = np.concatenate([np.zeros(len(a) - len(b)), b]) / a[0]
+    return b, a / a[0]
+
+
+def _c2d_casado(num, den, Ts):
+    """Casamento de polos e zeros: z = e^{sTs}; zeros no infinito vão para z = −1, menos um (atraso de uma amostra)."""
+    zeros = np.roots(num) if len(num) > 1 else np.array([])
+    polos = np.roots(den)
+    excesso = len(polos) - len(zeros)
+    b = np.atleast_1d(np.poly(np.concatenate([np.exp(zeros * Ts), -np.ones(max(excesso - 1, 0))])))
+    a = np.atleast_1d(np.poly(np.exp(polos * Ts)))
+    # Ganho casado num ponto real s₀ (s₀ = 0, o ganho DC, quando não há raiz na origem)
+    raizes = np.concatenate([polos, zeros])
+    candidatos = [0.0] + [-c / Ts for c in (0.1, 0.37, 1.3)]
+    s0 = next((c for c in candidatos if not len(raizes) or np.abs(raizes - c).min() > 1e-6 * max(1.0, abs(c))),
+              candidatos[-1])
+    z0 = np.exp(s0 * Ts)
+    ganho = (np.polyval(num, s0) / np.polyval(den, s0)) / (np.polyval(b, z0) / np.polyval(a, z0))
+    return ganho.real * b, a
+
+
+def discretizar(num, den, Ts, metodo="zoh", omega_prewarp=None):
+    """
+    Equivalente discreto (b, a) de num/den com período Ts. Métodos: "zoh",
+    "foh", "tustin" (com omega_prewarp, a resposta casa exatamente nessa
+    frequência) e "casado". O resultado é memorizado e somente leitura.
+    """
+    num = np.trim_zeros(np.atleast_1d(np.asarray(num, dtype=float)), 'f')
+    den = np.trim_zeros(np.atleast_1d(np.asarray(den, dtype=float)), 'f')
+    if metodo not in METODOS_C2D:
+        raise ValueError(f"Método de discretização desconhecido: {metodo}")
+    prewarp = float(omega_prewarp) if metodo == "tustin" and omega_prewarp else None
+    chave = _hash_conteudo("c2d", num.tobytes(), den.tobytes(), float(Ts), metodo, prewarp)
+
+    def calcular():
+        if metodo == "casado":
+            b, a = _c2d_casado(num, den, Ts)
+        elif metodo == "tustin":
+            # s = c·(z − 1)/(z + 1), com c = 2/Ts ou c = ω/tan(ωTs/2) pré-distorcido
+            fs = 1.0 / Ts if prewarp is None else prewarp / (2 * np.tan(prewarp * Ts / 2))
+            b, a = scipy.signal.bilinear(num, den, fs=fs)
+        else:
+            b, a, _ = scipy.signal.cont2discrete((num, den), Ts, method=metodo)
+        b, a = _normalizar_z(np.ravel(b), a)
+        b.flags.writeable = a.flags.writeable = False
+        return b, a
+    return _cache_c2d.obter_ou_criar(chave, calcular)
+
+
+def degrau_discreto(b, a, n):
+    """Resposta ao degrau unitário de b/a (em z⁻¹) nas amostras k = 0..n−1, pela equação de diferenças."""
+    return scipy.signal.lfilter(b, a, np.ones(n))
+
+
+# ---------------------------------------------------------------------------
+# Lugar das raízes
+# Raízes de D(s) + k·N(s) para um vetor inteiro de ganhos numa única chamada
+# de autovalores sobre matrizes companheiras empilhadas. A grade de ganhos é
+# refinada onde as raízes andam mais que uma fração da escala do gráfico.
+# Assíntotas, pontos de separação/entrada e cruzamentos do eixo jω saem de
+# forma analítica.
+# ---------------------------------------------------------------------------
+
+def _raizes_em_lote(den, num, ganhos):
+    """Raízes de den + k·num para cada k de `ganhos`: array (len(ganhos), grau)."""
+    grau = max(len(den), len(num)) - 1
+    D = np.concatenate([np.zeros(grau + 1 - len(den)), den])
+    N = np.concatenate([np.zeros(grau + 1 - len(num)), num])
+    P = D[None, :] + ganhos[:, None] * N[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        P = P[:, 1:] / P[:, :1]
+    if grau == 0:
+        return np.empty((len(ganhos), 0), dtype=complex)
+    C = np.zeros((len(ganhos), grau, grau))
+    C[:, 0, :] = -P
+    C[:, np.arange(1, grau), np.arange(grau - 1)] = 1.0
+    raizes = np.full((len(ganhos), grau), np.nan + 0j)
+    finitos = np.all(np.isfinite(P), axis=1)
+    raizes[finitos] = np.linalg.eigvals(C[finitos])
+    return raizes
+
+
+def _polinomio_em_jw(p):
+    """Partes real e imaginária de p(jω) como polinômios reais em ω."""
+    potencias = np.arange(len(p) - 1, -1, -1)
+    c = p * (1j ** potencias)
+    return np.real(c), np.imag(c)
+
+
+def pontos_notaveis_lgr(num, den):
+    """
+    Assíntotas (centróide e ângulos em graus), pontos de separação/entrada
+    (raízes de N·D' − N'·D com k = −D/N real e positivo) e cruzamentos do eixo
+    jω (ω ≥ 0 onde −D(jω)/N(jω) é real e positivo), para k de 0 a ∞.
+    """
+    polos = np.roots(den)
+    zeros = np.roots(num)
+    excesso = len(polos) - len(zeros)
+    assintotas = None
+    if excesso > 0:
+        centroide = float(np.real(np.sum(polos) - np.sum(zeros)) / excesso)
+        angulos = [float(np.degrees((2 * q + 1) * np.pi / excesso)) for q in range(excesso)]
+        assintotas = {"centroide": centroide, "angulos": angulos}
+
+    separacao = []
+    candidatos = np.roots(np.polysub(np.polymul(num, np.polyder(den)), np.polymul(np.polyder(num), den)))
+    for s in candidatos:
+        n_s = np.polyval(num, s)
+        if abs(n_s) < 1e-12:
+            continue
+        k = -np.polyval(den, s) / n_s
+        if k.real > 0 and abs(k.imag) <= 1e-6 * max(1.0, abs(k)):
+            separacao.append({"s": complex(s), "k": float(k.real)})
+
+    cruzamentos = []
+    Dr, Di = _polinomio_em_jw(den)
+    Nr, Ni = _polinomio_em_jw(num)
+    condicao = np.trim_zeros(np.polysub(np.polymul(Di, Nr), np.polymul(Dr, Ni)), 'f')
+    if len(condicao) > 1:
+        for w in np.roots(condicao):
+            if abs(w.imag) > 1e-7 * max(1.0, abs(w)) or w.real < -1e-9:
+                continue
+            w = max(float(w.real), 0.0)
+            nr, ni = np.polyval(Nr, w), np.polyval(Ni, w)
+            modulo = nr * nr + ni * ni
+            if modulo < 1e-24:
+                continue
+            k = -(np.polyval(Dr, w) * nr + np.polyval(Di, w) * ni) / modulo
+            if k > 0:
+                cruzamentos.append({"omega": w, "k": float(k)})
+    return assintotas, separacao, cruzamentos
+
+
+def _rastrear_ramos(raizes):
+    """Reordena as colunas de cada linha para continuar o ramo da linha anterior."""
+    raizes = raizes.copy()
+    for i in range(1, len(raizes)):
+        distancia = np.abs(raizes[i - 1][:, None] - raizes[i][None, :])
+        distancia = np.where(np.isfinite(distancia), distancia, 1e300)
+        _, colunas = scipy.optimize.linear_sum_assignment(distancia)
+        raizes[i] = raizes[i][colunas]
+    return raizes
+
+
+def lugar_raizes(num, den, n_inicial=30, tol=0.005, passo_max=0.2, niveis=10, n_max=600):
+    """
+    Lugar das raízes de 1 + k·N(s)/D(s) = 0, k ≥ 0. Parte de n_inicial ganhos
+    (0 e uma faixa log-espaçada em torno dos ganhos notáveis) mais os ganhos
+    exatos de separação e de cruzamento do eixo jω, e subdivide cada intervalo
+    em que, no ganho intermediário, alguma raiz visível se afasta da reta entre
+    as vizinhas por mais de tol × escala do gráfico (ou anda mais que
+    passo_max × escala). Trechos retos ficam com poucos pontos; separações e
+    curvas fechadas, com muitos.
+    Retorna dict com ganhos, ramos (grau × len(ganhos), complexo), polos,
+    zeros, assíntotas, separação e cruzamentos.
+    """
+    num = np.trim_zeros(np.atleast_1d(np.asarray(num, dtype=float)), 'f')
+    den = np.trim_zeros(np.atleast_1d(np.asarray(den, dtype=float)), 'f')
+    polos, zeros = np.roots(den), np.roots(num)
+    assintotas, separacao, cruzamentos = pontos_notaveis_lgr(num, den)
+
+    notaveis = np.concatenate([polos, zeros, [p["s"] for p in separacao],
+                               [1j * c["omega"] for c in cruzamentos]])
+    escala = max(1.0, float(np.max(np.abs(notaveis)))) if notaveis.size else 1.0
+    raio_visivel = 3.0 * escala
+
+    # Ganho característico: mediana de |D/N| num semicírculo de raio 1,5·escala no
+    # semiplano esquerdo, mais os ganhos notáveis; a faixa inicial cobre 3 décadas
+    # para cada lado
+    ganhos_notaveis = [p["k"] for p in separacao] + [c["k"] for c in cruzamentos]
+    s0 = 1.5 * escala * np.exp(1j * np.linspace(0.6 * np.pi, 1.4 * np.pi, 7))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k0 = float(np.median(np.abs(np.polyval(den, s0) / np.polyval(num, s0))))
+    if np.isfinite(k0) and k0 > 0:
+        ganhos_notaveis.append(k0)
+    ganhos_notaveis = np.array(ganhos_notaveis or [1.0])
+    k_min, k_max = ganhos_notaveis.min() * 1e-3, ganhos_notaveis.max() * 1e3
+    ganhos = np.unique(np.concatenate([[0.0], np.geomspace(k_min, k_max, n_inicial), ganhos_notaveis]))
+    raizes = _raizes_em_lote(den, num, ganhos)
+    ativos = np.ones(len(ganhos) - 1, dtype=bool)
+
+    def mais_proxima(origem, alvo):
+        d = np.abs(origem[:, :, None] - alvo[:, None, :])
+        d = np.where(np.isfinite(d), d, np.inf)
+        return np.take_along_axis(alvo, np.argmin(d, axis=2), axis=1)
+
+    for _ in range(niveis):
+        idx = np.flatnonzero(ativos)
+        restante = n_max - len(ganhos)
+        if idx.size == 0 or restante <= 0 or raizes.shape[1] == 0:
+            break
+        idx = idx[:restante]
+        k_a, k_b = ganhos[idx], ganhos[idx + 1]
+        meio = np.where(k_a > 0, np.sqrt(k_a * k_b), k_b / 2)
+        r_a, r_b = raizes[idx], raizes[idx + 1]
+        r_m = _raizes_em_lote(den, num, meio)
+
+        # Desvio do ponto intermediário em relação à reta entre os vizinhos
+        previsto = (r_a + mais_proxima(r_a, r_b)) / 2
+        desvio = np.abs(mais_proxima(previsto, r_m) - previsto)
+        passo = np.abs(mais_proxima(r_a, r_b) - r_a)
+        visivel = np.abs(r_a) < raio_visivel
+        with np.errstate(invalid="ignore"):
+            criterio = np.where(visivel & np.isfinite(desvio),
+                                np.maximum(desvio / tol, passo / passo_max), 0.0).max(axis=1) / escala
+        refinar = criterio > 1.0
+
+        ganhos = np.concatenate([ganhos, meio])
+        raizes = np.concatenate([raizes, r_m])
+        ordem = np.argsort(ganhos, kind="stable")
+        posicao = np.empty(len(ganhos), dtype=int)
+        posicao[ordem] = np.arange(len(ganhos))
+        novos_ativos = np.zeros(len(ganhos) - 1, dtype=bool)
+        novos_ativos[posicao[idx]] = refinar
+        novos_ativos[posicao[idx] + 1] = refinar
+        ganhos, raizes, ativos = ganhos[ordem], raizes[ordem], novos_ativos
+
+    # Corta a cauda em que todas as raízes já saíram da região visível
+    dentro = np.flatnonzero(np.any(np.abs(raizes) < raio_visivel, axis=1))
+    if dentro.size:
+        fim = min(dentro[-1] + 2, len(ganhos))
+        ganhos, raizes = ganhos[:fim], raizes[:fim]
+
+    ramos = _rastrear_ramos(raizes).T
+    return {
+        "ganhos": ganhos,
+        "ramos": ramos,
+        "polos": polos,
+        "zeros": zeros,
+        "assintotas": assintotas,
+        "separacao": separacao,
+        "cruzamentos": cruzamentos,
+        "escala": escala,
+    }
+
+
+class IndiceLGR:
+    """
+    Índice espacial sobre os pontos calculados de um lugar das raízes: KD-tree
+    em (Re, Im, ramo), com o ramo escalado por uma distância maior que a extensão
+    do lugar. Com o ramo informado (o traço clicado), a busca fica nesse ramo,
+    o que desfaz a ambiguidade onde ramos se cruzam ou se encontram (pontos de
+    separação); sem ele, a busca é só em (Re, Im). Responde em microssegundos
+    "qual ganho leva um polo a este ponto" (com interpolação no segmento do
+    ramo e os polos exatos em K) e "que ganho dá amortecimento ζ".
+    """
+    def __init__(self, num, den, lgr):
+        self.num = np.trim_zeros(np.atleast_1d(np.asarray(num, dtype=float)), 'f')
+        self.den = np.trim_zeros(np.atleast_1d(np.asarray(den, dtype=float)), 'f')
+        self.ganhos = lgr["ganhos"]
+        self.ramos = lgr["ramos"]
+        n_ramos, n_ganhos = self.ramos.shape
+        pontos = self.ramos.ravel()
+        validos = np.flatnonzero(np.isfinite(pontos))
+        self._ramo, self._posicao = np.divmod(validos, n_ganhos)
+        plano = np.column_stack([pontos[validos].real, pontos[validos].imag])
+        self._arvore = scipy.spatial.cKDTree(plano)
+        # Terceira coordenada: ramo × (extensão + 1), então o vizinho mais próximo
+        # de (Re, Im, ramo × escala) está sempre no mesmo ramo
+        self._escala_ramo = 10.0 * (np.ptp(plano, axis=0).max() + 1.0) if len(plano) else 1.0
+        self._arvore_ramos = scipy.spatial.cKDTree(np.column_stack([plano, self._escala_ramo * self._ramo]))
+
+    def polos_em(self, k):
+        """Todos os polos de malha fechada para o ganho k (exatos, via np.roots)."""
+        return np.roots(np.polyadd(self.den, k * self.num))
+
+    @staticmethod
+    def _descrever(s, k, polos):
+        modulo = abs(s)
+        return {
+            "k": float(k),
+            "polo": [float(s.real), float(s.imag)],
+            "zeta": float(-s.real / modulo) if modulo > 0 else 1.0,
+            "omega_n": float(modulo),
+            "polos": [[float(p.real), float(p.imag)] for p in polos],
+        }
+
+    def ponto_mais_proximo(self, s, ramo=None):
+        """
+        Ponto do lugar mais próximo de s (no ramo dado, se houver): ganho
+        interpolado no segmento do ramo, ζ, ωn e polos.
+        """
+        if not len(self._ramo):
+            return None
+        s = complex(s)
+        if ramo is not None and 0 <= ramo < len(self.ramos) and np.any(self._ramo == ramo):
+            _, i = self._arvore_ramos.query([s.real, s.imag, self._escala_ramo * ramo])
+        else:
+            _, i = self._arvore.query([s.real, s.imag])
+        ramo, j = self._ramo[i], self._posicao[i]
+        distancia = abs(self.ramos[ramo, j] - s)
+        linha = self.ramos[ramo]
+
+        # Projeta s nos dois segmentos vizinhos da amostra e fica com o mais próximo
+        melhor = (distancia, self.ganhos[j], linha[j])
+        for vizinho in (j - 1, j + 1):
+            if 0 <= vizinho < len(linha) and np.isfinite(linha[vizinho]):
+                a, b = linha[j], linha[vizinho]
+                t = np.clip(np.real((s - a) * np.conj(b - a)) / max(abs(b - a) ** 2, 1e-300), 0.0, 1.0)
+                d = abs(a + t * (b - a) - s)
+                if d < melhor[0]:
+                    melhor = (d, self.ganhos[j] + t * (self.ganhos[vizinho] - self.ganhos[j]), a + t * (b - a))
+        _, k, no_ramo = melhor
+        polos = self.polos_em(k)
+        # O polo exato em k mais próximo do ponto do ramo (não do clique)
+        polo = polos[np.argmin(np.abs(polos - no_ramo))] if len(polos) else s
+        return self._descrever(polo, k, polos)
+
+    def ganho_para_amortecimento(self, zeta):
+        """
+        Ganhos em que algum polo complexo (Im > 0) tem amortecimento ζ, a partir
+        das trocas de sinal de ζ(k) − ζ_alvo ao longo de cada ramo, refinadas por
+        brentq sobre o polo exato.
+        """
+        solucoes = []
+        with np.errstate(invalid="ignore", divide="ignore"):
+            amortecimento = -self.ramos.real / np.abs(self.ramos)
+        for ramo, (linha, z) in enumerate(zip(self.ramos, amortecimento)):
+            f = z - zeta
+            troca = np.flatnonzero((np.sign(f[:-1]) * np.sign(f[1:]) < 0)
+                                   & (linha[:-1].imag > 0) & (linha[1:].imag > 0))
+            for j in troca:
+                k_a, k_b = self.ganhos[j], self.ganhos[j + 1]
+                alvo = linha[j]
+
+                def erro(k):
+                    polos = self.polos_em(k)
+                    p = polos[np.argmin(np.abs(polos - alvo))]
+                    return -p.real / abs(p) - zeta
+
+                k = scipy.optimize.brentq(erro, k_a, k_b, xtol=1e-12 * max(1.0, k_b))
+                polos = self.polos_em(k)
+                solucoes.append(self._descrever(polos[np.argmin(np.abs(polos - alvo))], k, polos))
+        return sorted(solucoes, key=lambda r: r["k"])
+
+
+def fatores_de_polinomios(num, den):
+    """Converte (num, den) em (polos, zeros, ganho) para usar em resposta_frequencia."""
+    num = np.trim_zeros(np.atleast_1d(np.asarray(num, dtype=float)), 'f')
+    den = np.trim_zeros(np.atleast_1d(np.asarray(den, dtype=float)), 'f')
+    if len(num) == 0:
+        return np.roots(den), np.array([]), 0.0
+    return np.roots(den), np.roots(num), num[0] / den[0]
+
+
 @app.route('/')
 def home():
     return redirect('/principal')
@@ -38,7 +1856,7 @@ def alocacao():
 
 @app.route('/atualizar', methods=['POST'])
 def atualizar():
-    data = request.get_json()
+    data = dados_requisicao()
     tipo = data.get("tipo", "Caso 1")
 
     # Recebe os parâmetros da planta
@@ -50,16 +1868,12 @@ def atualizar():
 
     # Define a função de transferência da planta
     if tipo == "Caso 1":
-        num = np.poly([z_1])
-        den = np.poly([p1_1])
+        modelo = obter_modelo([p1_1], [z_1])
     elif tipo == "Caso 2":
-        num = np.poly([z_2])
-        den = np.poly([p1_2, p2_2])
+        modelo = obter_modelo([p1_2, p2_2], [z_2])
     else:
-        num = [1]
-        den = [1]
-
-    G = ctl.tf(num, den)
+        modelo = obter_modelo()
+    num, den = modelo.polinomios("planta")
 
     # Define as funções de transferência
     latex_planta = f"\\[ G_{{planta}}(s) = \\frac{{{np.poly1d(num)}}}{{{np.poly1d(den)}}} \\]"
@@ -67,53 +1881,37 @@ def atualizar():
     latex_open = "\\[ G_{{open}}(s) = G_{{planta}}(s) \\cdot G_{{controlador}}(s) \\]"
     latex_closed = "\\[ G_{{closed}}(s) = \\frac{{G_{{open}}(s)}}{{1 + G_{{open}}(s)}} \\]"
 
-    # Gera os gráficos
-    fig, axs = plt.subplots(1, 2, figsize=(12, 6))
-
-    # Diagrama de Polos e Zeros
-    zeros = np.roots(num)
-    poles = np.roots(den)
-    axs[0].scatter(np.real(zeros), np.imag(zeros), label="Zeros", color="blue")
-    axs[0].scatter(np.real(poles), np.imag(poles), label="Polos", color="red")
-    axs[0].set_title("Diagrama de Polos e Zeros")
-    axs[0].grid(True)
-    axs[0].legend()
-
-    # Resposta ao Degrau (Malha Aberta)
-    T, yout = ctl.step_response(G)
-    axs[1].plot(T, yout)
-    axs[1].set_title("Resposta ao Degrau (Malha Aberta)")
-    axs[1].grid(True)
-
     t_perturb = float(data.get("t_perturb", 20))
     amp_perturb = float(data.get("amp_perturb", 0.5))
 
     # Resposta ao degrau (sem perturbação)
-    T, yout_step = ctl.step_response(G)
+    grade = opcoes_grade(data)
+    T_long = grade_tempo(modelo.fatores("planta")[0], 50, 1000, **grade, apos=t_perturb)
+    yout_step = modelo.degrau("planta", T_long)
 
-    # Resposta ao degrau + perturbação
-    T_long = np.linspace(0, 50, 1000)
-    u = np.ones_like(T_long)
-    u[T_long >= t_perturb] += amp_perturb
-    T_resp, yout_perturb = ctl.forced_response(G, T_long, u)
+    # Resposta ao degrau + perturbação, por superposição de degraus
+    yout_perturb = modelo.degraus("planta", T_long, [(0.0, 1.0), (t_perturb, amp_perturb)])
 
-    return jsonify({
+    return responder({
         "latex_planta": latex_planta,
         "latex_controlador": latex_controlador,
         "latex_open": latex_open,
         "latex_closed": latex_closed,
         "plot_data": {
-            "T": T_long.tolist(),
-            "yout_step": np.interp(T_long, T, yout_step).tolist(),
-            "yout_perturb": yout_perturb.tolist(),
+            "T": T_long,
+            "yout_step": yout_step,
+            "yout_perturb": yout_perturb,
             "t_perturb": t_perturb,
             "amp_perturb": amp_perturb
-        }
+        },
+        "info_degrau": modelo.info_degrau("planta")
     })
 
 @app.route('/atualizar_bode', methods=['POST'])
 def atualizar_bode():
-    data = request.get_json()
+    return responder(calcular_atualizar_bode(dados_requisicao()))
+
+def calcular_atualizar_bode(data):
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [0])]
     polos_controlador = [float(p) for p in data.get("polos_controlador", [-1])]
@@ -131,55 +1929,20 @@ def atualizar_bode():
     zeros_controlador_filtrados = [z for z in zeros_controlador if abs(z) > 1e-8]
     polos_controlador_filtrados = [p for p in polos_controlador if abs(p) > 1e-8]
 
-    num_planta = np.poly(zeros_planta_filtrados) if zeros_planta_filtrados else np.array([1.0])
-    den_planta = np.poly(polos_planta_filtrados)
-    num_controlador = np.poly(zeros_controlador_filtrados) if zeros_controlador_filtrados else np.array([1.0])
-    num_controlador = ganho_controlador * num_controlador
-    den_controlador = np.poly(polos_controlador_filtrados)
+    modelo = obter_modelo(polos_planta_filtrados, zeros_planta_filtrados, 1.0,
+                          polos_controlador_filtrados, zeros_controlador_filtrados, ganho_controlador)
 
-    num_open = np.polymul(num_planta, num_controlador)
-    den_open = np.polymul(den_planta, den_controlador)
-    G_open = ctl.tf(num_open, den_open)
+    omega = escolher_omega(data, lambda: modelo.grade_frequencia("aberta"))
+    resposta = modelo.frequencia("aberta", omega)
+    bode_data = montar_bode(resposta, sensibilidade=bool(data.get("sensibilidade", False)))
 
-    omega = np.logspace(-2, 2, 500)  # Frequências de 0.01 a 100 rad/s
-    mag, phase, omega = ctl.bode(G_open, omega=omega, dB=True, plot=False)
-
-    bode_data = {
-        "data": [
-            {
-                "x": omega.tolist(),
-                "y": 20 * np.log10(mag).tolist(),
-                "type": "scatter",
-                "mode": "lines",
-                "name": "Magnitude"
-            },
-            {
-                "x": omega.tolist(),
-                "y": np.degrees(phase).tolist(),
-                "type": "scatter",
-                "mode": "lines",
-                "name": "Fase",
-                "yaxis": "y2"
-            }
-        ],
-        "layout": {
-            "title": "Diagrama de Bode",
-            "xaxis": {"title": "Frequência (rad/s)", "type": "log"},
-            "yaxis": {"title": "Magnitude (dB)"},
-            "yaxis2": {
-                "title": "Fase (graus)",
-                "overlaying": "y",
-                "side": "right"
-            },
-            "legend": {"x": 0, "y": 1.1, "orientation": "h"}
-        }
-    }
-
-    return jsonify({"bode_data": bode_data})
+    return {"bode_data": bode_data}
 
 @app.route('/atualizar_nyquist', methods=['POST'])
 def atualizar_nyquist():
-    data = request.get_json()
+    return responder(calcular_atualizar_nyquist(dados_requisicao()))
+
+def calcular_atualizar_nyquist(data):
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [0])]
     polos_controlador = [float(p) for p in data.get("polos_controlador", [-1])]
@@ -191,25 +1954,18 @@ def atualizar_nyquist():
     zeros_controlador_filtrados = [z for z in zeros_controlador if abs(z) > 1e-8]
     polos_controlador_filtrados = [p for p in polos_controlador if abs(p) > 1e-8]
 
-    num_planta = np.poly(zeros_planta_filtrados) if zeros_planta_filtrados else np.array([1.0])
-    den_planta = np.poly(polos_planta_filtrados) if polos_planta_filtrados else np.array([1.0])
-    num_controlador = np.poly(zeros_controlador_filtrados) if zeros_controlador_filtrados else np.array([1.0])
-    num_controlador = ganho_controlador * num_controlador
-    den_controlador = np.poly(polos_controlador_filtrados) if polos_controlador_filtrados else np.array([1.0])
-
-    num_open = np.polymul(num_planta, num_controlador)
-    den_open = np.polymul(den_planta, den_controlador)
-    G_open = ctl.tf(num_open, den_open)
+    modelo = obter_modelo(polos_planta_filtrados, zeros_planta_filtrados, 1.0,
+                          polos_controlador_filtrados, zeros_controlador_filtrados, ganho_controlador)
 
-    omega = np.logspace(-2, 2, 500)
-    _, H, _ = ctl.freqresp(G_open, omega)
-    real = np.real(H[0]).tolist() if H.ndim == 3 else np.real(H).tolist()
-    imag = np.imag(H[0]).tolist() if H.ndim == 3 else np.imag(H).tolist()
+    omega = escolher_omega(data, lambda: modelo.grade_frequencia("aberta"))
+    H = modelo.frequencia("aberta", omega)["L"]
+    real = np.real(H)
+    imag = np.imag(H)
 
     nyquist_data = {
         "data": [
             {"x": real, "y": imag, "mode": "lines", "name": "Nyquist"},
-            {"x": real, "y": [-i for i in imag], "mode": "lines", "name": "Nyquist (espelhado)", "line": {"dash": "dash"}}
+            {"x": real, "y": -imag, "mode": "lines", "name": "Nyquist (espelhado)", "line": {"dash": "dash"}}
         ],
         "layout": {
             "title": "Diagrama de Nyquist",
@@ -220,11 +1976,13 @@ def atualizar_nyquist():
             "yaxis_scaleratio": 1
         }
     }
-    return jsonify({"nyquist_data": nyquist_data})
+    return {"nyquist_data": nyquist_data}
 
 @app.route('/atualizar_pagina4', methods=['POST'])
 def atualizar_pagina4():
-    data = request.get_json()
+    return responder(calcular_atualizar_pagina4(dados_requisicao()))
+
+def calcular_atualizar_pagina4(data):
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [0])]
     polos_controlador = [float(p) for p in data.get("polos_controlador", [-1])]
@@ -235,38 +1993,40 @@ def atualizar_pagina4():
     t_perturb_fechada = float(data.get("t_perturb_fechada", 20))
     amp_perturb_fechada = float(data.get("amp_perturb_fechada", 0.5))
 
-    # Ensure num_planta and den_planta are arrays
-    num_planta = np.array([ganho_planta]) * (np.poly(zeros_planta) if zeros_planta else np.array([1.0]))
-    den_planta = np.poly(polos_planta) if polos_planta else np.array([1.0])
-    num_controlador = np.array([ganho_controlador]) * (np.poly(zeros_controlador) if zeros_controlador else np.array([1.0]))
-    den_controlador = np.poly(polos_controlador) if polos_controlador else np.array([1.0])
+    modelo = obter_modelo(polos_planta, zeros_planta, ganho_planta,
+                          polos_controlador, zeros_controlador, ganho_controlador)
+    num_planta, den_planta = modelo.polinomios("planta")
+    den_controlador = modelo.den_controlador
 
-    G_planta = ctl.tf(num_planta, den_planta)
-    G_controlador = ctl.tf(num_controlador, den_controlador)
-    G_closed = ctl.feedback(G_planta * G_controlador)
+    G_planta = modelo.tf("planta")
+
+    grade = opcoes_grade(data)
 
     # Resposta ao degrau (Malha Aberta - apenas planta)
-    T_open, yout_open = ctl.step_response(G_planta)
+    if grade["automatico"] or grade["previa"]:
+        T_open = grade_tempo(modelo.fatores("planta")[0], 50, 1000, **grade)
+        yout_open = modelo.degrau("planta", T_open)
+    else:
+        T_open, yout_open = ctl.step_response(G_planta)
     plot_open_data = {
         "data": [
-            {"x": T_open.tolist(), "y": yout_open.tolist(), "mode": "lines", "name": "Resposta ao Degrau (Malha Aberta)"}
+            {"x": T_open, "y": yout_open, "mode": "lines", "name": "Resposta ao Degrau (Malha Aberta)"}
         ],
         "layout": {"title": "Resposta ao Degrau (Malha Aberta)", "xaxis": {"title": "Tempo (s)"}, "yaxis": {"title": "Amplitude"}}
     }
 
     # Resposta ao degrau (Malha Fechada - planta e controlador)
-    T = np.linspace(0, 50, 1000)
-    _, yout_closed = ctl.forced_response(G_closed, T, np.ones_like(T))
-    u_perturb = np.ones_like(T)
-    u_perturb[T >= t_perturb_fechada] += amp_perturb_fechada
-    _, yout_perturb = ctl.forced_response(G_closed, T, u_perturb)
-    _, yout_open_interp = ctl.forced_response(G_planta, T, np.ones_like(T))
+    # A perturbação é um segundo degrau: a resposta sai por superposição
+    T = grade_tempo(modelo.fatores("fechada")[0], 50, 1000, **grade, apos=t_perturb_fechada)
+    yout_closed = modelo.degrau("fechada", T)
+    yout_perturb = modelo.degraus("fechada", T, [(0.0, 1.0), (t_perturb_fechada, amp_perturb_fechada)])
+    yout_open_interp = modelo.degrau("planta", T)
 
     plot_closed_data = {
         "data": [
-            {"x": T.tolist(), "y": yout_closed.tolist(), "mode": "lines", "name": "Sem Perturbação"},
-            {"x": T.tolist(), "y": yout_perturb.tolist(), "mode": "lines", "name": "Com Perturbação"},
-            {"x": T.tolist(), "y": yout_open_interp.tolist(), "mode": "lines", "name": "Malha Aberta", "line": {"dash": "dash"}}
+            {"x": T, "y": yout_closed, "mode": "lines", "name": "Sem Perturbação"},
+            {"x": T, "y": yout_perturb, "mode": "lines", "name": "Com Perturbação"},
+            {"x": T, "y": yout_open_interp, "mode": "lines", "name": "Malha Aberta", "line": {"dash": "dash"}}
         ],
         "layout": {"title": "Resposta ao Degrau (Malha Fechada)", "xaxis": {"title": "Tempo (s)"}, "yaxis": {"title": "Amplitude"}}
     }
@@ -283,7 +2043,7 @@ def atualizar_pagina4():
     latex_controlador_parcial = f"\\[ G_c(s) = {ganho_controlador:.3g} \\cdot {latex_partial_fraction(np.poly(zeros_controlador) if zeros_controlador else [1.0], den_controlador, 's')[3:-3]} \\]"
 
 
-    return jsonify({
+    return {
         "latex_planta_polinomial": latex_planta_polinomial,
         "latex_planta_fatorada": latex_planta_fatorada,
         "latex_planta_parcial": latex_planta_parcial,
@@ -291,12 +2051,15 @@ def atualizar_pagina4():
         "latex_controlador_fatorada": latex_controlador_fatorada,
         "latex_controlador_parcial": latex_controlador_parcial,
         "plot_open_data": plot_open_data,
-        "plot_closed_data": plot_closed_data
-    })
+        "plot_closed_data": plot_closed_data,
+        "info_degrau": {"aberta": modelo.info_degrau("planta"), "fechada": modelo.info_degrau("fechada")}
+    }
 
 @app.route('/atualizar_pz_closed', methods=['POST'])
 def atualizar_pz_closed():
-    data = request.get_json()
+    return responder(calcular_atualizar_pz_closed(dados_requisicao()))
+
+def calcular_atualizar_pz_closed(data):
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [0])]
     polos_controlador = [float(p) for p in data.get("polos_controlador", [-1])]
@@ -305,37 +2068,24 @@ def atualizar_pz_closed():
     tipo = data.get("tipo", "malha_fechada")  # Recebe o tipo do frontend
 
     # Funções de transferência
-    num_planta = np.poly(zeros_planta) if zeros_planta else np.array([1.0])
-    den_planta = np.poly(polos_planta) if polos_planta else np.array([1.0])
-    num_controlador = ganho_controlador * (np.poly(zeros_controlador) if zeros_controlador else np.array([1.0]))
-    den_controlador = np.poly(polos_controlador) if polos_controlador else np.array([1.0])
+    modelo = obter_modelo(polos_planta, zeros_planta, 1.0,
+                          polos_controlador, zeros_controlador, ganho_controlador)
 
     if tipo == "planta":
         # Apenas planta
-        zeros = np.roots(num_planta)
-        polos = np.roots(den_planta)
+        zeros, polos = modelo.raizes("planta")
         titulo = "Diagrama de Polos e Zeros da Planta"
     elif tipo == "controlador":
         # Apenas controlador
-        zeros = np.roots(num_controlador)
-        polos = np.roots(den_controlador)
+        zeros, polos = modelo.raizes("controlador")
         titulo = "Diagrama de Polos e Zeros do Controlador"
     elif tipo == "malha_aberta":
         # Malha aberta: G(s)*Gc(s)
-        num_open = np.polymul(num_planta, num_controlador)
-        den_open = np.polymul(den_planta, den_controlador)
-        zeros = np.roots(num_open)
-        polos = np.roots(den_open)
+        zeros, polos = modelo.raizes("aberta")
         titulo = "Diagrama de Polos e Zeros (Malha Aberta)"
     else:
         # Malha fechada
-        G_planta = ctl.tf(num_planta, den_planta)
-        G_controlador = ctl.tf(num_controlador, den_controlador)
-        G_closed = ctl.feedback(G_planta * G_controlador)
-        num_closed = np.array(G_closed.num).flatten()
-        den_closed = np.array(G_closed.den).flatten()
-        zeros = np.roots(num_closed)
-        polos = np.roots(den_closed)
+        zeros, polos = modelo.raizes("fechada")
         titulo = "Diagrama de Polos e Zeros (Malha Fechada)"
 
     plot_pz_closed = {
@@ -351,7 +2101,7 @@ def atualizar_pz_closed():
         }
     }
 
-    return jsonify({"plot_pz_closed": plot_pz_closed})
+    return {"plot_pz_closed": plot_pz_closed}
 
 
 @app.route('/enviar_feedback', methods=['POST'])
@@ -480,38 +2230,52 @@ def latex_partial_fraction(num, den, var='s'):
 
 @app.route('/nyquist_pagina2', methods=['POST'])
 def nyquist_pagina2():
-    data = request.get_json()
+    return responder(calcular_nyquist_pagina2(dados_requisicao()))
+
+def calcular_nyquist_pagina2(data):
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [0])]
 
     # Filtrar zeros e polos
     zeros_planta_filtrados = [z for z in zeros_planta if abs(z) > 1e-8]
-    num_planta = np.poly(zeros_planta_filtrados) if zeros_planta_filtrados else np.array([1.0])
-    den_planta = np.poly(polos_planta)
 
     # Definir G_planta
-    G_planta = ctl.tf(num_planta, den_planta)
-
-    # Gerar o diagrama de Nyquist
-    fig, ax = plt.subplots(figsize=(7, 4))  # Apenas aumenta o tamanho, não altera escala
-    ctl.nyquist_plot(G_planta, omega=np.logspace(-2, 2, 500), ax=ax, color='b')
-    ax.set_title("Diagrama de Nyquist")
-    ax.set_xlabel("Re")
-    ax.set_ylabel("Im")
-    ax.grid(True)
-    plt.tight_layout()
-
-    # Salvar o gráfico como imagem base64
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    plt.close(fig)
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-    return jsonify({"nyquist_img": img_base64})
+    modelo = obter_modelo(polos_planta, zeros_planta_filtrados)
+
+    # Imagem PNG (matplotlib) apenas se pedida explicitamente
+    if data.get("formato") == "png":
+        return {"nyquist_img": nyquist_png(modelo, "planta")}
+
+    resultado = modelo.nyquist("planta")
+    resposta = {"nyquist_data": montar_nyquist(resultado)}
+    resposta.update(resumo_nyquist(resultado))
+    return resposta
+
+
+def nyquist_png(modelo, qual):
+    """
+    Diagrama de Nyquist em PNG (base64), desenhado a partir de modelo.nyquist(qual).
+    A imagem fica no cache de imagens, indexada pelo hash do modelo.
+    """
+    def desenhar(fig):
+        ax = fig.add_subplot(111)
+        positivo, negativo, menos_um = montar_nyquist(modelo.nyquist(qual))["data"]
+        ax.plot(positivo["x"], positivo["y"], color='b')
+        ax.plot(negativo["x"], negativo["y"], color='b', linestyle='--')
+        ax.plot(menos_um["x"], menos_um["y"], 'r+', markersize=10)
+        ax.set_title("Diagrama de Nyquist")
+        ax.set_xlabel("Re")
+        ax.set_ylabel("Im")
+        ax.grid(True)
+        fig.tight_layout()
+
+    return imagem_png((modelo.chave, "nyquist", qual), desenhar)
 
 @app.route('/nyquist_pagina4', methods=['POST'])
 def nyquist_pagina4():
-    data = request.get_json()
+    return responder(calcular_nyquist_pagina4(dados_requisicao()))
+
+def calcular_nyquist_pagina4(data):
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [0])]
     polos_controlador = [float(p) for p in data.get("polos_controlador", [-1])]
@@ -523,34 +2287,21 @@ def nyquist_pagina4():
     zeros_controlador_filtrados = [z for z in zeros_controlador if abs(z) > 1e-8]
     polos_controlador_filtrados = [p for p in polos_controlador if abs(p) > 1e-8]
 
-    num_planta = np.poly(zeros_planta_filtrados) if zeros_planta_filtrados else np.array([1.0])
-    den_planta = np.poly(polos_planta_filtrados) if polos_planta_filtrados else np.array([1.0])
-    num_controlador = np.poly(zeros_controlador_filtrados) if zeros_controlador_filtrados else np.array([1.0])
-    num_controlador = ganho_controlador * num_controlador
-    den_controlador = np.poly(polos_controlador_filtrados) if polos_controlador_filtrados else np.array([1.0])
-
     # Definir G_open corretamente
-    G_open = ctl.tf(np.polymul(num_planta, num_controlador), np.polymul(den_planta, den_controlador))
-
-    fig, ax = plt.subplots(figsize=(7, 4))  # Apenas aumenta o tamanho, não altera escala
-    ctl.nyquist_plot(G_open, omega=np.logspace(-2, 2, 500), ax=ax, color='b')
-    ax.set_title("Diagrama de Nyquist")
-    ax.set_xlabel("Re")
-    ax.set_ylabel("Im")
-    ax.grid(True)
-    # Remova os set_xlim/set_ylim para manter a escala automática
-    plt.tight_layout()
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    plt.close(fig)
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-    return jsonify({"nyquist_img": img_base64})
+    modelo = obter_modelo(polos_planta_filtrados, zeros_planta_filtrados, 1.0,
+                          polos_controlador_filtrados, zeros_controlador_filtrados, ganho_controlador)
+
+    if data.get("formato") == "png":
+        return {"nyquist_img": nyquist_png(modelo, "aberta")}
+
+    resultado = modelo.nyquist("aberta")
+    resposta = {"nyquist_data": montar_nyquist(resultado)}
+    resposta.update(resumo_nyquist(resultado))
+    return resposta
 
 @app.route('/simular_saida', methods=['POST'])
 def simular_saida():
-    data = request.get_json()
+    data = dados_requisicao()
     num = data.get("num", [1])
     den = data.get("den", [1, 1])
     t_final = float(data.get("t_final", 40))
@@ -563,7 +2314,7 @@ def simular_saida():
         system = scipy.signal.TransferFunction(num, den)
         t = np.linspace(0, t_final, n_points)
         t, y = scipy.signal.step(system, T=t)
-        return jsonify({"t": t.tolist(), "y": y.tolist()})
+        return responder({"t": t, "y": y})
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -573,40 +2324,85 @@ def pagina_discreto():
 
 @app.route('/atualizar_discreto', methods=['POST'])
 def atualizar_discreto():
-    data = request.get_json()
+    return responder(calcular_atualizar_discreto(dados_requisicao()))
+
+def calcular_atualizar_discreto(data):
+    """
+    Compara discretizações da planta: "metodos" (padrão: todos os de
+    METODOS_C2D), "lista_Ts" (padrão: [Ts]) e "omega_prewarp" para o Tustin.
+    plot_continuo/plot_discreto/latex_Gz continuam sendo os do Tustin no Ts
+    principal; "discretizacoes" traz cada par (método, Ts).
+    """
     # Recebe os parâmetros da planta
     ordem = int(data.get("ordem", 2))
     polos = [float(data.get(f"polo_{i+1}", -1)) for i in range(ordem)]
     zeros = [float(data.get(f"zero_{i+1}", 0)) for i in range(ordem)]
     Ts = float(data.get("Ts", 0.1))
+    lista_Ts = [float(t) for t in data.get("lista_Ts", [Ts])]
+    if Ts not in lista_Ts:
+        lista_Ts.insert(0, Ts)
+    if min(lista_Ts) <= 0:
+        raise ValueError("Ts deve ser positivo")
+    metodos = list(data.get("metodos", METODOS_C2D))
+    if "tustin" not in metodos:
+        metodos.append("tustin")
+    omega_prewarp = data.get("omega_prewarp")
 
     # Função de transferência contínua
-    num = np.poly([z for z in zeros if abs(z) > 1e-8]) if any(abs(z) > 1e-8 for z in zeros) else np.array([1.0])
-    den = np.poly([p for p in polos if abs(p) > 1e-8]) if any(abs(p) > 1e-8 for p in polos) else np.array([1.0])
-    Gs = ctl.tf(num, den)
-
-    # Discretização (bilinear)
-    Gz = ctl.sample_system(Gs, Ts, method='tustin')
+    modelo = obter_modelo([p for p in polos if abs(p) > 1e-8], [z for z in zeros if abs(z) > 1e-8])
+    num, den = modelo.polinomios("planta")
+
+    # Resposta ao degrau contínua, no horizonte comum a todos os Ts
+    t_final = float(data.get("t_final", 50 * max(lista_Ts)))
+    T_cont = np.linspace(0, t_final, 500)
+    y_cont = modelo.degrau("planta", T_cont)
+
+    discretizacoes = []
+    for Ts_i in lista_Ts:
+        n = int(np.floor(t_final / Ts_i + 1e-9))
+        t = np.arange(n) * Ts_i
+        for metodo in metodos:
+            b, a = discretizar(num, den, Ts_i, metodo, omega_prewarp)
+            polos_z = np.roots(a)
+            discretizacoes.append({
+                "metodo": metodo,
+                "Ts": Ts_i,
+                "num": b,
+                "den": a,
+                "polos": [[float(p.real), float(p.imag)] for p in polos_z],
+                "estavel": bool(np.all(np.abs(polos_z) < 1)),
+                "latex": f"\\[ G(z) = \\frac{{{latex_poly(b, 'z')}}}{{{latex_poly(a, 'z')}}} \\]",
+                "t": t,
+                "y": degrau_discreto(b, a, n),
+            })
 
-    # Resposta ao degrau contínua
-    T_cont, y_cont = ctl.step_response(Gs, T=np.linspace(0, Ts*50, 500))
-    # Resposta ao degrau discreta
-    T_disc = np.arange(0, Ts*50, Ts)
-    tout, y_disc = ctl.step_response(Gz, T=T_disc)
+    principal = next(d for d in discretizacoes if d["metodo"] == "tustin" and d["Ts"] == Ts)
+    plot_comparacao = {
+        "data": [{"x": T_cont, "y": y_cont, "mode": "lines", "name": "Contínua", "line": {"color": "black"}}] + [
+            {"x": d["t"], "y": d["y"], "mode": "lines+markers", "name": f"{d['metodo']} (Ts = {d['Ts']:g})",
+             "line": {"shape": "hv"}, "marker": {"size": 4}}
+            for d in discretizacoes
+        ],
+        "layout": {"title": "Comparação das discretizações", "xaxis": {"title": "Tempo (s)"},
+                   "yaxis": {"title": "Saída"}}
+    }
 
     # LaTeX das FTs
     latex_Gs = f"\\[ G(s) = \\frac{{{latex_poly(num, 's')}}}{{{latex_poly(den, 's')}}} \\]"
-    return jsonify({
+    return {
         "latex_Gs": latex_Gs,
+        "latex_Gz": principal["latex"],
         "plot_continuo": {
-            "x": T_cont.tolist(),
-            "y": y_cont.tolist()
+            "x": T_cont,
+            "y": y_cont
         },
         "plot_discreto": {
-            "x": tout.tolist(),
-            "y": y_disc.tolist()
-        }
-    })
+            "x": principal["t"],
+            "y": principal["y"]
+        },
+        "discretizacoes": discretizacoes,
+        "plot_comparacao": plot_comparacao
+    }
 
 @app.route('/pid')
 def pid_page():
@@ -614,13 +2410,14 @@ def pid_page():
 
 @app.route('/pid_latex', methods=['POST'])
 def pid_latex():
-    data = request.get_json()
+    return responder(calcular_pid_latex(dados_requisicao()))
+
+def calcular_pid_latex(data):
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [0])]
 
     zeros_planta_filtrados = [z for z in zeros_planta if abs(z) > 1e-8]
-    num_planta = np.poly(zeros_planta_filtrados) if zeros_planta_filtrados else np.array([1.0])
-    den_planta = np.poly(polos_planta)
+    num_planta, den_planta = obter_modelo(polos_planta, zeros_planta_filtrados).polinomios("planta")
 
     latex_plant = f"\\[ G(s) = \\frac{{{latex_poly(num_planta, 's')}}}{{{latex_poly(den_planta, 's')}}} \\]"
 
@@ -643,21 +2440,32 @@ def pid_latex():
     else:  # PID
         latex_ctrl = r"\[ G_c(s) = %.2f \left(1 + \frac{1}{%.2f\,s} + \frac{%.2f\,s\,%.2f}{s+%.2f}\right) \]" % (K, Ti, Td, N, N)
 
-    return jsonify({
+    return {
         "latex_plant": latex_plant,
         "latex_ctrl": latex_ctrl
-    })
+    }
 
 @app.route('/pid_simular', methods=['POST'])
 def pid_simular():
-    data = request.get_json()
+    return responder(calcular_pid_simular(dados_requisicao()))
+
+def calcular_pid_simular(data):
+    """
+    Malha PID de dois graus de liberdade numa única simulação em espaço de
+    estados aumentado (planta + integrador + filtro da derivada), com saídas
+    y, u e e = r − y. "ctrl_b" pondera a referência no termo proporcional e
+    "ctrl_c" no derivativo (padrão 0: derivada só da medição); "carga" é a
+    amplitude de um degrau de perturbação na entrada da planta em "t_carga"
+    (padrão: metade do horizonte).
+    Com "saturacao": {"u_min", "u_max", "taxa_max", "antiwindup", "Tt",
+    "passo"}, a malha é simulada também com o atuador limitado (ver
+    simular_pid_saturado); a resposta linear fica nos gráficos para comparação.
+    """
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [0])]
 
     zeros_planta_filtrados = [z for z in zeros_planta if abs(z) > 1e-8]
-    num_planta = np.poly(zeros_planta_filtrados) if zeros_planta_filtrados else np.array([1.0])
-    den_planta = np.poly(polos_planta)
-    G = ctl.tf(num_planta, den_planta)
+    num_planta, den_planta = obter_modelo(polos_planta, zeros_planta_filtrados).polinomios("planta")
 
     ctrl_type = data.get('ctrl_type', 'PID')
     K = float(data.get('ctrl_k', 1))
@@ -665,112 +2473,454 @@ def pid_simular():
     Td = float(data.get('ctrl_td', 1))
     N = float(data.get('ctrl_n', 10))
     b = float(data.get('ctrl_b', 0.5))
-
-    s = ctl.tf([1, 0], [0, 1])
-    if ctrl_type == "P":
-        Gc = ctl.tf([K], [1])
-    elif ctrl_type == "I":
-        Gc = ctl.tf([K], [Ti, 0])
-    elif ctrl_type == "PI":
-        Gc = ctl.tf([K*Ti, K], [Ti, 0])
-    elif ctrl_type == "PD":
-        numc = [K*Td*N, K]
-        denc = [1, N]
-        Gc = ctl.tf(numc, denc)
-    else:  # PID
-        numc = [K*Td*N, K*N, K]
-        denc = [Ti, Ti*N, 0]
-        Gc = ctl.tf(numc, denc)
-
-    sys_cl = ctl.feedback(Gc*G, 1)
-    T = np.linspace(0, 40, 400)
-    T, y = ctl.step_response(sys_cl, T)
-    # Corrigido: forced_response retorna apenas 2 valores nas versões recentes
-    _, u = ctl.forced_response(Gc, T, 1 - y)
+    c = float(data.get('ctrl_c', 0.0))
+    carga = float(data.get('carga', 0.0))
+
+    # Polinômio característico (não depende das ponderações) e FT r → y
+    numc, denc = polinomios_pid(ctrl_type, K, Ti, Td, N)
+    numr, _ = polinomios_pid(ctrl_type, K, Ti, Td, N, b, c)
+    den_cl = np.polyadd(np.polymul(denc, den_planta), np.polymul(numc, num_planta))
+    num_ry = np.polymul(numr, num_planta)
+    T = grade_tempo(np.roots(den_cl), 40, 400, **opcoes_grade(data))
+
+    # Entradas [r; d]: degrau de referência e degrau de carga
+    t_carga = float(data.get('t_carga', T[-1] / 2))
+    U = np.stack([np.ones_like(T), carga * (T >= t_carga)])
+    A, B, C, D = ss_malha_pid(num_planta, den_planta, ctrl_type, K, Ti, Td, N, b, c)
+    y, u, e = simular_ss(A, B, C, D, T, U)
+
+    saturacao = data.get("saturacao")
+    if saturacao:
+        passo = saturacao.get("passo")
+        T_nl = np.arange(0, T[-1] + float(passo) / 2, float(passo)) if passo else T
+        y_nl, u_nl, v_nl, e_nl = simular_pid_saturado(
+            num_planta, den_planta, ctrl_type, K, Ti, Td, N, b, c, T_nl,
+            np.ones_like(T_nl), carga * (T_nl >= t_carga),
+            u_min=float(saturacao.get("u_min", -np.inf)), u_max=float(saturacao.get("u_max", np.inf)),
+            taxa_max=float(saturacao.get("taxa_max", np.inf)),
+            antiwindup=saturacao.get("antiwindup", "retrocalculo"), Tt=saturacao.get("Tt"))
 
     plot_processo = {
         "data": [
-            {"x": T.tolist(), "y": y.tolist(), "type": "scatter", "name": "Saída do Processo"}
+            {"x": T, "y": y, "type": "scatter", "name": "Saída do Processo"}
         ],
         "layout": {"title": "Saída do Processo", "xaxis": {"title": "Tempo (s)"}, "yaxis": {"title": "y(t)"}}
     }
     plot_controlador = {
         "data": [
-            {"x": T.tolist(), "y": u.tolist(), "type": "scatter", "name": "Saída do Controlador"}
+            {"x": T, "y": u, "type": "scatter", "name": "Saída do Controlador"}
         ],
         "layout": {"title": "Saída do Controlador", "xaxis": {"title": "Tempo (s)"}, "yaxis": {"title": "u(t)"}}
     }
+    plot_erro = {
+        "data": [
+            {"x": T, "y": e, "type": "scatter", "name": "Erro"}
+        ],
+        "layout": {"title": "Erro", "xaxis": {"title": "Tempo (s)"}, "yaxis": {"title": "e(t)"}}
+    }
 
-    return jsonify({
+    resultado = {
         "plot_processo": plot_processo,
-        "plot_controlador": plot_controlador
-    })
+        "plot_controlador": plot_controlador,
+        "plot_erro": plot_erro,
+        "info_degrau": info_degrau(num_ry, den_cl)
+    }
+    if saturacao:
+        linear = {"line": {"dash": "dot"}, "opacity": 0.6}
+        for plot, nome in ((plot_processo, "Saída do Processo (linear)"),
+                           (plot_controlador, "Saída do Controlador (linear)"),
+                           (plot_erro, "Erro (linear)")):
+            plot["data"][0].update(linear, name=nome)
+        plot_processo["data"].append({"x": T_nl, "y": y_nl, "type": "scatter", "name": "Saída do Processo"})
+        plot_controlador["data"] += [
+            {"x": T_nl, "y": u_nl, "type": "scatter", "name": "Saída do Atuador"},
+            {"x": T_nl, "y": v_nl, "type": "scatter", "name": "Saída do Controlador",
+             "line": {"dash": "dash"}},
+        ]
+        plot_erro["data"].append({"x": T_nl, "y": e_nl, "type": "scatter", "name": "Erro"})
+        final = np.polyval(num_ry, 0) / np.polyval(den_cl, 0) if np.polyval(den_cl, 0) else 1.0
+        sobressinal, assentamento = _metricas_degrau(T_nl, y_nl[None, :], np.array([final]))
+        resultado["saturacao"] = {
+            "sobressinal": sobressinal[0],
+            "tempo_assentamento": None if np.isnan(assentamento[0]) else assentamento[0],
+            "fracao_saturado": float(np.mean(np.abs(u_nl - v_nl) > 1e-9)),
+        }
+    return resultado
+
+def polinomios_pid(ctrl_type, K, Ti, Td, N, b=1.0, c=1.0):
+    """
+    (num, den) do controlador P, I, PI, PD ou PID, K·(1 + 1/(Ti·s) + Td·N·s/(s + N)).
+    Com b e c, num é o do caminho da referência, K·(b + 1/(Ti·s) + c·Td·N·s/(s + N)).
+    """
+    if ctrl_type == "P":
+        return [K*b], [1]
+    if ctrl_type == "I":
+        return [K], [Ti, 0]
+    if ctrl_type == "PI":
+        return [K*b*Ti, K], [Ti, 0]
+    if ctrl_type == "PD":
+        return [K*(b + c*Td*N), K*b*N], [1, N]
+    return [K*Ti*(b + c*Td*N), K*(b*Ti*N + 1), K*N], [Ti, Ti*N, 0]
+
+def _ss_planta(num, den):
+    Ap, Bp, Cp, Dp = scipy.signal.tf2ss(num, den)
+    return Ap, Bp, Cp, float(np.ravel(Dp)[0]) if np.size(Dp) else 0.0
+
+def ss_controlador_pid(ctrl_type, K, Ti, Td, N, b=1.0, c=1.0):
+    """
+    Controlador 2-DOF xc' = Ac·xc + Bc·[r, y], u = Cc·xc + Dc·[r, y]. O
+    integrador de r − y (quando há) é o primeiro estado; o filtro da
+    derivada, o último. Ac é diagonal.
+    """
+    kp = 0.0 if ctrl_type == "I" else K
+    ki = K / Ti if ctrl_type in ("I", "PI", "PID") else 0.0
+    kd = K * Td if ctrl_type in ("PD", "PID") else 0.0
+    Ac, Bc, Cc = np.zeros((0, 0)), np.zeros((0, 2)), np.zeros((1, 0))
+    Dc = np.array([[kp * b, -kp]])
+    if ki:
+        Ac = scipy.linalg.block_diag(Ac, [[0.0]])
+        Bc = np.vstack([Bc, [1.0, -1.0]])
+        Cc = np.hstack([Cc, [[ki]]])
+    if kd:
+        Ac = scipy.linalg.block_diag(Ac, [[-N]])
+        Bc = np.vstack([Bc, [c, -1.0]])
+        Cc = np.hstack([Cc, [[-kd * N**2]]])
+        Dc = Dc + kd * N * np.array([[c, -1.0]])
+    return Ac, Bc, Cc, Dc
+
+def ss_malha_pid(num_planta, den_planta, ctrl_type, K, Ti, Td, N, b=1.0, c=1.0):
+    """
+    (A, B, C, D) da malha fechada PID 2-DOF com entradas [r, d] (d somada à
+    entrada da planta) e saídas [y, u, e]. Estados: planta, integrador de
+    r − y e filtro xd' = −N·xd + (c·r − y) da derivada.
+    """
+    Ap, Bp, Cp, Dp = _ss_planta(num_planta, den_planta)
+    n = Ap.shape[0]
+    Ac, Bc, Cc, Dc = ss_controlador_pid(ctrl_type, K, Ti, Td, N, b, c)
+
+    # Laço algébrico y = Cp·xp + Dp·(u + d) com u = ... + Dc_y·y
+    laco = 1.0 - Dp * Dc[0, 1]
+    if abs(laco) < 1e-12:
+        raise ValueError("Malha mal posta: 1 + Dc·Dp = 0")
+    # y e u como funções lineares de [xp, xc] e [r, d]
+    Cy = np.hstack([Cp, Dp * Cc]) / laco
+    Dy = np.array([[Dp * Dc[0, 0], Dp]]) / laco
+    Cu = np.hstack([np.zeros((1, n)), Cc]) + Dc[0, 1] * Cy
+    Du = np.array([[Dc[0, 0], 0.0]]) + Dc[0, 1] * Dy
+
+    A = scipy.linalg.block_diag(Ap, Ac) + np.vstack([Bp @ Cu, Bc[:, 1:] @ Cy])
+    B = np.vstack([Bp @ (Du + [[0.0, 1.0]]), Bc[:, :1] @ [[1.0, 0.0]] + Bc[:, 1:] @ Dy])
+    C = np.vstack([Cy, Cu, -Cy])
+    D = np.vstack([Dy, Du, [[1.0, 0.0]] - Dy])
+    return A, B, C, D
+
+ANTIWINDUP = ("nenhum", "retrocalculo", "condicional")
+MAX_PASSOS_SATURACAO = 100000
+
+def simular_pid_saturado(num_planta, den_planta, ctrl_type, K, Ti, Td, N, b, c, T, r, d,
+                         u_min=-np.inf, u_max=np.inf, taxa_max=np.inf, antiwindup="retrocalculo", Tt=None):
+    """
+    Malha PID com atuador limitado em amplitude [u_min, u_max] e em taxa
+    (|du/dt| <= taxa_max), em passo fixo dt = T[1] − T[0]. Planta e controlador
+    são discretizados (ZOH) uma vez; o laço só faz produtos pequenos sobre as
+    matrizes prontas. Anti-windup: "retrocalculo" (o integrador recebe
+    (u − v)/Tt, padrão Tt = √(Ti·Td) ou Ti), "condicional" (o integrador para
+    enquanto saturado no sentido do erro) ou "nenhum".
+    Retorna (y, u, v, e), com v a saída do controlador antes do atuador.
+    """
+    if antiwindup not in ANTIWINDUP:
+        raise ValueError(f"Anti-windup desconhecido: {antiwindup}")
+    dt = _grade_uniforme(T)
+    if dt is None:
+        raise ValueError("A simulação com saturação requer grade de tempo uniforme")
+    if len(T) > MAX_PASSOS_SATURACAO:
+        raise ValueError(f"No máximo {MAX_PASSOS_SATURACAO} passos na simulação com saturação")
+
+    Ap, Bp, Cp, Dp = _ss_planta(num_planta, den_planta)
+    Ac, Bc, Cc, Dc = ss_controlador_pid(ctrl_type, K, Ti, Td, N, b, c)
+    integral = ctrl_type in ("I", "PI", "PID")
+    ki = K / Ti if integral else 0.0
+    # Terceira entrada do controlador: a diferença u − v, só no integrador (retrocálculo)
+    Bc = np.hstack([Bc, np.zeros((len(Bc), 1))])
+    if integral and antiwindup == "retrocalculo":
+        Tt = float(Tt) if Tt else (np.sqrt(Ti * Td) if ctrl_type == "PID" and Td > 0 else Ti)
+        Bc[0, 2] = 1.0 / (ki * Tt)
+    Fp, Gp = matrizes_zoh(Ap, Bp, dt)
+    Fc, Gc = matrizes_zoh(Ac, Bc, dt)
+    dcr, dcy = Dc[0]
+    laco = 1.0 - Dp * dcy
+    if abs(laco) < 1e-12:
+        raise ValueError("Malha mal posta: 1 + Dc·Dp = 0")
+
+    # Vetor de trabalho z = [xp, xc, r, y, u + d, u − v]: x⁺ = FG·z e [yx, Cc·xc] = H·z
+    n, m = len(Fp), len(Fc)
+    FG = np.zeros((n + m, n + m + 4))
+    FG[:, :n + m] = scipy.linalg.block_diag(Fp, Fc)
+    FG[:n, n + m + 2] = Gp[:, 0]
+    FG[n:, [n + m, n + m + 1, n + m + 3]] = Gc
+    H = np.zeros((2, n + m + 4))
+    H[0, :n] = Cp[0]
+    H[1, n:n + m] = Cc[0]
+    if integral and antiwindup == "condicional":
+        # Linha do integrador sem as entradas: usada enquanto ele está congelado
+        FG_congelado = FG.copy()
+        FG_congelado[n, n + m:] = 0.0
+    passo_max = taxa_max * dt
+
+    n_t = len(T)
+    y, u, v = [0.0] * n_t, [0.0] * n_t, [0.0] * n_t
+    z = np.zeros(n + m + 4)
+    u_ant = 0.0
+    r = np.broadcast_to(np.asarray(r, dtype=float), (n_t,))
+    d = np.broadcast_to(np.asarray(d, dtype=float), (n_t,))
+    for k, (rk, dk) in enumerate(zip(r.tolist(), d.tolist())):
+        yx, uc = (H @ z).tolist()
+        vk = (uc + dcr * rk + dcy * (yx + Dp * dk)) / laco
+        uk = min(max(vk, u_ant - passo_max, u_min), u_ant + passo_max, u_max)
+        yk = yx + Dp * (uk + dk)
+        z[n + m:] = rk, yk, uk + dk, uk - vk
+        if uk != vk and integral and antiwindup == "condicional" and (vk - uk) * ki * (rk - yk) > 0:
+            z[:n + m] = FG_congelado @ z
+        else:
+            z[:n + m] = FG @ z
+        y[k], u[k], v[k], u_ant = yk, uk, vk, uk
+    y, u, v = np.array(y), np.array(u), np.array(v)
+    return y, u, v, r - y
 
 @app.route('/state')
 def state_page():
     return render_template('state.html')
 
+# ---------------------------------------------------------------------------
+# Sistema massa–mola–amortecedor
+# M, C e K são montadas numericamente (esparsas em cadeias longas) e A sai de
+# soluções com M, sem inversa. Modos, frequências naturais e respostas livre e
+# forçada vêm da mesma montagem; o SymPy só formata o LaTeX, e só para poucas
+# massas.
+# ---------------------------------------------------------------------------
+
+MAX_MASSAS_LATEX = 6
+MIN_MASSAS_ESPARSO = 100
+NUM_MODOS_ESPARSO = 20
+MAX_SAIDAS_MMA = 10
+
+
+def montar_mma(masses, springs, dampers):
+    """(M, C, K) do sistema; esparsas (CSC) a partir de MIN_MASSAS_ESPARSO massas."""
+    n = len(masses)
+    if n == 0:
+        raise ValueError("Adicione ao menos uma massa")
+    if min(masses) <= 0:
+        raise ValueError("As massas devem ser positivas")
+
+    def montar(elementos, chave):
+        # Cada elemento entre i e j soma [[v, −v], [−v, v]]; com a parede (−1), só v na diagonal
+        linhas, colunas, valores = [], [], []
+        for e in elementos:
+            i, j, v = int(e['from']), int(e['to']), float(e[chave])
+            for a, b, s in ((i, i, v), (j, j, v), (i, j, -v), (j, i, -v)):
+                if a != -1 and b != -1:
+                    linhas.append(a)
+                    colunas.append(b)
+                    valores.append(s)
+        matriz = scipy.sparse.coo_matrix((valores, (linhas, colunas)), shape=(n, n))
+        return matriz.tocsc() if n >= MIN_MASSAS_ESPARSO else matriz.toarray()
+
+    M = scipy.sparse.diags(np.asarray(masses, dtype=float), format="csc")
+    M = M if n >= MIN_MASSAS_ESPARSO else M.toarray()
+    return M, montar(dampers, 'c'), montar(springs, 'k')
+
+
+def matriz_estado_mma(M, C, K):
+    """A = [[0, I], [−M⁻¹K, −M⁻¹C]] para x = [q, q'], resolvendo com M (densa ou esparsa)."""
+    n = M.shape[0]
+    if scipy.sparse.issparse(M):
+        # M esparsa é a diagonal das massas: resolver com ela é escalar as linhas
+        inversa = scipy.sparse.diags(1.0 / M.diagonal())
+        MK, MC = inversa @ K, inversa @ C
+        return scipy.sparse.bmat([[None, scipy.sparse.identity(n)], [-MK, -MC]], format="csr")
+    MK, MC = np.hsplit(scipy.linalg.solve(M, np.hstack([K, C]), assume_a="pos"), 2)
+    return np.block([[np.zeros((n, n)), np.eye(n)], [-MK, -MC]])
+
+
+def modos_mma(M, C, K):
+    """
+    Frequências naturais ω (rad/s), formas modais normalizadas pela massa
+    (colunas) e fatores de amortecimento modais φᵀCφ/(2ω) (exatos com
+    amortecimento proporcional; NaN nos modos de corpo rígido, com ω = 0).
+    No caso esparso, só os NUM_MODOS_ESPARSO modos mais baixos.
+    """
+    if scipy.sparse.issparse(M):
+        # Deslocamento levemente negativo: K pode ser singular (modos de corpo rígido)
+        escala = abs(K).max() / M.diagonal().min() if K.nnz else 1.0
+        lambdas, modos = scipy.sparse.linalg.eigsh(K, k=min(NUM_MODOS_ESPARSO, M.shape[0] - 1), M=M,
+                                                   sigma=-1e-6 * escala, which="LM")
+        ordem = np.argsort(lambdas)
+        lambdas, modos = lambdas[ordem], modos[:, ordem]
+    else:
+        lambdas, modos = scipy.linalg.eigh(K, M)
+    omega = np.sqrt(np.maximum(lambdas, 0.0))
+    # Corpo rígido: o autovalor nulo sai com erro de arredondamento ~ε·λmax
+    omega[omega <= 1e-6 * max(omega.max(initial=0.0), 1.0)] = 0.0
+    amortecimento_modal = np.einsum('ij,ij->j', modos, C @ modos)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zeta = np.where(omega > 0, amortecimento_modal / (2 * omega), np.nan)
+    return omega, modos, zeta
+
+
+def reduzir_mma(modos, omega, C):
+    """
+    Projeção nos modos calculados (Φ normalizada pela massa): A_r = [[0, I],
+    [−Ω², −ΦᵀCΦ]] em coordenadas modais. Usada nas cadeias longas, em que só os
+    modos mais baixos são calculados.
+    """
+    m = len(omega)
+    return np.block([[np.zeros((m, m)), np.eye(m)], [-np.diag(omega**2), -(modos.T @ (C @ modos))]])
+
+
+def resposta_mma(A, direcao, saida, T, z0, forca):
+    """
+    Respostas livre (estado inicial z0) e forçada (estado inicial nulo) de
+    z' = A·z + [0; direcao]·f(t) nos instantes T (uniformes), como posições
+    saida·z[:m] de forma (n, n_t). forca = {"tipo": "degrau" | "senoide",
+    "amplitude", "frequencia" (rad/s)}. f(t) vem de estados extras (constante
+    ou oscilador), então o sistema aumentado é autônomo: basta a matriz de
+    transição de um passo, e as potências saem por duplicação (_markov).
+    """
+    m = len(direcao)
+    tipo = forca.get("tipo", "degrau")
+    amplitude = float(forca.get("amplitude", 1.0))
+    if tipo == "degrau":
+        gerador, g0 = np.zeros((1, 1)), [amplitude]
+    elif tipo == "senoide":
+        w = float(forca.get("frequencia", 1.0))
+        gerador, g0 = np.array([[0.0, w], [-w, 0.0]]), [0.0, amplitude]   # g₁ = a·sen(ωt)
+    else:
+        raise ValueError(f"Tipo de força desconhecido: {tipo}")
+
+    g = len(g0)
+    A_aum = scipy.linalg.block_diag(A, gerador)
+    A_aum[m:2 * m, 2 * m] = direcao
+    Z0 = np.zeros((2 * m + g, 2))
+    Z0[:2 * m, 0] = z0
+    Z0[2 * m:, 1] = g0
+    posicoes = np.zeros((m, 2 * m + g))
+    posicoes[:, :m] = np.eye(m)
+    Phi = scipy.linalg.expm(A_aum * _grade_uniforme(T))
+    Q = _markov(Phi, Z0, posicoes, len(T))                   # (n_t, m, 2)
+    return saida @ Q[..., 0].T, saida @ Q[..., 1].T
+
+
+def _latex_matriz(X):
+    import sympy as sp
+    X = X.toarray() if scipy.sparse.issparse(X) else X
+    return sp.latex(sp.Matrix(X).applyfunc(lambda v: sp.nsimplify(v, rational=True, tolerance=1e-12)))
+
+
 @app.route('/state_equation', methods=['POST'])
 def state_equation():
-    data = request.get_json()
-    masses = data.get("masses", [])
+    return responder(calcular_state_equation(dados_requisicao()))
+
+def calcular_state_equation(data):
+    """
+    Monta M, C, K e A do sistema massa–mola–amortecedor e devolve frequências
+    naturais, modos e respostas livre e forçada. "x0"/"v0": condições iniciais
+    (padrão: deslocamento unitário da primeira massa); "forca": {"massa",
+    "tipo", "amplitude", "frequencia"} (padrão: degrau unitário na última
+    massa); "t_final"; "saidas": índices das massas cujas respostas voltam
+    (padrão: até MAX_SAIDAS_MMA, espaçadas). O LaTeX (equation, A_latex) só
+    vem com até MAX_MASSAS_LATEX massas.
+    """
+    masses = [float(m) for m in data.get("masses", [])]
     springs = data.get("springs", [])
     dampers = data.get("dampers", [])
-
     n = len(masses)
-    import sympy as sp
-    M = sp.zeros(n)
-    K = sp.zeros(n)
-    C = sp.zeros(n)
-
-    for i, m in enumerate(masses):
-        M[i, i] = m
-    for s in springs:
-        i, j, k = s['from'], s['to'], s['k']
-        if j == -1:
-            K[i, i] += k
-        else:
-            K[i, i] += k
-            K[j, j] += k
-            K[i, j] -= k
-            K[j, i] -= k
-    for d in dampers:
-        i, j, c = d['from'], d['to'], d['c']
-        if j == -1:
-            C[i, i] += c
-        else:
-            C[i, i] += c
-            C[j, j] += c
-            C[i, j] -= c
-            C[j, i] -= c
 
     try:
-        Minv = M.inv()
-        A_top = sp.zeros(n, n).row_join(sp.eye(n))
-        A_bot = (-Minv*K).row_join(-Minv*C)
-        A = A_top.col_join(A_bot)
+        M, C, K = montar_mma(masses, springs, dampers)
+        A = matriz_estado_mma(M, C, K)
+        omega, modos, zeta = modos_mma(M, C, K)
+    except Exception as e:
+        return {"equation": f"Erro ao montar sistema: {e}", "A_latex": ""}
+
+    if n <= MAX_MASSAS_LATEX:
         eq_latex = (
             "M \\ddot{x} + C \\dot{x} + K x = 0 \\\\"
-            "M = " + sp.latex(M) + "\\quad "
-            "C = " + sp.latex(C) + "\\quad "
-            "K = " + sp.latex(K)
+            "M = " + _latex_matriz(M) + "\\quad "
+            "C = " + _latex_matriz(C) + "\\quad "
+            "K = " + _latex_matriz(K)
         )
-        A_latex = sp.latex(A)
-    except Exception as e:
-        eq_latex = f"Erro ao montar sistema: {e}"
+        A_latex = _latex_matriz(A)
+    else:
+        eq_latex = f"M \\ddot{{x}} + C \\dot{{x}} + K x = 0 \\quad ({n} \\text{{ massas}})"
         A_latex = ""
 
+    # Cadeias longas: simulação na base dos modos calculados (truncada)
+    truncada = scipy.sparse.issparse(M)
+    x0 = np.zeros(n)
+    x0[0] = 1.0
+    x0 = np.asarray(data.get("x0", x0), dtype=float)
+    v0 = np.asarray(data.get("v0", np.zeros(n)), dtype=float)
+    forca = data.get("forca", {})
+    massa = int(forca.get("massa", n - 1))
+    if not 0 <= massa < n:
+        return {"equation": "Erro ao montar sistema: massa da força fora do sistema", "A_latex": ""}
+    saidas = [int(i) for i in data.get("saidas", np.unique(np.linspace(0, n - 1, min(n, MAX_SAIDAS_MMA)).round()))]
+    if truncada:
+        A_sim = reduzir_mma(modos, omega, C)
+        direcao = modos[massa]
+        saida = modos[saidas]
+        z0 = np.concatenate([modos.T @ (M @ x0), modos.T @ (M @ v0)])
+    else:
+        A_sim = A
+        direcao = scipy.linalg.solve(M, np.eye(n)[massa], assume_a="pos")
+        saida = np.eye(n)[saidas]
+        z0 = np.concatenate([x0, v0])
+
+    # Grade pelos polos; sem amortecimento, 10 períodos do modo mais lento
+    polos = np.linalg.eigvals(A_sim)
+    # Corpo rígido: o polo duplo em 0 (bloco de Jordan) se separa em ±√ε·‖A‖,
+    # o que a grade tomaria por um polo instável
+    polos[np.abs(polos) <= 1e-6 * max(np.abs(polos).max(initial=0.0), 1.0)] = 0.0
+    elasticos = omega[omega > 0]
+    t_final = float(data.get("t_final", 10 * 2 * np.pi / elasticos.min() if len(elasticos) else 10.0))
+    T = grade_tempo(polos, t_final, 500, automatico="t_final" not in data, n_max=2000)
+    livre, forcada = resposta_mma(A_sim, direcao, saida, T, z0, forca)
+
+    plot_resposta = {
+        "data": [
+            {"x": T, "y": livre[j], "mode": "lines", "name": f"x{i + 1} (livre)"} for j, i in enumerate(saidas)
+        ] + [
+            {"x": T, "y": forcada[j], "mode": "lines", "name": f"x{i + 1} (forçada)", "line": {"dash": "dash"}}
+            for j, i in enumerate(saidas)
+        ],
+        "layout": {"title": "Deslocamentos", "xaxis": {"title": "Tempo (s)"}, "yaxis": {"title": "x (m)"}}
+    }
     return {
         "equation": eq_latex,
-        "A_latex": A_latex
+        "A_latex": A_latex,
+        "frequencias_naturais": omega,
+        "frequencias_hz": omega / (2 * np.pi),
+        # sem fator de amortecimento nos modos de corpo rígido: null, não NaN
+        "amortecimentos": [float(z) if np.isfinite(z) else None for z in zeta],
+        "modos": modos,
+        "polos": [[p.real, p.imag] for p in polos],
+        "truncada": truncada,
+        "T": T,
+        "saidas": saidas,
+        "livre": livre,
+        "forcada": forcada,
+        "plot_resposta": plot_resposta,
     }
 
 @app.route('/alocacao_polos_backend', methods=['POST'])
 def alocacao_polos_backend():
+    return responder(calcular_alocacao_polos_backend(dados_requisicao()))
+
+def calcular_alocacao_polos_backend(data):
     import numpy as np
     import control as ctl
 
-    data = request.get_json()
     polos_planta = [float(p) for p in data.get("polos_planta", [-0.0758])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [])]
     ganho_planta = float(data.get("ganho_planta", 1.0))
@@ -779,35 +2929,26 @@ def alocacao_polos_backend():
     ganho_controlador = float(data.get("ganho_controlador", 1.0))
     ts_multiplier = float(data.get("ts_multiplier", 0.5))
 
-    # Função de transferência da planta
-    num_planta = ganho_planta * (np.poly(zeros_planta) if zeros_planta else np.array([1.0]))
-    den_planta = np.poly(polos_planta) if polos_planta else np.array([1.0])
-    G_planta = ctl.tf(num_planta, den_planta)
+    modelo = obter_modelo(polos_planta, zeros_planta, ganho_planta,
+                          polos_controlador, zeros_controlador, ganho_controlador)
 
-    # Função de transferência do controlador
-    num_controlador = ganho_controlador * (np.poly(zeros_controlador) if zeros_controlador else np.array([1.0]))
-    den_controlador = np.poly(polos_controlador) if polos_controlador else np.array([1.0])
-    G_controlador = ctl.tf(num_controlador, den_controlador)
-
-    # Malha aberta e fechada
-    G_open = G_planta * G_controlador
-    G_closed = ctl.feedback(G_open)
+    grade = opcoes_grade(data)
 
     # Resposta ao degrau (Malha Aberta)
-    T_open = np.linspace(0, 50, 1000)
-    _, yout_open = ctl.step_response(G_open, T_open)
-    y_final_open = yout_open[-1]
-    tol_open = 0.05 * abs(y_final_open)
-    idx_settle_open = np.where(np.abs(yout_open - y_final_open) > tol_open)[0]
-    ts_aberta = T_open[idx_settle_open[-1] + 1] if len(idx_settle_open) > 0 else T_open[-1]
+    T_open = grade_tempo(modelo.fatores("aberta")[0], 50, 1000, **grade)
+    yout_open = modelo.degrau("aberta", T_open)
 
     # Resposta ao degrau (Malha Fechada)
-    T_closed = np.linspace(0, 50, 1000)
-    _, yout_closed = ctl.step_response(G_closed, T_closed)
-    y_final_closed = yout_closed[-1]
-    tol_closed = 0.05 * abs(y_final_closed)
-    idx_settle_closed = np.where(np.abs(yout_closed - y_final_closed) > tol_closed)[0]
-    ts_fechada = T_closed[idx_settle_closed[-1] + 1] if len(idx_settle_closed) > 0 else T_closed[-1]
+    T_closed = grade_tempo(modelo.fatores("fechada")[0], 50, 1000, **grade)
+    yout_closed = modelo.degrau("fechada", T_closed)
+
+    # Tempos de assentamento (faixa de 5%) exatos; sem assentamento, o horizonte do gráfico
+    info_aberta = modelo.info_degrau("aberta")
+    info_fechada = modelo.info_degrau("fechada")
+    ts_aberta = info_aberta["tempo_assentamento"]["5%"]
+    ts_aberta = T_open[-1] if ts_aberta is None else ts_aberta
+    ts_fechada = info_fechada["tempo_assentamento"]["5%"]
+    ts_fechada = T_closed[-1] if ts_fechada is None else ts_fechada
 
     # Tempo de assentamento desejado (multiplicador)
     ts_desejado = ts_aberta * ts_multiplier
@@ -831,11 +2972,7 @@ def alocacao_polos_backend():
     # Polinômio característico atual
     poly_caracteristico = None
     try:
-        Dp = den_planta
-        Dc = den_controlador
-        Np = num_planta
-        Nc = num_controlador
-        poly_atual = np.polyadd(np.polymul(Dp, Dc), np.polymul(Np, Nc))
+        poly_atual = modelo.den_fechada
         poly_caracteristico = f"\\( {latex_poly(poly_atual, 's')} \\)"
     except Exception:
         poly_caracteristico = ""
@@ -849,10 +2986,7 @@ def alocacao_polos_backend():
 
     # Diagrama de Polos e Zeros (Malha Fechada)
     try:
-        num_closed = np.array(G_closed.num).flatten()
-        den_closed = np.array(G_closed.den).flatten()
-        zeros_closed = np.roots(num_closed)
-        poles_closed = np.roots(den_closed)
+        zeros_closed, poles_closed = modelo.raizes("fechada")
     except Exception:
         zeros_closed = []
         poles_closed = []
@@ -872,10 +3006,7 @@ def alocacao_polos_backend():
 
     # Diagrama de Polos e Zeros (Malha Aberta)
     try:
-        num_open = np.array(G_open.num).flatten()
-        den_open = np.array(G_open.den).flatten()
-        zeros_open = np.roots(num_open)
-        poles_open = np.roots(den_open)
+        zeros_open, poles_open = modelo.raizes("aberta")
     except Exception:
         zeros_open = []
         poles_open = []
@@ -896,7 +3027,7 @@ def alocacao_polos_backend():
     # Gráfico da resposta ao degrau (Malha Fechada)
     plot_closed = {
         "data": [
-            {"x": T_closed.tolist(), "y": yout_closed.tolist(), "mode": "lines", "name": "Resposta ao Degrau (Malha Fechada)"}
+            {"x": T_closed, "y": yout_closed, "mode": "lines", "name": "Resposta ao Degrau (Malha Fechada)"}
         ],
         "layout": {
             "title": "Resposta ao Degrau (Malha Fechada)",
@@ -906,8 +3037,7 @@ def alocacao_polos_backend():
     }
 
     try:
-        polos = np.roots(den_planta)
-        zeros = np.roots(num_planta)
+        zeros, polos = modelo.raizes("planta")
     except Exception:
         polos = []
         zeros = []
@@ -926,8 +3056,7 @@ def alocacao_polos_backend():
 
     # Diagrama de Polos e Zeros (Controlador)
     try:
-        polos_ctrl = np.roots(den_controlador)
-        zeros_ctrl = np.roots(num_controlador)
+        zeros_ctrl, polos_ctrl = modelo.raizes("controlador")
     except Exception:
         polos_ctrl = []
         zeros_ctrl = []
@@ -947,7 +3076,7 @@ def alocacao_polos_backend():
     # Gráfico da resposta ao degrau (Malha Aberta)
     plot_open = {
         "data": [
-            {"x": T_open.tolist(), "y": yout_open.tolist(), "mode": "lines", "name": "Resposta ao Degrau (Malha Aberta)"}
+            {"x": T_open, "y": yout_open, "mode": "lines", "name": "Resposta ao Degrau (Malha Aberta)"}
         ],
         "layout": {
             "title": "Resposta ao Degrau (Malha Aberta)",
@@ -960,10 +3089,11 @@ def alocacao_polos_backend():
     latex_planta = f"\\( G(s) = {ganho_planta:.3g} \\cdot \\frac{{{latex_factored(zeros_planta, 's')}}}{{{latex_factored(polos_planta, 's')}}} \\)"
     latex_controlador = f"\\( G_c(s) = {ganho_controlador:.3g} \\cdot \\frac{{{latex_factored(zeros_controlador, 's')}}}{{{latex_factored(polos_controlador, 's')}}} \\)"
     
-    return jsonify({
+    return {
         "tempo_assentamento_aberta": round(float(ts_aberta), 3),
         "tempo_assentamento_fechada": round(float(ts_fechada), 3),
         "ts_desejado": round(float(ts_desejado), 3),
+        "info_degrau": {"aberta": info_aberta, "fechada": info_fechada},
         "pd_value": pd_value,
         "pd_formula": f"({pd_formula})",
         "poly_caracteristico": poly_caracteristico,
@@ -976,19 +3106,19 @@ def alocacao_polos_backend():
         "plot_pz_controlador": plot_pz_controlador,
         "plot_closed": plot_closed,
         "plot_open": plot_open
-    })
+    }
 
 @app.route('/atualizar_pagina2', methods=['POST'])
 def atualizar_pagina2():
-    data = request.get_json()
+    return responder(calcular_atualizar_pagina2(dados_requisicao()))
+
+def calcular_atualizar_pagina2(data):
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [0])]
 
     zeros_planta_filtrados = [z for z in zeros_planta if abs(z) > 1e-8]
-    num_planta = np.poly(zeros_planta_filtrados) if zeros_planta_filtrados else np.array([1.0])
-    den_planta = np.poly(polos_planta) if polos_planta else np.array([1.0])
-
-    G_planta = ctl.tf(num_planta, den_planta)
+    modelo = obter_modelo(polos_planta, zeros_planta_filtrados)
+    num_planta, den_planta = modelo.polinomios("planta")
 
     latex_planta_polinomial = (
         f"\\[ G(s) = \\frac{{{latex_poly(num_planta, 's')}}}{{{latex_poly(den_planta, 's')}}} \\]"
@@ -1001,8 +3131,7 @@ def atualizar_pagina2():
     )
 
     # Diagrama de Polos e Zeros
-    zeros = np.roots(num_planta)
-    polos = np.roots(den_planta)
+    zeros, polos = modelo.raizes("planta")
     plot_pz_data = {
         "data": [
             {"x": np.real(zeros).tolist(), "y": np.imag(zeros).tolist(), "mode": "markers", "name": "Zeros", "marker": {"color": "blue", "size": 12, "symbol": "circle"}},
@@ -1017,11 +3146,11 @@ def atualizar_pagina2():
     }
 
     # Resposta ao Degrau (Malha Aberta)
-    T = np.linspace(0, 20, 500)
-    _, yout = ctl.step_response(G_planta, T)
+    T = grade_tempo(modelo.fatores("planta")[0], 20, 500, **opcoes_grade(data))
+    yout = modelo.degrau("planta", T)
     plot_open_data = {
         "data": [
-            {"x": T.tolist(), "y": yout.tolist(), "mode": "lines", "name": "Resposta ao Degrau (Malha Aberta)"}
+            {"x": T, "y": yout, "mode": "lines", "name": "Resposta ao Degrau (Malha Aberta)"}
         ],
         "layout": {
             "title": "Resposta ao Degrau (Malha Aberta)",
@@ -1030,13 +3159,14 @@ def atualizar_pagina2():
         }
     }
 
-    return jsonify({
+    return {
         "latex_planta_polinomial": latex_planta_polinomial,
         "latex_planta_fatorada": latex_planta_fatorada,
         "latex_planta_parcial": latex_planta_parcial,
         "plot_pz_data": plot_pz_data,
-        "plot_open_data": plot_open_data
-    })
+        "plot_open_data": plot_open_data,
+        "info_degrau": modelo.info_degrau("planta")
+    }
 
 def latex_poly(coeffs, var='s'):
     coeffs = np.array(coeffs, dtype=float)
@@ -1145,7 +3275,7 @@ def sinais_page():
 
 @app.route('/sinais_backend', methods=['POST'])
 def sinais_backend():
-    data = request.get_json()
+    data = dados_requisicao()
     num = [float(x) for x in data.get("num", [1])]
     den = [float(x) for x in data.get("den", [1, 1])]
 
@@ -1164,38 +3294,10 @@ def sinais_backend():
     bode_data = None
     if data.get("bode", False):
         try:
-            omega = np.logspace(-2, 2, 500)
-            mag, phase, omega = ctl.bode(G, omega=omega, dB=True, plot=False)
-            bode_data = {
-                "data": [
-                    {
-                        "x": omega.tolist(),
-                        "y": 20 * np.log10(mag).tolist(),
-                        "type": "scatter",
-                        "mode": "lines",
-                        "name": "Magnitude"
-                    },
-                    {
-                        "x": omega.tolist(),
-                        "y": np.degrees(phase).tolist(),
-                        "type": "scatter",
-                        "mode": "lines",
-                        "name": "Fase",
-                        "yaxis": "y2"
-                    }
-                ],
-                "layout": {
-                    "title": "Diagrama de Bode",
-                    "xaxis": {"title": "Frequência (rad/s)", "type": "log"},
-                    "yaxis": {"title": "Magnitude (dB)"},
-                    "yaxis2": {
-                        "title": "Fase (graus)",
-                        "overlaying": "y",
-                        "side": "right"
-                    },
-                    "legend": {"x": 0, "y": 1.1, "orientation": "h"}
-                }
-            }
+            fatores = fatores_de_polinomios(num, den)
+            omega = escolher_omega(data, lambda: grade_frequencia(*fatores))
+            resposta = resposta_frequencia(*fatores, omega)
+            bode_data = montar_bode(resposta)
         except Exception as e:
             bode_data = None
 
@@ -1212,7 +3314,7 @@ def sinais_backend():
     zeros_json = [complex_to_str(z) for z in zeros]
     polos_json = [complex_to_str(p) for p in polos]
 
-    return jsonify({
+    return responder({
         "latex_ft": latex_ft,
         "mod_zeros": mod_zeros.tolist(),
         "mod_polos": mod_polos.tolist(),
@@ -1254,13 +3356,15 @@ def sinais_edo():
         system = lti(num, den)
         tout, yout = step(system, T=t)
         latex = f"\\[ {sp.latex(eq)} \\]"
-        return jsonify({"t": tout.tolist(), "y": yout.tolist(), "latex": latex})
+        return responder({"t": tout.tolist(), "y": yout.tolist(), "latex": latex})
     except Exception as e:
         return jsonify({"t": [], "y": [], "latex": f"Erro ao interpretar EDO: {e}"})
 
 @app.route('/novo_grafico_fechado', methods=['POST'])
 def novo_grafico_fechado():
-    data = request.get_json()
+    return responder(calcular_novo_grafico_fechado(dados_requisicao()))
+
+def calcular_novo_grafico_fechado(data):
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [0])]
     polos_controlador = [float(p) for p in data.get("polos_controlador", [-1])]
@@ -1269,23 +3373,17 @@ def novo_grafico_fechado():
     ganho_planta = float(data.get("ganho_planta", 1.0))
 
     # Funções de transferência
-    num_planta = ganho_planta * (np.poly(zeros_planta) if zeros_planta else np.array([1.0]))
-    den_planta = np.poly(polos_planta) if polos_planta else np.array([1.0])
-    num_controlador = ganho_controlador * (np.poly(zeros_controlador) if zeros_controlador else np.array([1.0]))
-    den_controlador = np.poly(polos_controlador) if polos_controlador else np.array([1.0])
-
-    G_planta = ctl.tf(num_planta, den_planta)
-    G_controlador = ctl.tf(num_controlador, den_controlador)
-    G_closed = ctl.feedback(G_planta * G_controlador)
+    modelo = obter_modelo(polos_planta, zeros_planta, ganho_planta,
+                          polos_controlador, zeros_controlador, ganho_controlador)
 
     # Resposta ao degrau (Malha Fechada - sem perturbação)
-    T = np.linspace(0, 50, 1000)
-    _, yout_closed = ctl.step_response(G_closed, T)
+    T = grade_tempo(modelo.fatores("fechada")[0], 50, 1000, **opcoes_grade(data))
+    yout_closed = modelo.degrau("fechada", T)
 
     # Dados para o novo gráfico
     novo_grafico_data = {
         "data": [
-            {"x": T.tolist(), "y": yout_closed.tolist(), "mode": "lines", "name": "Resposta ao Degrau (Malha Fechada)"}
+            {"x": T, "y": yout_closed, "mode": "lines", "name": "Resposta ao Degrau (Malha Fechada)"}
         ],
         "layout": {
             "title": "Resposta ao Degrau (Malha Fechada)",
@@ -1294,12 +3392,26 @@ def novo_grafico_fechado():
         }
     }
 
-    return jsonify({"novo_grafico_data": novo_grafico_data})
+    return {"novo_grafico_data": novo_grafico_data, "info_degrau": modelo.info_degrau("fechada")}
 
 
 @app.route('/lgr_backend', methods=['POST'])
 def lgr_backend():
-    data = request.get_json()
+    return responder(calcular_lgr_backend(dados_requisicao()))
+
+def _modelo_lgr(data):
+    """Modelo e função ('planta', 'controlador', 'aberta', 'fechada') das rotas do LGR."""
+    modelo = obter_modelo([float(p) for p in data.get("polos_planta", [-1])],
+                          [float(z) for z in data.get("zeros_planta", [])],
+                          float(data.get("ganho", 1.0)),
+                          [float(p) for p in data.get("polos_controlador", [])],
+                          [float(z) for z in data.get("zeros_controlador", [])],
+                          float(data.get("ganho_controlador", 1.0)))
+    tipo = data.get("tipo", "planta")
+    return modelo, {"planta": "planta", "controlador": "controlador", "malha_aberta": "aberta"}.get(tipo, "fechada")
+
+
+def calcular_lgr_backend(data):
     tipo = data.get("tipo", "planta")
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [])]
@@ -1310,49 +3422,68 @@ def lgr_backend():
 
     try:
         # Seleciona a FT conforme o tipo
+        modelo, qual = _modelo_lgr(data)
         if tipo == "planta":
-            num = ganho * (np.poly(zeros_planta) if zeros_planta else np.array([1.0]))
-            den = np.poly(polos_planta) if polos_planta else np.array([1.0])
+            num, den = modelo.polinomios("planta")
             latex_planta = f"\\[ G(s) = {ganho:.3g} \\cdot \\frac{{{latex_factored(zeros_planta, 's')}}}{{{latex_factored(polos_planta, 's')}}} \\]"
         elif tipo == "controlador":
-            num = ganho_controlador * (np.poly(zeros_controlador) if zeros_controlador else np.array([1.0]))
-            den = np.poly(polos_controlador) if polos_controlador else np.array([1.0])
+            num, den = modelo.polinomios("controlador")
             latex_planta = f"\\[ G_c(s) = {ganho_controlador:.3g} \\cdot \\frac{{{latex_factored(zeros_controlador, 's')}}}{{{latex_factored(polos_controlador, 's')}}} \\]"
         elif tipo == "malha_aberta":
-            num_planta = ganho * (np.poly(zeros_planta) if zeros_planta else np.array([1.0]))
-            den_planta = np.poly(polos_planta) if polos_planta else np.array([1.0])
-            num_controlador = ganho_controlador * (np.poly(zeros_controlador) if zeros_controlador else np.array([1.0]))
-            den_controlador = np.poly(polos_controlador) if polos_controlador else np.array([1.0])
-            num = np.polymul(num_planta, num_controlador)
-            den = np.polymul(den_planta, den_controlador)
+            num, den = modelo.polinomios("aberta")
             latex_planta = f"\\[ G_{'{aberta}'}(s) = G(s) \\cdot G_c(s) \\]"
         else:  # malha_fechada
-            num_planta = ganho * (np.poly(zeros_planta) if zeros_planta else np.array([1.0]))
-            den_planta = np.poly(polos_planta) if polos_planta else np.array([1.0])
-            num_controlador = ganho_controlador * (np.poly(zeros_controlador) if zeros_controlador else np.array([1.0]))
-            den_controlador = np.poly(polos_controlador) if polos_controlador else np.array([1.0])
-            G_open = ctl.tf(np.polymul(num_planta, num_controlador), np.polymul(den_planta, den_controlador))
-            G_closed = ctl.feedback(G_open)
-            num = np.array(G_closed.num).flatten()
-            den = np.array(G_closed.den).flatten()
+            num, den = modelo.polinomios("fechada")
             latex_planta = f"\\[ G_{'{fechada}'}(s) = \\frac{{G(s) \\cdot G_c(s)}}{{1 + G(s) \\cdot G_c(s)}} \\]"
 
         # Lugar das Raízes (LGR)
         try:
-            G = ctl.tf(num, den)
-            rlist, klist = ctl.root_locus(G, plot=False)
+            lgr = modelo.lugar_raizes(qual, previa=bool(data.get("previa")))
             lgr_data = []
-            for i in range(rlist.shape[1]):
+            for i, ramo in enumerate(lgr["ramos"]):
                 lgr_data.append({
-                    "x": np.real(rlist[:, i]).tolist(),
-                    "y": np.imag(rlist[:, i]).tolist(),
+                    "x": np.real(ramo),
+                    "y": np.imag(ramo),
                     "mode": "lines",
                     "name": f"Comportamento {i+1}",
+                    "meta": i,
                     "line": {"color": "#0074d9"},
                     "marker": {"size": 4}
                 })
-            polos = np.roots(den)
-            zeros = np.roots(num)
+            assintotas = lgr["assintotas"]
+            if assintotas:
+                alcance = 3.0 * lgr["escala"]
+                for j, angulo in enumerate(assintotas["angulos"]):
+                    direcao = np.exp(1j * np.radians(angulo))
+                    lgr_data.append({
+                        "x": [assintotas["centroide"], assintotas["centroide"] + alcance * direcao.real],
+                        "y": [0.0, alcance * direcao.imag],
+                        "mode": "lines",
+                        "name": "Assíntotas",
+                        "legendgroup": "assintotas",
+                        "showlegend": j == 0,
+                        "line": {"color": "gray", "dash": "dot", "width": 1},
+                        "hoverinfo": "skip"
+                    })
+            if lgr["separacao"]:
+                lgr_data.append({
+                    "x": [p["s"].real for p in lgr["separacao"]],
+                    "y": [p["s"].imag for p in lgr["separacao"]],
+                    "text": [f"K = {p['k']:.4g}" for p in lgr["separacao"]],
+                    "mode": "markers",
+                    "name": "Separação/entrada",
+                    "marker": {"color": "green", "size": 9, "symbol": "diamond"}
+                })
+            if lgr["cruzamentos"]:
+                lgr_data.append({
+                    "x": [0.0] * (2 * len(lgr["cruzamentos"])),
+                    "y": [c["omega"] for c in lgr["cruzamentos"]] + [-c["omega"] for c in lgr["cruzamentos"]],
+                    "text": [f"K = {c['k']:.4g}" for c in lgr["cruzamentos"]] * 2,
+                    "mode": "markers",
+                    "name": "Cruzamento jω",
+                    "marker": {"color": "orange", "size": 9, "symbol": "star"}
+                })
+            zeros, polos = lgr["zeros"], lgr["polos"]
             lgr_data.append({
                 "x": np.real(polos).tolist(),
                 "y": np.imag(polos).tolist(),
@@ -1374,24 +3505,55 @@ def lgr_backend():
                 "showlegend": True
             }
             lgr_plot = {"data": lgr_data, "layout": lgr_layout}
-            klist_out = klist.tolist()
+            klist_out = lgr["ganhos"]
+            notaveis = {
+                "assintotas": assintotas,
+                "separacao": [{"s": [p["s"].real, p["s"].imag], "k": p["k"]} for p in lgr["separacao"]],
+                "cruzamentos": lgr["cruzamentos"],
+            }
         except Exception as e:
             print("Erro no root_locus:", e)
             lgr_plot = {"data": [], "layout": {"title": f"Erro ao calcular LGR: {e}"}}
             klist_out = []
+            notaveis = {}
 
-        return jsonify({
+        return {
             "latex_planta": latex_planta,
             "lgr_plot": lgr_plot,
-            "klist": klist_out
-        })
+            "klist": klist_out,
+            **notaveis
+        }
     except Exception as e:
         print("Erro geral no lgr_backend:", e)
-        return jsonify({"lgr_plot": {"data": [], "layout": {"title": f"Erro geral: {e}"}}})
+        return {"lgr_plot": {"data": [], "layout": {"title": f"Erro geral: {e}"}}}
+
+@app.route('/lgr_consulta', methods=['POST'])
+def lgr_consulta():
+    return responder(calcular_lgr_consulta(dados_requisicao()))
+
+def calcular_lgr_consulta(data):
+    """
+    Consulta ao LGR já calculado (mesmos parâmetros do /lgr_backend):
+    "ponto": [re, im] devolve o ponto do lugar mais próximo com K, ζ, ωn e todos
+    os polos de malha fechada ("ramo": índice do traço clicado restringe a busca
+    a esse ramo); "zeta": ζ devolve os ganhos com esse amortecimento.
+    """
+    modelo, qual = _modelo_lgr(data)
+    indice = modelo.indice_lgr(qual)
+    resposta = {}
+    if data.get("ponto") is not None:
+        re, im = (float(v) for v in data["ponto"])
+        ramo = data.get("ramo")
+        resposta["ponto"] = indice.ponto_mais_proximo(complex(re, im), None if ramo is None else int(ramo))
+    if data.get("zeta") is not None:
+        resposta["amortecimento"] = indice.ganho_para_amortecimento(float(data["zeta"]))
+    return resposta
 
 @app.route('/step_backend', methods=['POST'])
 def step_backend():
-    data = request.get_json()
+    return responder(calcular_step_backend(dados_requisicao()))
+
+def calcular_step_backend(data):
     tipo = data.get("tipo", "malha_fechada")
     polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
     zeros_planta = [float(z) for z in data.get("zeros_planta", [])]
@@ -1401,26 +3563,21 @@ def step_backend():
     ganho_controlador = float(data.get("ganho_controlador", 1.0))
 
     # Funções de transferência
-    num_planta = ganho * (np.poly(zeros_planta) if zeros_planta else np.array([1.0]))
-    den_planta = np.poly(polos_planta) if polos_planta else np.array([1.0])
-    num_controlador = ganho_controlador * (np.poly(zeros_controlador) if zeros_controlador else np.array([1.0]))
-    den_controlador = np.poly(polos_controlador) if polos_controlador else np.array([1.0])
+    modelo = obter_modelo(polos_planta, zeros_planta, ganho,
+                          polos_controlador, zeros_controlador, ganho_controlador)
 
-    T = np.linspace(0, 50, 1000)
+    qual = "planta" if tipo == "malha_aberta" else "fechada"
+    T = grade_tempo(modelo.fatores(qual)[0], 50, 1000, **opcoes_grade(data))
     if tipo == "malha_aberta":
-        G_open = ctl.tf(num_planta, den_planta)
-        _, yout = ctl.step_response(G_open, T)
+        yout = modelo.degrau("planta", T)
         title = "Resposta ao Degrau (Malha Aberta)"
     else:
-        G_planta = ctl.tf(num_planta, den_planta)
-        G_controlador = ctl.tf(num_controlador, den_controlador)
-        G_closed = ctl.feedback(G_planta * G_controlador)
-        _, yout = ctl.step_response(G_closed, T)
+        yout = modelo.degrau("fechada", T)
         title = "Resposta ao Degrau (Malha Fechada)"
 
     step_plot = {
         "data": [
-            {"x": T.tolist(), "y": yout.tolist(), "mode": "lines", "name": title}
+            {"x": T, "y": yout, "mode": "lines", "name": title}
         ],
         "layout": {
             "title": title,
@@ -1428,7 +3585,1158 @@ def step_backend():
             "yaxis": {"title": "Amplitude"}
         }
     }
-    return jsonify({"step_plot": step_plot})
+    return {"step_plot": step_plot, "info_degrau": modelo.info_degrau(qual)}
+
+# ---------------------------------------------------------------------------
+# Varredura de parâmetros
+# Uma família de sistemas (um ou dois parâmetros variando sobre um modelo base)
+# é realizada como uma pilha de matrizes de estado (ordens diferentes são
+# igualadas por cancelamentos exatos) e simulada de uma só vez: expm em lote,
+# parâmetros de Markov em lote e uma única convolução por FFT. O Bode da
+# família sai de um Horner vetorizado sobre os coeficientes empilhados.
+# ---------------------------------------------------------------------------
+
+MAX_MEMBROS_VARREDURA = 400
+_PARAMETRO_INDEXADO = re.compile(r"^(polos_planta|zeros_planta|polos_controlador|zeros_controlador)\[(\d+)\]$")
+_PARAMETROS_ESCALARES = ("ganho_planta", "ganho_controlador", "ctrl_k", "ctrl_ti", "ctrl_td", "ctrl_n")
+
+
+def _valores_varredura(item):
+    """Valores de um parâmetro: lista explícita ou {"inicio", "fim", "n", "escala": "lin"|"log"}."""
+    if "valores" in item:
+        return np.asarray(item["valores"], dtype=float)
+    inicio, fim, n = float(item["inicio"]), float(item["fim"]), int(item.get("n", 10))
+    if item.get("escala") == "log":
+        return np.geomspace(inicio, fim, n)
+    return np.linspace(inicio, fim, n)
+
+
+def _aplicar_parametro(dados, nome, valor):
+    indexado = _PARAMETRO_INDEXADO.match(nome)
+    if indexado:
+        lista, i = indexado.group(1), int(indexado.group(2))
+        dados[lista] = list(dados[lista])
+        dados[lista][i] = valor
+    elif nome in _PARAMETROS_ESCALARES:
+        dados[nome] = valor
+    else:
+        raise ValueError(f"Parâmetro de varredura desconhecido: {nome}")
+
+
+def _polinomios_membro(dados, familia, qual):
+    """(num, den) de um membro da família: modelo polos/zeros (como /simuladorcomp) ou PID (como /pid)."""
+    num_g = _poly(dados.get("zeros_planta", []), float(dados.get("ganho_planta", 1.0)))
+    den_g = _poly(dados.get("polos_planta", [-1]))
+    if familia == "pid":
+        num_c, den_c = polinomios_pid(dados.get("ctrl_type", "PID"), float(dados.get("ctrl_k", 1)),
+                                      float(dados.get("ctrl_ti", 1)), float(dados.get("ctrl_td", 1)),
+                                      float(dados.get("ctrl_n", 10)))
+    else:
+        num_c = _poly(dados.get("zeros_controlador", []), float(dados.get("ganho_controlador", 1.0)))
+        den_c = _poly(dados.get("polos_controlador", []))
+    if qual == "planta":
+        return num_g, den_g
+    if qual == "controlador":
+        return np.asarray(num_c, dtype=float), np.asarray(den_c, dtype=float)
+    num_a, den_a = np.polymul(num_c, num_g), np.polymul(den_c, den_g)
+    if qual == "aberta":
+        return num_a, den_a
+    return num_a, np.polyadd(den_a, num_a)
+
+
+def _empilhar_ss(polinomios):
+    """
+    Realizações canônicas controláveis (A, B, C, D) empilhadas de uma lista de
+    (num, den). Membros de grau menor são multiplicados (num e den) por
+    (s + 1)^k, um cancelamento exato que iguala as ordens.
+    Retorna também NUM e DEN empilhados, já no grau comum.
+    """
+    polinomios = [(np.trim_zeros(np.atleast_1d(np.asarray(num, dtype=float)), 'f'),
+                   np.trim_zeros(np.atleast_1d(np.asarray(den, dtype=float)), 'f')) for num, den in polinomios]
+    if any(len(num) > len(den) for num, den in polinomios):
+        raise ValueError("Membro da varredura impróprio (mais zeros do que polos)")
+    grau = max(len(den) for _, den in polinomios) - 1
+    NUM = np.zeros((len(polinomios), grau + 1))
+    DEN = np.zeros((len(polinomios), grau + 1))
+    for i, (num, den) in enumerate(polinomios):
+        if len(den) <= grau:
+            fator = np.poly(-np.ones(grau + 1 - len(den)))
+            num, den = np.polymul(num, fator), np.polymul(den, fator)
+        NUM[i, grau + 1 - len(num):] = num
+        DEN[i] = den
+    return _ss_canonica_em_lote(NUM, DEN) + (NUM, DEN)
+
+
+def _ss_canonica_em_lote(NUM, DEN):
+    """(A, B, C, D) canônicas controláveis de NUM/DEN empilhados (M, grau + 1), mesmo grau."""
+    grau = DEN.shape[1] - 1
+    a = DEN[:, 1:] / DEN[:, :1]
+    b = NUM / DEN[:, :1]
+    M = len(DEN)
+    A = np.zeros((M, grau, grau))
+    A[:, 0, :] = -a
+    A[:, np.arange(1, grau), np.arange(grau - 1)] = 1.0
+    B = np.zeros((M, grau, 1))
+    B[:, :1, 0] = 1.0
+    D = b[:, :1, None]
+    C = (b[:, 1:] - b[:, :1] * a)[:, None, :]
+    return A, B, C, D
+
+
+def calcular_varredura(data):
+    """
+    Família de respostas ao degrau e de Bode variando um ou dois parâmetros.
+    "varrer": [{"nome": "ganho_controlador" | "polos_planta[0]" | "ctrl_k" | ...,
+                "valores": [...]} ou {"nome", "inicio", "fim", "n", "escala"}];
+    "familia": "polos_zeros" (padrão) ou "pid"; "qual": planta, controlador,
+    aberta ou fechada (padrão).
+    """
+    familia = data.get("familia", "polos_zeros")
+    qual = data.get("qual", "fechada")
+    varrer = data.get("varrer", [])
+    if not 1 <= len(varrer) <= 2:
+        raise ValueError("Informe um ou dois parâmetros em 'varrer'")
+    nomes = [item["nome"] for item in varrer]
+    valores = [_valores_varredura(item) for item in varrer]
+    grade = np.stack([v.ravel() for v in np.meshgrid(*valores, indexing="ij")], axis=1)
+    if len(grade) > MAX_MEMBROS_VARREDURA:
+        raise ValueError(f"No máximo {MAX_MEMBROS_VARREDURA} membros por varredura")
+
+    polinomios = []
+    for linha in grade:
+        dados = dict(data)
+        for nome, valor in zip(nomes, linha):
+            _aplicar_parametro(dados, nome, float(valor))
+        polinomios.append(_polinomios_membro(dados, familia, qual))
+
+    A, B, C, D, NUM, DEN = _empilhar_ss(polinomios)
+    polos = np.linalg.eigvals(A).ravel() if A.shape[-1] else np.array([])
+    T = grade_tempo(polos, 50, 1000, **opcoes_grade(data))
+    U = np.ones((len(grade), 1, len(T)))
+    Y = simular_ss(A, B, C, D, T, U)[:, 0, :] if A.shape[-1] else D[:, 0, :] * U[:, 0, :]
+
+    # Bode: Horner vetorizado nos coeficientes empilhados
+    base = _polinomios_membro(data, familia, qual)
+    omega = escolher_omega(data, lambda: grade_frequencia(*fatores_de_polinomios(*base)))
+    s = 1j * omega
+    H_num = np.zeros((len(grade), len(omega)), dtype=complex)
+    H_den = np.zeros((len(grade), len(omega)), dtype=complex)
+    for j in range(NUM.shape[1]):
+        H_num = H_num * s + NUM[:, j:j + 1]
+        H_den = H_den * s + DEN[:, j:j + 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        H = H_num / H_den
+        mag_db = 20 * np.log10(np.abs(H))
+    fase = np.degrees(np.unwrap(np.angle(H), axis=-1))
+
+    rotulos = [", ".join(f"{nome} = {valor:.4g}" for nome, valor in zip(nomes, linha)) for linha in grade]
+    plot_degrau = {
+        "data": [{"x": T, "y": y, "mode": "lines", "name": rotulo} for y, rotulo in zip(Y, rotulos)],
+        "layout": {"title": "Resposta ao Degrau (varredura)", "xaxis": {"title": "Tempo (s)"}, "yaxis": {"title": "Amplitude"}}
+    }
+    plot_bode = {
+        "data": ([{"x": omega, "y": m, "mode": "lines", "name": rotulo, "legendgroup": rotulo}
+                  for m, rotulo in zip(mag_db, rotulos)]
+                 + [{"x": omega, "y": p, "mode": "lines", "name": rotulo, "legendgroup": rotulo,
+                     "showlegend": False, "yaxis": "y2", "line": {"dash": "dot"}}
+                    for p, rotulo in zip(fase, rotulos)]),
+        "layout": {
+            "title": "Diagrama de Bode (varredura)",
+            "xaxis": {"title": "Frequência (rad/s)", "type": "log"},
+            "yaxis": {"title": "Magnitude (dB)"},
+            "yaxis2": {"title": "Fase (graus)", "overlaying": "y", "side": "right"}
+        }
+    }
+    return {
+        "parametros": [{"nome": nome, "valores": v} for nome, v in zip(nomes, valores)],
+        "membros": [dict(zip(nomes, linha.tolist())) for linha in grade],
+        "T": T,
+        "y": Y,
+        "omega": omega,
+        "mag_db": mag_db,
+        "fase": fase,
+        "plot_degrau": plot_degrau,
+        "plot_bode": plot_bode,
+    }
+
+
+@app.route('/varredura', methods=['POST'])
+def varredura():
+    try:
+        return responder(calcular_varredura(dados_requisicao()))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+# ---------------------------------------------------------------------------
+# Robustez (Monte Carlo)
+# Polos, zeros e ganho da planta são sorteados de distribuições dadas pelo
+# usuário; todas as amostras são geradas no processo principal a partir da
+# semente, e só a simulação é repartida em lotes de tamanho fixo entre
+# processos. Assim o resultado depende apenas da semente, não do número de
+# processos. Cada lote é uma pilha de realizações simulada de uma vez.
+# ---------------------------------------------------------------------------
+
+MAX_AMOSTRAS_MC = 20000
+LOTE_MC = 500
+TOLERANCIA_ASSENTAMENTO = 0.02
+
+_pool_mc = None
+_trava_pool_mc = threading.Lock()
+
+
+def _obter_pool_mc():
+    # "spawn": os processos não herdam as threads e travas do servidor.
+    # Com um único núcleo o pool só acrescentaria custo: None (roda no próprio processo).
+    global _pool_mc
+    if (os.cpu_count() or 1) < 2:
+        return None
+    with _trava_pool_mc:
+        if _pool_mc is None:
+            _pool_mc = ProcessPoolExecutor(max_workers=min(4, os.cpu_count()),
+                                           mp_context=multiprocessing.get_context("spawn"))
+        return _pool_mc
+
+
+def _sortear(rng, nominal, spec, n):
+    """
+    n amostras em torno de `nominal` (array de valores reais). spec:
+    {"distribuicao": "normal", "desvio": σ} | {"distribuicao": "uniforme", "variacao": d}
+    (nominal ± d) | {"distribuicao": "lognormal", "desvio": σ} (fator multiplicativo);
+    "relativo": true faz σ/d serem frações de |nominal|.
+    """
+    nominal = np.asarray(nominal, dtype=float)
+    distribuicao = spec.get("distribuicao", "normal")
+    escala = np.abs(nominal) if spec.get("relativo") else 1.0
+    forma = (n,) + nominal.shape
+    if distribuicao == "normal":
+        return nominal + float(spec["desvio"]) * escala * rng.standard_normal(forma)
+    if distribuicao == "uniforme":
+        return nominal + float(spec["variacao"]) * escala * rng.uniform(-1.0, 1.0, forma)
+    if distribuicao == "lognormal":
+        return nominal * np.exp(float(spec["desvio"]) * rng.standard_normal(forma))
+    raise ValueError(f"Distribuição desconhecida: {distribuicao}")
+
+
+def _amostras_raizes(rng, nominais, spec, n):
+    """Amostras (n, k) de uma lista de raízes; spec único para todas ou lista com um spec (ou null) por raiz."""
+    nominais = np.asarray(nominais, dtype=float)
+    amostras = np.broadcast_to(nominais, (n, len(nominais))).copy()
+    if spec is None:
+        return amostras
+    specs = spec if isinstance(spec, list) else [spec] * len(nominais)
+    if len(specs) != len(nominais):
+        raise ValueError("A lista de incertezas deve ter um item por raiz")
+    for i, item in enumerate(specs):
+        if item is not None:
+            amostras[:, i] = _sortear(rng, nominais[i], item, n)
+    return amostras
+
+
+def _poly_em_lote(R, ganhos):
+    """Coeficientes de ganho·Π(s − r) para cada linha de R (n, k): array (n, k + 1)."""
+    P = np.ones((len(R), 1))
+    for j in range(R.shape[1]):
+        P = np.pad(P, ((0, 0), (0, 1))) - R[:, j:j + 1] * np.pad(P, ((0, 0), (1, 0)))
+    return ganhos[:, None] * P
+
+
+def _convolver_em_lote(P, q):
+    """Produto de cada linha de P pelo polinômio fixo q."""
+    q = np.atleast_1d(np.asarray(q, dtype=float))
+    R = np.zeros((len(P), P.shape[1] + len(q) - 1))
+    for j, c in enumerate(q):
+        R[:, j:j + P.shape[1]] += c * P
+    return R
+
+
+def _somar_em_lote(P, Q):
+    """Soma de polinômios empilhados alinhados pela direita."""
+    n = max(P.shape[1], Q.shape[1])
+    return (np.pad(P, ((0, 0), (n - P.shape[1], 0)))
+            + np.pad(Q, ((0, 0), (n - Q.shape[1], 0))))
+
+
+def _simular_lote_mc(NUM, DEN, T):
+    """Respostas ao degrau de um lote de malhas fechadas (executado nos processos do pool)."""
+    A, B, C, D = _ss_canonica_em_lote(NUM, DEN)
+    U = np.ones((len(DEN), 1, len(T)))
+    if A.shape[-1] == 0:
+        return (D[:, 0, :] * U[:, 0, :]).astype(np.float32)
+    return simular_ss(A, B, C, D, T, U, memorizar=False)[:, 0, :].astype(np.float32)
+
+
+def _metricas_degrau(T, Y, finais):
+    """Sobressinal (%) e tempo de assentamento (faixa de 2%) de cada linha de Y; NaN se não assentou na grade."""
+    referencia = np.where(np.abs(finais) > 1e-12, np.abs(finais), 1.0)
+    sinal = np.where(finais < 0, -1.0, 1.0)
+    sobressinal = np.maximum((sinal[:, None] * Y).max(axis=1) - sinal * finais, 0.0) / referencia * 100
+    fora = np.abs(Y - finais[:, None]) > TOLERANCIA_ASSENTAMENTO * referencia[:, None]
+    ultimo = len(T) - 1 - np.argmax(fora[:, ::-1], axis=1)
+    assentamento = np.where(fora.any(axis=1), T[np.minimum(ultimo + 1, len(T) - 1)], 0.0)
+    assentamento[fora[:, -1]] = np.nan
+    return sobressinal, assentamento
+
+
+def _histograma(valores, bins):
+    contagens, bordas = np.histogram(valores, bins=bins) if len(valores) else (np.zeros(0, int), np.zeros(0))
+    return {"bordas": bordas, "contagens": contagens}
+
+
+def calcular_robustez(data):
+    """
+    Análise de robustez da malha fechada por Monte Carlo.
+    "incertezas": {"polos_planta": spec | [spec | null, ...], "zeros_planta": ...,
+    "ganho_planta": spec} (ver _sortear); "amostras" (padrão 2000), "semente"
+    (padrão 0), "bins" dos histogramas. O controlador fica no nominal
+    ("familia": "polos_zeros" ou "pid", como na varredura).
+    Devolve envelopes de 5/50/95% da resposta ao degrau das amostras estáveis
+    ("percentis", com o próprio eixo T; nulos se nenhuma for estável),
+    histogramas de sobressinal e tempo de assentamento e a fração instável.
+    """
+    incertezas = data.get("incertezas", {})
+    n = int(data.get("amostras", 2000))
+    if not 1 <= n <= MAX_AMOSTRAS_MC:
+        raise ValueError(f"'amostras' deve estar entre 1 e {MAX_AMOSTRAS_MC}")
+    semente = int(data.get("semente", 0))
+    bins = int(data.get("bins", 30))
+    rng = np.random.default_rng(semente)
+
+    polos = _amostras_raizes(rng, data.get("polos_planta", [-1]), incertezas.get("polos_planta"), n)
+    zeros = _amostras_raizes(rng, data.get("zeros_planta", []), incertezas.get("zeros_planta"), n)
+    ganho_nominal = float(data.get("ganho_planta", 1.0))
+    spec_ganho = incertezas.get("ganho_planta")
+    ganhos = _sortear(rng, ganho_nominal, spec_ganho, n) if spec_ganho else np.full(n, ganho_nominal)
+
+    num_c, den_c = (np.trim_zeros(np.atleast_1d(p), 'f')
+                    for p in _polinomios_membro(data, data.get("familia", "polos_zeros"), "controlador"))
+    if zeros.shape[1] + len(num_c) > polos.shape[1] + len(den_c):
+        raise ValueError("Malha fechada imprópria (mais zeros do que polos)")
+    NUM = _convolver_em_lote(_poly_em_lote(zeros, ganhos), num_c)
+    DEN = _somar_em_lote(_convolver_em_lote(_poly_em_lote(polos, np.ones(n)), den_c), NUM)
+    NUM = _somar_em_lote(NUM, np.zeros((n, DEN.shape[1])))
+
+    # Estabilidade pelos autovalores das companheiras empilhadas (barato para todas as amostras)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        A = _ss_canonica_em_lote(NUM, DEN)[0]
+        validas = np.all(np.isfinite(A), axis=(1, 2))
+        raizes = np.full((n, A.shape[-1]), np.inf, dtype=complex)
+        raizes[validas] = np.linalg.eigvals(A[validas])
+    estaveis = validas & np.all(raizes.real < 0, axis=1)
+    n_estaveis = int(estaveis.sum())
+
+    # Grade: polos nominais mais o polo dominante da amostra estável 95% mais lenta
+    nominal = _polinomios_membro(data, data.get("familia", "polos_zeros"), "fechada")
+    polos_grade = list(np.roots(nominal[1]))
+    if n_estaveis:
+        dominantes = raizes[estaveis][np.arange(n_estaveis), np.argmax(raizes[estaveis].real, axis=1)]
+        lento = np.argsort(dominantes.real)[int(0.95 * (n_estaveis - 1))]
+        polos_grade.append(dominantes[lento])
+    T = grade_tempo(polos_grade, 50, 1000, automatico=data.get("horizonte", "auto") == "auto",
+                    previa=bool(data.get("previa")))
+
+    NUM_e, DEN_e = NUM[estaveis], DEN[estaveis]
+    lotes = [(NUM_e[i:i + LOTE_MC], DEN_e[i:i + LOTE_MC], T) for i in range(0, n_estaveis, LOTE_MC)]
+    pool = _obter_pool_mc() if len(lotes) > 1 else None
+    partes = []
+    if pool is not None:
+        futuros = [pool.submit(_simular_lote_mc, *lote) for lote in lotes]
+        try:
+            for i, futuro in enumerate(futuros):
+                partes.append(futuro.result())
+                reportar_progresso((i + 1) / len(lotes), f"Lote {i + 1} de {len(lotes)}")
+        except TarefaCancelada:
+            for futuro in futuros:
+                futuro.cancel()
+            raise
+    else:
+        for i, lote in enumerate(lotes):
+            partes.append(_simular_lote_mc(*lote))
+            reportar_progresso((i + 1) / len(lotes), f"Lote {i + 1} de {len(lotes)}")
+    Y = np.concatenate(partes) if partes else np.zeros((0, len(T)), dtype=np.float32)
+
+    finais = NUM_e[:, -1] / DEN_e[:, -1]
+    sobressinal, assentamento = _metricas_degrau(T, Y, finais)
+    assentadas = assentamento[np.isfinite(assentamento)]
+    y_nominal = simular_tf(*nominal, T, np.ones(len(T)))
+    # Sem amostras estáveis não há envelope: percentis nulos (nunca NaN no JSON)
+    percentis = np.percentile(Y, [5, 50, 95], axis=0) if n_estaveis else [None] * 3
+    faixa = [
+        {"x": T, "y": percentis[2], "mode": "lines", "line": {"width": 0}, "showlegend": False, "name": "95%"},
+        {"x": T, "y": percentis[0], "mode": "lines", "line": {"width": 0}, "fill": "tonexty",
+         "fillcolor": "rgba(31,119,180,0.25)", "name": "5% – 95%"},
+        {"x": T, "y": percentis[1], "mode": "lines", "name": "Mediana"},
+    ] if n_estaveis else []
+
+    plot_envelope = {
+        "data": faixa + [
+            {"x": T, "y": y_nominal, "mode": "lines", "name": "Nominal", "line": {"dash": "dash"}},
+        ],
+        "layout": {"title": f"Resposta ao Degrau — {n_estaveis} de {n} amostras estáveis",
+                   "xaxis": {"title": "Tempo (s)"}, "yaxis": {"title": "Amplitude"}}
+    }
+    hist_sobressinal = _histograma(sobressinal, bins)
+    hist_assentamento = _histograma(assentadas, bins)
+    plot_histogramas = {
+        "data": [
+            {"x": hist_sobressinal["bordas"][:-1], "y": hist_sobressinal["contagens"], "type": "bar",
+             "name": "Sobressinal (%)"},
+            {"x": hist_assentamento["bordas"][:-1], "y": hist_assentamento["contagens"], "type": "bar",
+             "name": "Assentamento (s)", "xaxis": "x2", "yaxis": "y2"},
+        ],
+        "layout": {
+            "grid": {"rows": 1, "columns": 2, "pattern": "independent"},
+            "xaxis": {"title": "Sobressinal (%)"}, "xaxis2": {"title": "Tempo de assentamento (s)"},
+            "yaxis": {"title": "Amostras"}, "bargap": 0.05
+        }
+    }
+    return {
+        "amostras": n,
+        "semente": semente,
+        "instaveis": n - n_estaveis,
+        "fracao_instavel": (n - n_estaveis) / n,
+        "T": T,
+        # eixo próprio: com ?pontos=N o envelope é reduzido junto com o seu T
+        "percentis": {"T": T, "5": percentis[0], "50": percentis[1], "95": percentis[2]},
+        "nominal": y_nominal,
+        "sobressinal": dict(hist_sobressinal, percentis=np.percentile(sobressinal, [5, 50, 95]) if n_estaveis else []),
+        "assentamento": dict(hist_assentamento, nao_assentaram=int(np.isnan(assentamento).sum()),
+                             percentis=np.percentile(assentadas, [5, 50, 95]) if len(assentadas) else []),
+        "plot_envelope": plot_envelope,
+        "plot_histogramas": plot_histogramas,
+    }
+
+
+@app.route('/robustez', methods=['POST'])
+def robustez():
+    try:
+        return responder(calcular_robustez(dados_requisicao()))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+# ---------------------------------------------------------------------------
+# Sintonia automática de PID
+# As regras clássicas (Ziegler–Nichols, SIMC, AMIGO) dão os pontos de partida;
+# a busca é de entropia cruzada em log(K, Ti, Td): cada iteração avalia um lote
+# de candidatos de uma vez (estabilidade pelos autovalores, resposta ao degrau
+# simulada em pilha, Ms pela resposta em frequência vetorizada) e reamostra em
+# torno dos melhores, até esgotar as iterações ou o tempo.
+# ---------------------------------------------------------------------------
+
+LOTE_SINTONIA = 256
+MAX_LOTE_SINTONIA = 2000
+
+
+def _modelo_primeira_ordem(num, den):
+    """
+    Aproximação K·e^{−Ls}/(τs + 1) da planta estável pelo método dos dois pontos
+    (28,3% e 63,2% da resposta ao degrau). O atraso é limitado a 0,1τ para baixo,
+    senão as regras degeneram em plantas de primeira ordem.
+    """
+    polos = np.roots(den)
+    if len(polos) == 0 or np.any(polos.real >= 0):
+        raise ValueError("A sintonia automática requer planta estável com ao menos um polo")
+    ganho = np.polyval(num, 0) / np.polyval(den, 0)
+    if abs(ganho) < 1e-12:
+        raise ValueError("A planta não tem ganho DC (zero na origem)")
+    T = grade_tempo(polos, 1, 1, automatico=True, n_min=2000, n_max=20000)
+    y = simular_tf(num, den, T, np.ones_like(T)) / ganho
+    instantes = []
+    for nivel in (0.283, 0.632):
+        i = max(int(np.argmax(y >= nivel)), 1)
+        instantes.append(np.interp(nivel, [y[i - 1], y[i]], [T[i - 1], T[i]]))
+    t28, t63 = instantes
+    tau = 1.5 * (t63 - t28)
+    return ganho, tau, max(t63 - tau, 0.1 * tau)
+
+
+def regras_sintonia(num, den, ctrl_type="PID"):
+    """Sintonias {"ZN": (K, Ti, Td), "SIMC": ..., "AMIGO": ...} para PI ou PID (Td = 0 no PI)."""
+    Kp, tau, L = _modelo_primeira_ordem(num, den)
+    pid = ctrl_type == "PID"
+    regras = {}
+
+    # Ziegler–Nichols: ganho e período críticos; sem cruzamento de −180°, curva de reação
+    sinal = np.sign(Kp)
+    gm, _, _, w180, _, _ = ctl.stability_margins(ctl.tf(sinal * np.asarray(num), den))
+    if np.isfinite(gm) and w180 > 0 and gm > 0:
+        Ku, Pu = sinal * gm, 2 * np.pi / w180
+        regras["ZN"] = (0.6 * Ku, Pu / 2, Pu / 8) if pid else (0.45 * Ku, Pu / 1.2, 0.0)
+    else:
+        regras["ZN"] = (1.2 * tau / (Kp * L), 2 * L, L / 2) if pid else (0.9 * tau / (Kp * L), 3.33 * L, 0.0)
+
+    # SIMC com tc = L (no PID, a versão melhorada com Td = L/3)
+    if pid:
+        tau_m = tau + L / 3
+        regras["SIMC"] = (tau_m / (Kp * 2 * L), min(tau_m, 8 * L), L / 3)
+    else:
+        regras["SIMC"] = (tau / (Kp * 2 * L), min(tau, 8 * L), 0.0)
+
+    # AMIGO
+    if pid:
+        regras["AMIGO"] = ((0.2 + 0.45 * tau / L) / Kp, (0.4 * L + 0.8 * tau) / (L + 0.1 * tau) * L,
+                           0.5 * L * tau / (0.3 * L + tau))
+    else:
+        regras["AMIGO"] = (0.15 / Kp + (0.35 - L * tau / (L + tau)**2) * tau / (Kp * L),
+                           0.35 * L + 13 * L * tau**2 / (tau**2 + 12 * L * tau + 7 * L**2), 0.0)
+    return regras, (Kp, tau, L)
+
+
+def _polinomios_pid_em_lote(P, N, b, c, pid):
+    """Controladores empilhados a partir de P = (K, Ti, Td) por linha: (NUMc, NUMr, DENc), como em polinomios_pid."""
+    K, Ti, Td = P.T
+    if pid:
+        NUMc = np.stack([K * Ti * (1 + Td * N), K * (Ti * N + 1), K * N], axis=1)
+        NUMr = np.stack([K * Ti * (b + c * Td * N), K * (b * Ti * N + 1), K * N], axis=1)
+        DENc = np.stack([Ti, Ti * N, np.zeros_like(Ti)], axis=1)
+    else:
+        NUMc = np.stack([K * Ti, K], axis=1)
+        NUMr = np.stack([K * b * Ti, K], axis=1)
+        DENc = np.stack([Ti, np.zeros_like(Ti)], axis=1)
+    return NUMc, NUMr, DENc
+
+
+def _avaliar_candidatos(P, planta, T, omega, N, b, c, pid):
+    """IAE, ITAE, sobressinal (%), Ms e respostas ao degrau de cada linha de P; inf nos instáveis."""
+    num_p, den_p = planta
+    NUMc, NUMr, DENc = _polinomios_pid_em_lote(P, N, b, c, pid)
+    NUM_l = _convolver_em_lote(NUMc, num_p)
+    DEN_a = _convolver_em_lote(DENc, den_p)
+    DEN = _somar_em_lote(DEN_a, NUM_l)
+    DEN_a = _somar_em_lote(DEN_a, np.zeros_like(DEN))
+    NUM = _somar_em_lote(_convolver_em_lote(NUMr, num_p), np.zeros((len(P), DEN.shape[1])))
+    m = len(P)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        A = _ss_canonica_em_lote(NUM, DEN)[0]
+        validas = np.all(np.isfinite(A), axis=(1, 2))
+        estaveis = validas.copy()
+        estaveis[validas] = np.all(np.linalg.eigvals(A[validas]).real < 0, axis=1)
+
+    iae, itae, sobressinal, ms = (np.full(m, np.inf) for _ in range(4))
+    Y = np.full((m, len(T)), np.nan)
+    if estaveis.any():
+        Y[estaveis] = _simular_lote_mc(NUM[estaveis], DEN[estaveis], T)
+        erro = np.abs(1.0 - Y[estaveis])
+        iae[estaveis] = np.trapezoid(erro, T, axis=1)
+        itae[estaveis] = np.trapezoid(T * erro, T, axis=1)
+        finais = NUM[estaveis, -1] / DEN[estaveis, -1]
+        sobressinal[estaveis] = _metricas_degrau(T, Y[estaveis], finais)[0]
+        # Ms = max |S(jω)| = max |DENc·den_p / DEN| na grade omega
+        V = (1j * omega)[None, :] ** np.arange(DEN.shape[1] - 1, -1, -1)[:, None]
+        ms[estaveis] = np.abs((DEN_a[estaveis] @ V) / (DEN[estaveis] @ V)).max(axis=1)
+    return {"iae": iae, "itae": itae, "sobressinal": sobressinal, "ms": ms, "y": Y}
+
+
+def _fronteira_pareto(custo, ms):
+    """Índices não dominados em (custo, Ms), em ordem crescente de custo."""
+    ordem = np.argsort(custo, kind="stable")
+    fronteira, melhor_ms = [], np.inf
+    for i in ordem:
+        if np.isfinite(custo[i]) and ms[i] < melhor_ms:
+            fronteira.append(i)
+            melhor_ms = ms[i]
+    return fronteira
+
+
+def calcular_pid_autotune(data):
+    """
+    Sintonia de PI/PID ("ctrl_type") para a planta de polos_planta/zeros_planta,
+    minimizando "criterio" ("IAE", padrão, ou "ITAE") da resposta ao degrau de
+    referência sujeita a sobressinal <= "sobressinal_max" (% , padrão 20) e
+    Ms <= "ms_max" (padrão 2). N, b e c são os da página (ctrl_n, ctrl_b,
+    ctrl_c) e ficam fixos. "lote" candidatos por iteração (padrão 256), no
+    máximo "iteracoes" (padrão 12) ou "tempo_max" segundos (padrão 2),
+    "semente" (padrão 0); "limites": {"K": [min, max], "Ti": ..., "Td": ...}.
+    Devolve a melhor sintonia, as sintonias das regras e a fronteira de Pareto
+    entre o critério e Ms.
+    """
+    inicio = time.perf_counter()
+    polos_planta = [float(p) for p in data.get("polos_planta", [-1])]
+    zeros_planta = [float(z) for z in data.get("zeros_planta", [0])]
+    planta = obter_modelo(polos_planta, [z for z in zeros_planta if abs(z) > 1e-8]).polinomios("planta")
+    planta = tuple(np.trim_zeros(np.atleast_1d(np.asarray(p, dtype=float)), 'f') for p in planta)
+
+    ctrl_type = data.get("ctrl_type", "PID")
+    if ctrl_type not in ("PI", "PID"):
+        raise ValueError("A sintonia automática trata controladores PI e PID")
+    pid = ctrl_type == "PID"
+    criterio = data.get("criterio", "IAE").lower()
+    if criterio not in ("iae", "itae"):
+        raise ValueError("'criterio' deve ser IAE ou ITAE")
+    N = float(data.get("ctrl_n", 10))
+    b = float(data.get("ctrl_b", 0.5))
+    c = float(data.get("ctrl_c", 0.0))
+    sobressinal_max = float(data.get("sobressinal_max", 20))
+    ms_max = float(data.get("ms_max", 2.0))
+    lote = int(data.get("lote", LOTE_SINTONIA))
+    if not 8 <= lote <= MAX_LOTE_SINTONIA:
+        raise ValueError(f"'lote' deve estar entre 8 e {MAX_LOTE_SINTONIA}")
+    iteracoes = int(data.get("iteracoes", 12))
+    tempo_max = float(data.get("tempo_max", 2.0))
+    rng = np.random.default_rng(int(data.get("semente", 0)))
+
+    regras, (Kp, tau, L) = regras_sintonia(*planta, ctrl_type)
+    sinal = np.sign(Kp)
+    escala = tau + L
+    dims = 3 if pid else 2
+    limites = {"K": [1e-3 / abs(Kp), 1e3 / abs(Kp)], "Ti": [1e-2 * escala, 1e2 * escala],
+               "Td": [1e-3 * escala, 1e2 * escala]}
+    limites.update(data.get("limites", {}))
+    # Busca em log: o limite inferior precisa ser positivo
+    inferior = np.log([max(float(limites[p][0]), 1e-9) for p in ("K", "Ti", "Td")][:dims])
+    superior = np.log([float(limites[p][1]) for p in ("K", "Ti", "Td")][:dims])
+    if np.any(superior < inferior):
+        raise ValueError("Limites de sintonia inválidos")
+
+    def parametros(X):
+        P = np.zeros((len(X), 3))
+        P[:, :dims] = np.exp(X)
+        P[:, 0] *= sinal
+        return P
+
+    # Grades comuns a todos os candidatos: horizonte de ~12 constantes de tempo da planta
+    T = np.linspace(0, 12 * escala, 400)
+    raizes = np.abs(np.concatenate([np.roots(planta[0]), np.roots(planta[1])]))
+    raizes = raizes[raizes > 0]
+    omega = np.logspace(np.log10(raizes.min() / 100), np.log10(max(raizes.max(), N) * 100), 400)
+
+    def avaliar(X):
+        r = _avaliar_candidatos(parametros(X), planta, T, omega, N, b, c, pid)
+        violacao = (np.maximum(r["sobressinal"] / max(sobressinal_max, 1e-9) - 1, 0)
+                    + np.maximum(r["ms"] / ms_max - 1, 0))
+        r["viavel"] = np.isfinite(r[criterio]) & (violacao == 0)
+        with np.errstate(invalid="ignore"):
+            r["custo"] = np.where(np.isfinite(r[criterio]), r[criterio] * (1 + 10 * violacao), np.inf)
+        return r
+
+    # Regras clássicas, depois amostras log-uniformes em torno delas
+    nomes = list(regras)
+    X_regras = np.log(np.abs([regras[n][:dims] for n in nomes]))
+    X_regras = np.clip(X_regras, inferior, superior)
+    resultado_regras = avaliar(X_regras)
+    centro = X_regras.mean(axis=0)
+    X = np.clip(centro + rng.uniform(-np.log(10), np.log(10), (lote, dims)), inferior, superior)
+
+    historico_X, historico = [X_regras], [resultado_regras]
+    media, desvio = centro, np.full(dims, np.log(10) / 2)
+    for i in range(iteracoes):
+        r = avaliar(X)
+        historico_X.append(X)
+        historico.append(r)
+        reportar_progresso((i + 1) / iteracoes, f"Iteração {i + 1} de {iteracoes}")
+        if time.perf_counter() - inicio > tempo_max or i == iteracoes - 1:
+            break
+        # Entropia cruzada: média e desvio das 10% melhores (suavizados), com piso no desvio
+        todos_X = np.concatenate(historico_X)
+        todos_custo = np.concatenate([h["custo"] for h in historico])
+        elite = todos_X[np.argsort(todos_custo)[:max(lote // 10, 2)]]
+        media = 0.7 * elite.mean(axis=0) + 0.3 * media
+        desvio = np.maximum(0.7 * elite.std(axis=0) + 0.3 * desvio, 0.02)
+        X = np.clip(media + desvio * rng.standard_normal((lote, dims)), inferior, superior)
+
+    todos_X = np.concatenate(historico_X)
+    todos = {chave: np.concatenate([h[chave] for h in historico])
+             for chave in ("iae", "itae", "sobressinal", "ms", "custo", "viavel", "y")}
+    P = parametros(todos_X)
+    viaveis = np.flatnonzero(todos["viavel"])
+    melhor = (viaveis[np.argmin(todos[criterio][viaveis])] if len(viaveis)
+              else int(np.argmin(todos["custo"])))
+
+    def descrever(i):
+        return {"K": P[i, 0], "Ti": P[i, 1], "Td": P[i, 2], "N": N,
+                "IAE": todos["iae"][i], "ITAE": todos["itae"][i],
+                "sobressinal": todos["sobressinal"][i], "Ms": todos["ms"][i],
+                "viavel": bool(todos["viavel"][i])}
+
+    pareto = _fronteira_pareto(todos[criterio], todos["ms"])
+    plot_respostas = {
+        "data": [{"x": T, "y": todos["y"][melhor], "mode": "lines", "name": "Melhor",
+                  "line": {"width": 3}}] + [
+            {"x": T, "y": resultado_regras["y"][j], "mode": "lines", "name": nome, "line": {"dash": "dot"}}
+            for j, nome in enumerate(nomes)
+        ],
+        "layout": {"title": "Resposta ao Degrau", "xaxis": {"title": "Tempo (s)"}, "yaxis": {"title": "y(t)"}}
+    }
+    plot_pareto = {
+        "data": [
+            {"x": todos["ms"][pareto], "y": todos[criterio][pareto], "mode": "lines+markers", "name": "Pareto"},
+            {"x": [todos["ms"][melhor]], "y": [todos[criterio][melhor]], "mode": "markers", "name": "Melhor",
+             "marker": {"size": 12, "symbol": "star"}},
+        ],
+        "layout": {"title": f"{criterio.upper()} × Ms", "xaxis": {"title": "Ms"},
+                   "yaxis": {"title": criterio.upper()}}
+    }
+    return {
+        "melhor": descrever(melhor),
+        "regras": {nome: descrever(j) for j, nome in enumerate(nomes)},
+        "pareto": [descrever(i) for i in pareto],
+        "modelo_primeira_ordem": {"K": Kp, "tau": tau, "L": L},
+        "avaliados": len(todos_X),
+        "tempo": time.perf_counter() - inicio,
+        "plot_respostas": plot_respostas,
+        "plot_pareto": plot_pareto,
+    }
+
+
+@app.route('/pid_autotune', methods=['POST'])
+def pid_autotune():
+    try:
+        return responder(calcular_pid_autotune(dados_requisicao()))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+# ---------------------------------------------------------------------------
+# Sessões de modelo
+# O cliente registra o modelo uma vez (POST /sessoes) e recebe um id curto; os
+# pedidos seguintes mandam só {"sessao": id, "alteracoes": {...}} no lugar do
+# modelo inteiro, em qualquer rota de análise. As alterações são sempre
+# relativas ao modelo registrado. A sessão guarda os parâmetros e
+# o ModeloLTI construído; como planta e controlador são fatores compartilhados
+# (FatorLTI), uma alteração só reconstrói o fator afetado.
+# ---------------------------------------------------------------------------
+
+class ErroSessao(Exception):
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+@app.errorhandler(ErroSessao)
+def tratar_erro_sessao(e):
+    return jsonify({"error": str(e)}), e.status
+
+
+# Campos de modelo aceitos nas alterações mesmo que o modelo registrado não os tenha
+_CAMPOS_MODELO = ("polos_planta", "zeros_planta", "polos_controlador", "zeros_controlador") + _PARAMETROS_ESCALARES
+
+
+def _aplicar_alteracoes(dados, alteracoes):
+    """
+    Novo dict de parâmetros com as alterações aplicadas: "campo": valor troca o
+    campo inteiro; "lista[i]": valor troca um item de polos/zeros e
+    "lista[i]": null remove o item. Campos que não são do modelo registrado
+    (nem de _CAMPOS_MODELO) são recusados, como os índices fora da lista.
+    """
+    dados = dict(dados)
+    for nome, valor in alteracoes.items():
+        indexado = _PARAMETRO_INDEXADO.match(nome)
+        if not indexado:
+            if nome not in dados and nome not in _CAMPOS_MODELO:
+                raise ErroSessao(f"Campo desconhecido no modelo: {nome}")
+            dados[nome] = valor
+            continue
+        lista, i = indexado.group(1), int(indexado.group(2))
+        itens = list(dados.get(lista, []))
+        if i > len(itens) or (i == len(itens) and valor is None):
+            raise ErroSessao(f"Índice fora da lista: {nome}")
+        if valor is None:
+            del itens[i]
+        elif i == len(itens):
+            itens.append(float(valor))
+        else:
+            itens[i] = float(valor)
+        dados[lista] = itens
+    return dados
+
+
+class SessaoModelo:
+    """
+    Parâmetros registrados de um modelo e o último ModeloLTI construído a
+    partir deles. As alterações de cada pedido são relativas aos parâmetros
+    registrados (não se acumulam), então pedidos que chegam fora de ordem não
+    se misturam; PATCH /sessoes/<id> é que muda a base.
+    """
+    def __init__(self, dados):
+        self.id = uuid.uuid4().hex[:12]
+        self.dados = dict(dados)
+        self.versao = 0
+        self.modelo = None
+        self._trava = threading.Lock()
+        self.resolver({})
+
+    @staticmethod
+    def _construir(d):
+        try:
+            return obter_modelo([float(p) for p in d.get("polos_planta", [])],
+                                [float(z) for z in d.get("zeros_planta", [])],
+                                float(d.get("ganho_planta", 1.0)),
+                                [float(p) for p in d.get("polos_controlador", [])],
+                                [float(z) for z in d.get("zeros_controlador", [])],
+                                float(d.get("ganho_controlador", 1.0)))
+        except (TypeError, ValueError):
+            # Sessões de outras páginas (coeficientes, massas...) só guardam os parâmetros
+            return None
+
+    def resolver(self, alteracoes):
+        """Parâmetros da base com as alterações aplicadas (sem mudar a base)."""
+        with self._trava:
+            dados = _aplicar_alteracoes(self.dados, alteracoes) if alteracoes else dict(self.dados)
+        modelo = self._construir(dados)
+        if modelo is not None:
+            # A sessão segura o modelo e o devolve ao cache, para as rotas o reencontrarem
+            self.modelo = modelo
+            _cache_modelos.obter_ou_criar(modelo.chave, lambda: modelo)
+        return dados
+
+    def atualizar(self, alteracoes):
+        with self._trava:
+            self.dados = _aplicar_alteracoes(self.dados, alteracoes)
+            self.versao += 1
+        self.resolver({})
+
+    def descrever(self):
+        return {"id": self.id, "versao": self.versao, "modelo": self.dados}
+
+
+_sessoes = CacheLRU(max_itens=512, ttl=1800)
+
+
+def resolver_sessao(dados):
+    """
+    Se `dados` referencia uma sessão ("sessao": id), aplica "alteracoes" e
+    devolve os parâmetros completos da sessão com os demais campos do pedido
+    por cima; senão devolve `dados` como veio.
+    """
+    if not isinstance(dados, dict) or "sessao" not in dados:
+        return dados
+    sessao = _sessoes.obter(dados["sessao"])
+    if sessao is None:
+        raise ErroSessao("Sessão não encontrada ou expirada", status=404)
+    completos = sessao.resolver(dados.get("alteracoes") or {})
+    completos.update((k, v) for k, v in dados.items() if k not in ("sessao", "alteracoes"))
+    return completos
+
+
+def dados_requisicao():
+    """Corpo JSON da requisição, já resolvido contra a sessão de modelo (se houver)."""
+    return resolver_sessao(request.get_json())
+
+
+@app.route('/sessoes', methods=['POST'])
+def criar_sessao():
+    data = request.get_json()
+    sessao = SessaoModelo(data.get("modelo", data))
+    _sessoes.guardar(sessao.id, sessao)
+    return jsonify(sessao.descrever()), 201
+
+
+@app.route('/sessoes/<ident>', methods=['GET', 'PATCH', 'DELETE'])
+def sessao_modelo(ident):
+    sessao = _sessoes.obter(ident)
+    if sessao is None:
+        return jsonify({"error": "Sessão não encontrada ou expirada"}), 404
+    if request.method == 'DELETE':
+        _sessoes.remover(ident)
+        return jsonify({"id": ident}), 200
+    if request.method == 'PATCH':
+        sessao.atualizar(request.get_json().get("alteracoes", {}))
+    return jsonify(sessao.descrever())
+
+# ---------------------------------------------------------------------------
+# Análise composta: uma requisição serve a página inteira
+# ---------------------------------------------------------------------------
+
+ANALISES = {
+    "atualizar_pagina4": calcular_atualizar_pagina4,
+    "atualizar_bode": calcular_atualizar_bode,
+    "atualizar_nyquist": calcular_atualizar_nyquist,
+    "atualizar_pz_closed": calcular_atualizar_pz_closed,
+    "nyquist_pagina2": calcular_nyquist_pagina2,
+    "nyquist_pagina4": calcular_nyquist_pagina4,
+    "atualizar_pagina2": calcular_atualizar_pagina2,
+    "alocacao_polos_backend": calcular_alocacao_polos_backend,
+    "novo_grafico_fechado": calcular_novo_grafico_fechado,
+    "lgr_backend": calcular_lgr_backend,
+    "lgr_consulta": calcular_lgr_consulta,
+    "step_backend": calcular_step_backend,
+    "pid_latex": calcular_pid_latex,
+    "pid_simular": calcular_pid_simular,
+    "varredura": calcular_varredura,
+    "robustez": calcular_robustez,
+    "pid_autotune": calcular_pid_autotune,
+    "state_equation": calcular_state_equation,
+}
+
+# NumPy/SciPy liberam o GIL nas rotinas pesadas, então threads bastam aqui
+_executor_analises = ThreadPoolExecutor(max_workers=4, thread_name_prefix="analise")
+
+
+def executar_analises(modelo, analises):
+    """
+    Executa em paralelo as análises pedidas sobre a mesma descrição de modelo.
+    Cada item de `analises` é o nome de uma análise (ver ANALISES) ou um dict
+    {"nome": ..., "id": ..., "parametros": {...}}; os parâmetros do item
+    sobrescrevem os do modelo apenas para aquela análise.
+    Retorna (resultados, erros), ambos indexados pelo id (ou nome) da análise.
+    """
+    tarefas = {}
+    erros = {}
+    for item in analises:
+        if isinstance(item, str):
+            item = {"nome": item}
+        nome = item.get("nome")
+        ident = item.get("id", nome)
+        if nome not in ANALISES:
+            erros[ident] = f"Análise desconhecida: {nome}"
+            continue
+        dados = dict(modelo)
+        dados.update(item.get("parametros", {}))
+        tarefas[ident] = _executor_analises.submit(ANALISES[nome], dados)
+
+    resultados = {}
+    for i, (ident, futuro) in enumerate(tarefas.items()):
+        try:
+            resultados[ident] = futuro.result()
+        except Exception as e:
+            print(f"Erro na análise {ident}:", e)
+            erros[ident] = str(e)
+        try:
+            reportar_progresso((i + 1) / len(tarefas), f"Análise {ident} concluída")
+        except TarefaCancelada:
+            for pendente in tarefas.values():
+                pendente.cancel()
+            raise
+    return resultados, erros
+
+
+# Refinamentos das respostas progressivas: futuros indexados pelo conteúdo do pedido.
+# Executor próprio, porque executar_analises espera pelo pool de análises.
+_executor_refinamento = ThreadPoolExecutor(max_workers=2, thread_name_prefix="refinamento")
+_refinamentos = CacheLRU(max_itens=64, ttl=120)
+
+
+@app.route('/analisar', methods=['POST'])
+def analisar():
+    """
+    Com "progressivo": true, responde primeiro uma prévia barata (poucos pontos
+    no tempo e em frequência) e deixa a versão completa sendo calculada em
+    segundo plano; "refinamento" traz a URL de onde buscá-la (GET).
+    """
+    data = request.get_json()
+    modelo = resolver_sessao(data.get("modelo", {}))
+    analises = data.get("analises", [])
+    if not isinstance(modelo, dict) or not isinstance(analises, list):
+        return jsonify({"error": "Esperado {'modelo': {...}, 'analises': [...]}"}), 400
+
+    if not data.get("progressivo"):
+        resultados, erros = executar_analises(modelo, analises)
+        return responder({"resultados": resultados, "erros": erros})
+
+    resultados, erros = executar_analises(dict(modelo, previa=True), analises)
+    # O refinamento só entra na fila depois da prévia, para não competir com ela
+    chave = _hash_conteudo(json.dumps([modelo, analises], sort_keys=True))
+    _refinamentos.obter_ou_criar(
+        chave, lambda: _executor_refinamento.submit(executar_analises, modelo, analises))
+    return responder({"resultados": resultados, "erros": erros, "previa": True,
+                      "refinamento": "/analisar/" + chave})
+
+
+@app.route('/analisar/<chave>')
+def analisar_refinamento(chave):
+    futuro = _refinamentos.obter(chave)
+    if futuro is None:
+        return jsonify({"error": "Refinamento não encontrado ou expirado"}), 404
+    resultados, erros = futuro.result()
+    return responder({"resultados": resultados, "erros": erros})
+
+# ---------------------------------------------------------------------------
+# Tarefas assíncronas
+# Análises longas podem ser submetidas como tarefas: POST /tarefas devolve um
+# id, o andamento é consultado em GET /tarefas/<id> (ou acompanhado por SSE em
+# /tarefas/<id>/eventos) e o resultado buscado em /tarefas/<id>/resultado.
+# Fila e resultados ficam no próprio processo (sem broker), num CacheLRU com
+# expiração; por isso o servidor deve rodar com um único processo e várias
+# threads (gunicorn --workers 1 --threads N).
+# ---------------------------------------------------------------------------
+
+class TarefaCancelada(Exception):
+    pass
+
+
+_tarefa_atual = threading.local()
+
+
+def reportar_progresso(fracao, mensagem=None):
+    """
+    Atualiza o progresso (0 a 1) da tarefa que roda nesta thread; fora de uma
+    tarefa não faz nada. Levanta TarefaCancelada se o cancelamento foi pedido,
+    então os cálculos longos devem chamá-la entre etapas.
+    """
+    tarefa = getattr(_tarefa_atual, "tarefa", None)
+    if tarefa is not None:
+        tarefa.atualizar(fracao, mensagem)
+
+
+class Tarefa:
+    ESTADOS_FINAIS = ("concluida", "erro", "cancelada")
+
+    def __init__(self, analise):
+        self.id = uuid.uuid4().hex
+        self.analise = analise
+        self.estado = "pendente"
+        self.progresso = 0.0
+        self.mensagem = ""
+        self.resultado = None
+        self.erro = None
+        self.criada = time.time()
+        self.inicio = None
+        self.fim = None
+        self.futuro = None
+        self.versao = 0
+        self._cancelamento = threading.Event()
+        self._condicao = threading.Condition()
+
+    def _publicar(self, **campos):
+        with self._condicao:
+            for nome, valor in campos.items():
+                setattr(self, nome, valor)
+            self.versao += 1
+            self._condicao.notify_all()
+
+    def atualizar(self, fracao, mensagem=None):
+        if self._cancelamento.is_set():
+            raise TarefaCancelada()
+        self._publicar(progresso=min(max(float(fracao), 0.0), 1.0),
+                       mensagem=self.mensagem if mensagem is None else mensagem)
+
+    def cancelar(self):
+        """Pede o cancelamento; tarefas ainda na fila são canceladas na hora."""
+        self._cancelamento.set()
+        if self.futuro is not None and self.futuro.cancel():
+            self._publicar(estado="cancelada", fim=time.time())
+
+    def esperar_mudanca(self, versao, timeout):
+        """Bloqueia até a versão mudar (ou o timeout vencer); devolve a versão atual."""
+        with self._condicao:
+            self._condicao.wait_for(lambda: self.versao != versao, timeout)
+            return self.versao
+
+    def executar(self, funcao, dados):
+        if self._cancelamento.is_set():
+            self._publicar(estado="cancelada", fim=time.time())
+            return
+        self._publicar(estado="executando", inicio=time.time())
+        _tarefa_atual.tarefa = self
+        try:
+            resultado = funcao(dados)
+        except TarefaCancelada:
+            self._publicar(estado="cancelada", fim=time.time())
+        except Exception as e:
+            print(f"Erro na tarefa {self.id}:", e)
+            self._publicar(estado="erro", erro=str(e), fim=time.time())
+        else:
+            self._publicar(estado="concluida", progresso=1.0, resultado=resultado, fim=time.time())
+        finally:
+            _tarefa_atual.tarefa = None
+
+    def situacao(self):
+        with self._condicao:
+            return {
+                "id": self.id,
+                "analise": self.analise,
+                "estado": self.estado,
+                "progresso": self.progresso,
+                "mensagem": self.mensagem,
+                "erro": self.erro,
+                "cancelamento_pedido": self._cancelamento.is_set(),
+                "criada": self.criada,
+                "inicio": self.inicio,
+                "fim": self.fim,
+                "resultado": f"/tarefas/{self.id}/resultado" if self.estado == "concluida" else None,
+            }
+
+
+_executor_tarefas = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tarefa")
+_tarefas = CacheLRU(max_itens=128, ttl=1800)
+
+
+def _analisar_composto(dados):
+    resultados, erros = executar_analises(dados.get("modelo", {}), dados.get("analises", []))
+    return {"resultados": resultados, "erros": erros}
+
+
+@app.route('/tarefas', methods=['POST'])
+def submeter_tarefa():
+    """
+    Submete {"analise": <nome em ANALISES>, "parametros": {...}} ou uma análise
+    composta {"modelo": {...}, "analises": [...]} (como /analisar).
+    Responde 202 com o id e as URLs da tarefa.
+    """
+    data = request.get_json()
+    # Sessões são resolvidas já na submissão: a tarefa roda sobre uma cópia dos parâmetros
+    if "analises" in data:
+        nome, funcao = "analisar", _analisar_composto
+        dados = dict(data, modelo=resolver_sessao(data.get("modelo", {})))
+    else:
+        nome = data.get("analise")
+        if nome not in ANALISES:
+            return jsonify({"error": f"Análise desconhecida: {nome}"}), 400
+        funcao, dados = ANALISES[nome], resolver_sessao(data.get("parametros", {}))
+
+    tarefa = Tarefa(nome)
+    _tarefas.guardar(tarefa.id, tarefa)
+    tarefa.futuro = _executor_tarefas.submit(tarefa.executar, funcao, dados)
+    return jsonify(dict(tarefa.situacao(), url=f"/tarefas/{tarefa.id}",
+                        eventos=f"/tarefas/{tarefa.id}/eventos")), 202
+
+
+def _obter_tarefa(ident):
+    tarefa = _tarefas.obter(ident)
+    if tarefa is None:
+        return None, (jsonify({"error": "Tarefa não encontrada ou expirada"}), 404)
+    return tarefa, None
+
+
+@app.route('/tarefas/<ident>', methods=['GET'])
+def situacao_tarefa(ident):
+    tarefa, erro = _obter_tarefa(ident)
+    return erro or jsonify(tarefa.situacao())
+
+
+@app.route('/tarefas/<ident>', methods=['DELETE'])
+def cancelar_tarefa(ident):
+    tarefa, erro = _obter_tarefa(ident)
+    if erro:
+        return erro
+    tarefa.cancelar()
+    return jsonify(tarefa.situacao())
+
+
+@app.route('/tarefas/<ident>/resultado')
+def resultado_tarefa(ident):
+    tarefa, erro = _obter_tarefa(ident)
+    if erro:
+        return erro
+    if tarefa.estado == "erro":
+        return jsonify({"error": tarefa.erro}), 500
+    if tarefa.estado != "concluida":
+        return jsonify(tarefa.situacao()), 409
+    return responder(tarefa.resultado)
+
+
+@app.route('/tarefas/<ident>/eventos')
+def eventos_tarefa(ident):
+    """Server-Sent Events: um evento "progresso" a cada mudança e um "fim" no estado final."""
+    tarefa, erro = _obter_tarefa(ident)
+    if erro:
+        return erro
+
+    def gerar():
+        versao = -1
+        while True:
+            atual = tarefa.esperar_mudanca(versao, timeout=15)
+            if atual == versao:
+                yield ": keep-alive\n\n"
+                continue
+            versao = atual
+            situacao = tarefa.situacao()
+            final = situacao["estado"] in Tarefa.ESTADOS_FINAIS
+            yield f"event: {'fim' if final else 'progresso'}\ndata: {json.dumps(situacao)}\n\n"
+            if final:
+                return
+
+    return Response(stream_with_context(gerar()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,33 @@
+// Decodifica o envelope binário das respostas (rotas chamadas com ?binario=1).
+// Cada {"$array": i} em "dados" vira um Float64Array/Float32Array (ou o eixo
+// uniforme reconstruído); respostas JSON comuns passam sem alteração.
+function decodificarResposta(resposta) {
+    if (!resposta || resposta.formato !== 'binario/1') return resposta;
+
+    const arrays = resposta.arrays.map(function (a) {
+        if (a.eixo) {
+            const [inicio, fim, n] = a.eixo;
+            const eixo = new Float64Array(n);
+            const passo = n > 1 ? (fim - inicio) / (n - 1) : 0;
+            for (let i = 0; i < n; i++) eixo[i] = inicio + i * passo;
+            eixo[n - 1] = fim;
+            return eixo;
+        }
+        const texto = atob(a.dados);
+        const bytes = new Uint8Array(texto.length);
+        for (let i = 0; i < texto.length; i++) bytes[i] = texto.charCodeAt(i);
+        return a.dtype === '<f4' ? new Float32Array(bytes.buffer) : new Float64Array(bytes.buffer);
+    });
+
+    function visitar(v) {
+        if (Array.isArray(v)) return v.map(visitar);
+        if (v && typeof v === 'object') {
+            if ('$array' in v) return arrays[v['$array']];
+            const saida = {};
+            for (const k in v) saida[k] = visitar(v[k]);
+            return saida;
+        }
+        return v;
+    }
+    return visitar(resposta.dados);
+}
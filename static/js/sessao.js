@@ -0,0 +1,56 @@
+// Sessão de modelo no servidor (/sessoes): o modelo é registrado uma vez e os
+// pedidos seguintes levam só {"sessao": id, "alteracoes": {...}}, com os
+// campos que diferem do modelo registrado (as alterações não se acumulam no
+// servidor, então respostas fora de ordem não importam). Listas do mesmo
+// tamanho de polos/zeros viram alterações por item ("polos_controlador[1]": -3.2);
+// o servidor recusa (400) campos que não são do modelo.
+function criarSessaoModelo() {
+    let id = null;
+    let registrado = null;
+
+    function copiar(modelo) {
+        return JSON.parse(JSON.stringify(modelo));
+    }
+
+    const LISTAS_POR_ITEM = /^(polos|zeros)_(planta|controlador)$/;
+
+    function diferencas(modelo) {
+        const alteracoes = {};
+        for (const campo in modelo) {
+            const novo = modelo[campo];
+            const antigo = registrado[campo];
+            if (JSON.stringify(novo) === JSON.stringify(antigo)) continue;
+            if (LISTAS_POR_ITEM.test(campo) && Array.isArray(novo) && Array.isArray(antigo)
+                    && novo.length === antigo.length) {
+                novo.forEach(function (v, i) {
+                    if (v !== antigo[i]) alteracoes[campo + '[' + i + ']'] = v;
+                });
+            } else {
+                alteracoes[campo] = novo;
+            }
+        }
+        return alteracoes;
+    }
+
+    return {
+        // Objeto para enviar no lugar do modelo completo
+        referencia: async function (modelo) {
+            if (id === null) {
+                const res = await fetch('/sessoes', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ modelo: modelo })
+                });
+                id = (await res.json()).id;
+                registrado = copiar(modelo);
+                return { sessao: id };
+            }
+            return { sessao: id, alteracoes: diferencas(modelo) };
+        },
+        // Sessão expirada no servidor (404): a próxima referência registra de novo
+        invalidar: function () {
+            id = null;
+            registrado = null;
+        }
+    };
+}
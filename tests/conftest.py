@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulador_flask  # noqa: E402
+
+
+@pytest.fixture
+def cliente():
+    simulador_flask.app.config["TESTING"] = True
+    return simulador_flask.app.test_client()
+
+
+def _sem_nao_finitos(texto):
+    # O json do Python aceita NaN/Infinity; JSON estrito não
+    def recusar(constante):
+        raise ValueError(f"valor não finito no JSON: {constante}")
+    import json
+    return json.loads(texto, parse_constant=recusar)
+
+
+@pytest.fixture
+def json_estrito():
+    """Decodifica a resposta recusando NaN, Infinity e -Infinity."""
+    def decodificar(resposta, status=200):
+        assert resposta.status_code == status, resposta.get_data(as_text=True)[:500]
+        return _sem_nao_finitos(resposta.get_data(as_text=True))
+    return decodificar
@@ -0,0 +1,57 @@
+"""Discretização comparada ao control.sample_system."""
+import warnings
+
+import control as ctl
+import numpy as np
+import pytest
+
+import simulador_flask as sf
+
+PLANTAS = [
+    ([1], [1, 1]),
+    ([4], [1, 1.2, 4]),
+    ([1, 2], [1, 3, 2, 1]),
+    ([-1, 1], [1, 3, 2]),
+    ([1], [1, 0]),
+    ([2, 1], [1, 0.4, 1]),
+]
+OMEGA = np.array([0.01, 0.3, 1.0, 2.0])
+
+
+def _resposta_z(b, a, z):
+    """b/a em potências de z⁻¹ avaliada em z."""
+    return (sum(bk * z**-k for k, bk in enumerate(b))
+            / sum(ak * z**-k for k, ak in enumerate(a)))
+
+
+def _sample_system(num, den, Ts, metodo, **opcoes):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return ctl.sample_system(ctl.tf(num, den), Ts, method=metodo, **opcoes)
+
+
+@pytest.mark.parametrize("num, den", PLANTAS)
+@pytest.mark.parametrize("Ts", [0.1, 0.5])
+@pytest.mark.parametrize("metodo, prewarp", [("zoh", None), ("foh", None), ("tustin", None), ("tustin", 2.0)])
+def test_igual_ao_sample_system(num, den, Ts, metodo, prewarp):
+    b, a = sf.discretizar(num, den, Ts, metodo, prewarp)
+    assert a[0] == 1.0 and len(b) == len(a)
+    referencia = _sample_system(num, den, Ts, metodo, **({"prewarp_frequency": prewarp} if prewarp else {}))
+    z = np.exp(1j * OMEGA * Ts)
+    np.testing.assert_allclose(_resposta_z(b, a, z), referencia(z), rtol=1e-8)
+
+
+@pytest.mark.parametrize("num, den", PLANTAS)
+@pytest.mark.parametrize("Ts", [0.1, 0.5])
+def test_casamento_de_polos_e_zeros(num, den, Ts):
+    b, a = sf.discretizar(num, den, Ts, "casado")
+    polos, zeros = np.roots(den), np.roots(num) if len(num) > 1 else np.array([])
+    np.testing.assert_allclose(np.sort_complex(np.roots(a)), np.sort_complex(np.exp(polos * Ts)), atol=1e-9)
+    # zeros finitos em e^{zTs}; dos que estão no infinito, todos menos um vão para z = −1
+    esperados = np.concatenate([np.exp(zeros * Ts), -np.ones(len(polos) - len(zeros) - 1)])
+    np.testing.assert_allclose(np.sort_complex(np.roots(np.trim_zeros(b, 'f'))), np.sort_complex(esperados),
+                               atol=1e-6)
+    if np.all(polos.real < 0):
+        # o python-control não põe zeros em −1, mas o ganho DC é o mesmo
+        referencia = _sample_system(num, den, Ts, "matched")
+        assert _resposta_z(b, a, 1.0) == pytest.approx(ctl.dcgain(referencia), rel=1e-9)
@@ -0,0 +1,43 @@
+"""Métricas analíticas da resposta ao degrau comparadas ao control.step_info numa grade fina."""
+import control as ctl
+import numpy as np
+import pytest
+
+import simulador_flask as sf
+
+PASSO = 5e-4
+T = np.arange(0, 30 + PASSO / 2, PASSO)
+
+CASOS = [
+    ([1], [1, 1]),
+    ([4], [1, 1.2, 4]),
+    ([1, 2], [1, 3, 2, 1]),
+    ([-1, 1], [1, 3, 2]),
+    ([2, 1], [1, 0.4, 1]),
+    ([1], [1, 6, 11, 6]),
+]
+
+
+@pytest.mark.parametrize("num, den", CASOS)
+def test_igual_ao_step_info(num, den):
+    info = sf.info_degrau(num, den)
+    sistema = ctl.tf(num, den)
+    ref = ctl.step_info(sistema, T=T)
+    ref_5 = ctl.step_info(sistema, T=T, SettlingTimeThreshold=0.05)
+    assert info["estavel"]
+    assert info["valor_final"] == pytest.approx(ref["SteadyStateValue"], rel=1e-9)
+    assert info["tempo_subida"] == pytest.approx(ref["RiseTime"], abs=2 * PASSO)
+    assert info["tempo_assentamento"]["2%"] == pytest.approx(ref["SettlingTime"], abs=2 * PASSO)
+    assert info["tempo_assentamento"]["5%"] == pytest.approx(ref_5["SettlingTime"], abs=2 * PASSO)
+    assert info["pico"] == pytest.approx(ref["Peak"], rel=1e-6)
+    assert info["sobressinal"] == pytest.approx(ref["Overshoot"], abs=1e-5)
+    assert info["subsinal"] == pytest.approx(ref["Undershoot"], abs=1e-5)
+    if info["tempo_pico"] is not None:
+        assert info["tempo_pico"] == pytest.approx(ref["PeakTime"], abs=2 * PASSO)
+
+
+@pytest.mark.parametrize("den", [[1, 0, 1], [1, -1], [1, 0]])
+def test_instavel_ou_marginal_sem_metricas(den):
+    info = sf.info_degrau([1], den)
+    assert not info["estavel"]
+    assert info["tempo_subida"] is None and info["tempo_assentamento"]["2%"] is None
@@ -0,0 +1,78 @@
+"""As rotas devolvem JSON estrito (sem NaN/Infinity) também para plantas nos casos limite."""
+import pytest
+
+import simulador_flask as sf
+
+
+@pytest.mark.parametrize("den", [[1, 0, 1], [1, 0, 4, 0], [1, 0, 1, 0, 4]])
+@pytest.mark.parametrize("previa", [False, True])
+def test_bode_de_planta_nao_amortecida(cliente, json_estrito, den, previa):
+    resposta = cliente.post('/sinais_backend', json={"num": [1], "den": den, "bode": True, "previa": previa})
+    dados = json_estrito(resposta)
+    assert dados["bode_data"]["data"][0]["y"]
+
+
+@pytest.mark.parametrize("sistema", [
+    {"masses": [1.0]},
+    {"masses": [1.0], "dampers": [{"from": 0, "to": -1, "c": 0.5}]},
+    {"masses": [1.0, 2.0], "springs": [{"from": 0, "to": 1, "k": 3.0}], "dampers": [{"from": 0, "to": 1, "c": 0.1}]},
+    {"masses": [1.0] * 30, "springs": [{"from": i, "to": i + 1, "k": 1.0} for i in range(29)]},
+])
+def test_massas_com_modo_de_corpo_rigido(cliente, json_estrito, sistema):
+    dados = json_estrito(cliente.post('/state_equation', json=sistema))
+    assert dados["frequencias_naturais"][0] == 0.0
+    assert dados["amortecimentos"][0] is None
+    assert all(z is not None for z in dados["amortecimentos"][1:])
+    # o polo duplo em 0 não é tomado por instável: horizonte de 10 períodos do modo elástico mais lento
+    elasticos = [w for w in dados["frequencias_naturais"] if w > 0]
+    horizonte = 10 * 2 * 3.141592653589793 / min(elasticos) if elasticos else 10.0
+    assert dados["T"][-1] == pytest.approx(horizonte)
+
+
+PLANTAS_LIMITE = {
+    "integrador": {"polos_planta": [0.0], "zeros_planta": []},
+    "duplo_integrador": {"polos_planta": [0.0, 0.0], "zeros_planta": []},
+    "instavel": {"polos_planta": [1.0, -2.0], "zeros_planta": []},
+    "instavel_em_malha_fechada": {"polos_planta": [2.0, 3.0], "zeros_planta": [], "ganho_controlador": 0.1},
+    "fase_nao_minima": {"polos_planta": [-1.0, -2.0], "zeros_planta": [1.0]},
+    "controlador_duplo_integrador": {"polos_planta": [-1.0], "zeros_planta": [], "polos_controlador": [0.0, 0.0]},
+}
+PARAMETROS_ANALISE = {
+    "varredura": {"varrer": [{"nome": "ganho_controlador", "valores": [0.1, 1, 10, 100]}]},
+    "robustez": {"amostras": 50},
+    "pid_autotune": {"tempo_max": 0.3, "iteracoes": 2, "lote": 32},
+    "lgr_consulta": {"ponto": [-0.5, 0.5], "zeta": 0.5},
+    "state_equation": {"masses": [1.0]},
+}
+
+
+def _planta_estavel(planta):
+    return all(p < 0 for p in planta["polos_planta"])
+
+
+@pytest.mark.parametrize("previa", [False, True])
+@pytest.mark.parametrize("rota", sorted(sf.ANALISES))
+@pytest.mark.parametrize("planta", sorted(PLANTAS_LIMITE))
+def test_rotas_de_analise_em_plantas_limite(cliente, json_estrito, planta, rota, previa):
+    corpo = dict(PLANTAS_LIMITE[planta], previa=previa, **PARAMETROS_ANALISE.get(rota, {}))
+    resposta = cliente.post('/' + rota, json=corpo)
+    # a sintonia automática recusa plantas instáveis ou integradoras, também em JSON estrito
+    status = 400 if rota == "pid_autotune" and not _planta_estavel(PLANTAS_LIMITE[planta]) else 200
+    json_estrito(resposta, status)
+
+
+@pytest.mark.parametrize("planta", sorted(PLANTAS_LIMITE))
+def test_analisar_todas_as_analises(cliente, json_estrito, planta):
+    analises = [{"nome": nome, "parametros": PARAMETROS_ANALISE.get(nome, {})} for nome in sorted(sf.ANALISES)]
+    dados = json_estrito(cliente.post('/analisar', json={"modelo": PLANTAS_LIMITE[planta], "analises": analises}))
+    assert set(dados["resultados"]) | set(dados["erros"]) == set(sf.ANALISES)
+
+
+@pytest.mark.parametrize("den", [[1, 0, 1], [1, 0], [1, 0, 0], [1, -1], [1, 0, 4, 0]])
+@pytest.mark.parametrize("rota, corpo", [
+    ("sinais_backend", {"bode": True}),
+    ("simular_saida", {}),
+    ("atualizar_discreto", {}),
+])
+def test_rotas_por_polinomios_em_plantas_limite(cliente, json_estrito, den, rota, corpo):
+    json_estrito(cliente.post('/' + rota, json=dict(corpo, num=[1], den=den)))
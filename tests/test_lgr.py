@@ -0,0 +1,40 @@
+"""Lugar das raízes: consulta por ramo no índice do LGR."""
+import numpy as np
+import pytest
+
+import simulador_flask as sf
+
+
+@pytest.fixture
+def indice():
+    # polos em −1 e −2: separação em −1,5 e ramos verticais ±j a partir dela
+    num, den = [1.0], np.poly([-1.0, -2.0])
+    return sf.IndiceLGR(num, den, sf.lugar_raizes(num, den))
+
+
+def test_ponto_sem_ramo_segue_o_mais_proximo(indice):
+    ponto = indice.ponto_mais_proximo(complex(-1.5, -0.5))
+    assert ponto["polo"][1] < 0
+    assert ponto["k"] == pytest.approx(0.5, rel=1e-2)
+
+
+def test_ramo_restringe_a_busca(indice):
+    inferior = next(i for i, r in enumerate(indice.ramos) if np.imag(r[-1]) < 0)
+    superior = 1 - inferior
+    s = complex(-1.5, -0.5)
+    assert indice.ponto_mais_proximo(s, inferior)["polo"][1] < 0
+    # no outro ramo, o ponto mais próximo de s é a separação, não o polo conjugado
+    ponto = indice.ponto_mais_proximo(s, superior)
+    assert ponto["polo"][1] >= -1e-6
+    assert ponto["k"] == pytest.approx(0.25, abs=0.02)
+    # o ganho devolvido é consistente com os polos de malha fechada
+    polos = np.roots(np.polyadd(np.poly([-1.0, -2.0]), [ponto["k"]]))
+    assert np.min(np.abs(polos - complex(*ponto["polo"]))) < 1e-6
+
+
+def test_rota_de_consulta_aceita_ramo(cliente, json_estrito):
+    dados = {"polos_planta": [-1, -2], "tipo": "malha_aberta", "ponto": [-1.5, -0.5]}
+    sem_ramo = json_estrito(cliente.post('/lgr_consulta', json=dados))["ponto"]
+    com_ramo = [json_estrito(cliente.post('/lgr_consulta', json=dict(dados, ramo=i)))["ponto"] for i in (0, 1)]
+    assert sem_ramo["polo"][1] < 0
+    assert sorted(np.sign(round(p["polo"][1], 6)) for p in com_ramo) == [-1, 0]
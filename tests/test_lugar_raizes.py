@@ -0,0 +1,58 @@
+"""Lugar das raízes: ramos e pontos notáveis comparados ao python-control."""
+import control as ctl
+import numpy as np
+import pytest
+from scipy.optimize import linear_sum_assignment
+
+import simulador_flask as sf
+
+SISTEMAS = [
+    ([], [0, -1, -2]),
+    ([], [-1, -2]),
+    ([-4], [-1, -2, -3]),
+    ([-1], [0, 0, -6]),
+    ([], [0, -4, -2 + 4j, -2 - 4j]),
+    ([-2 + 1j, -2 - 1j], [1, -1, -5]),
+]
+
+
+def _polinomios(zeros, polos):
+    return np.real(np.poly(zeros)) if zeros else np.array([1.0]), np.real(np.poly(polos))
+
+
+@pytest.mark.parametrize("zeros, polos", SISTEMAS)
+def test_ramos_sao_as_raizes_de_malha_fechada(zeros, polos):
+    num, den = _polinomios(zeros, polos)
+    lgr = sf.lugar_raizes(num, den)
+    referencia = ctl.root_locus_map(ctl.tf(num, den), lgr["ganhos"]).loci
+    np.testing.assert_allclose(np.sort_complex(lgr["ramos"][:, 0]), np.sort_complex(np.roots(den)), atol=1e-9)
+    for j in range(len(lgr["ganhos"])):
+        distancia = np.abs(lgr["ramos"][:, j][:, None] - referencia[j][None, :])
+        linhas, colunas = linear_sum_assignment(distancia)
+        # raízes múltiplas (separação) só são determinadas até ~√ε
+        assert distancia[linhas, colunas].max() < 1e-6 * lgr["escala"]
+
+
+@pytest.mark.parametrize("zeros, polos", SISTEMAS)
+def test_pontos_notaveis(zeros, polos):
+    num, den = _polinomios(zeros, polos)
+    assintotas, separacao, cruzamentos = sf.pontos_notaveis_lgr(num, den)
+    excesso = len(polos) - len(zeros)
+    assert assintotas["centroide"] == pytest.approx(np.real(np.sum(polos) - np.sum(zeros)) / excesso)
+    assert len(assintotas["angulos"]) == excesso
+    for ponto in separacao:
+        # raiz dupla da malha fechada no ganho de separação
+        raizes = ctl.feedback(ctl.tf(ponto["k"] * num, den), 1).poles()
+        assert ponto["k"] > 0
+        assert np.sort(np.abs(raizes - ponto["s"]))[1] < 1e-4 * max(1.0, abs(ponto["s"]))
+    for cruzamento in cruzamentos:
+        raizes = ctl.feedback(ctl.tf(cruzamento["k"] * num, den), 1).poles()
+        assert np.min(np.abs(raizes - 1j * cruzamento["omega"])) < 1e-6 * max(1.0, cruzamento["omega"])
+
+
+def test_pontos_notaveis_conhecidos():
+    # 1/(s(s+1)(s+2)): separação em −1 + 1/√3 e cruzamento em ω = √2 com K = 6
+    assintotas, separacao, cruzamentos = sf.pontos_notaveis_lgr([1.0], np.poly([0, -1, -2]))
+    assert assintotas == {"centroide": pytest.approx(-1.0), "angulos": pytest.approx([60, 180, 300])}
+    assert [p["s"] for p in separacao] == [pytest.approx(-1 + 1 / np.sqrt(3))]
+    assert [(c["omega"], c["k"]) for c in cruzamentos] == [(pytest.approx(np.sqrt(2)), pytest.approx(6.0))]
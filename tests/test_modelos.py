@@ -0,0 +1,87 @@
+"""Camada de modelos LTI: grade de ω compartilhada entre ganhos e memória limitada e sem recálculo."""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import simulador_flask as sf
+
+
+@pytest.mark.parametrize("polos, ganho", [([-1, -2, -5], 30.0), ([-1, -2, -5], 100.0), ([-1, -2, -5], 1000.0),
+                                          ([-1, -2, -5], 1e5), ([0, -1, -2], 0.5), ([0, -1, -2], 50.0)])
+def test_grade_refina_o_cruzamento_do_ganho_real(polos, ganho):
+    modelo = sf.obter_modelo(polos, [], 1.0, [], [], ganho)
+    omega = modelo.grade_frequencia("aberta")
+    mag_db = sf.resposta_frequencia(*modelo.fatores("aberta"), omega)["mag_db"]
+    cruza = np.flatnonzero(np.sign(mag_db[1:]) != np.sign(mag_db[:-1]))
+    assert cruza.size
+    assert np.log10(omega[cruza + 1] / omega[cruza]).max() <= 1e-3 * (1 + 1e-9)
+
+
+def test_grade_de_ganho_unitario_e_compartilhada():
+    modelos = [sf.obter_modelo([-1, -2, -5], [], 1.0, [-0.5], [-3], k) for k in np.logspace(-1, 2, 40)]
+    bases = set()
+    for modelo in modelos:
+        base = modelo.familia.grade_frequencia("aberta", sf._decada_cruzamento(*modelo.fatores("aberta")))
+        bases.add(id(base))
+        # cada modelo só acrescenta os pontos da bisseção do seu cruzamento
+        omega = modelo.grade_frequencia("aberta")
+        assert np.all(np.isin(base, omega))
+        assert len(omega) - len(base) <= 20
+    # o ganho só escolhe a década final da faixa (aqui, 1 ou 2)
+    assert len(bases) <= 2
+
+
+def test_grade_contem_o_cruzamento_de_ganho():
+    modelo = sf.obter_modelo([-1, -2], [], 1.0, [], [], 1e6)
+    resposta = modelo.frequencia("aberta", modelo.grade_frequencia("aberta"))
+    assert resposta["mag_db"][0] > 0 > resposta["mag_db"][-1]
+
+
+def test_resposta_escalada_igual_a_direta():
+    modelo = sf.obter_modelo([-1, -2, -5], [-3], 1.0, [0.0], [-0.5], 37.0)
+    omega = modelo.grade_frequencia("aberta")
+    escalada = modelo.frequencia("aberta", omega)
+    direta = sf.resposta_frequencia(*modelo.fatores("aberta"), omega)
+    np.testing.assert_allclose(escalada["mag_db"], direta["mag_db"], atol=1e-9)
+    np.testing.assert_allclose(escalada["fase"], direta["fase"], atol=1e-9)
+
+
+def test_memoria_por_grade_e_limitada():
+    modelo = sf.obter_modelo([-1, -3], [], 1.0, [], [], 2.0)
+    for n in range(3 * sf.MAX_GRADES_MEMO):
+        omega = np.logspace(-2, 2, 50 + n)
+        modelo.frequencia("aberta", omega)
+        modelo.frequencia("fechada", omega)
+        modelo.degrau("fechada", np.linspace(0, 10, 50 + n))
+    for dono in (modelo, modelo.familia, modelo.familia.planta):
+        assert len(dono._por_grade) <= sf.MAX_GRADES_MEMO
+    # a grade mais recente continua memorizada
+    assert modelo.frequencia("aberta", omega) is modelo.frequencia("aberta", omega)
+
+
+def test_item_por_grade_calculado_uma_vez_em_paralelo():
+    modelo = sf.obter_modelo([-1, -7], [], 1.0, [], [], 3.0)
+    grade = np.linspace(0, 1, 17)
+    chamadas = []
+    barreira = threading.Barrier(6)
+
+    def fabrica():
+        chamadas.append(1)
+        time.sleep(0.05)
+        return grade * 2
+
+    def consultar(resultados):
+        barreira.wait()
+        resultados.append(modelo._memo_grade("teste", grade, fabrica))
+
+    resultados = []
+    threads = [threading.Thread(target=consultar, args=(resultados,)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(chamadas) == 1
+    assert all(r is resultados[0] for r in resultados)
+    assert not modelo._travas
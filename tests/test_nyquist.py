@@ -0,0 +1,35 @@
+"""Critério de Nyquist: voltas N, P e Z comparados ao python-control."""
+import warnings
+
+import control as ctl
+import numpy as np
+import pytest
+
+import simulador_flask as sf
+
+CASOS = [
+    ([-1, -2, -3], [], 10),
+    ([-1, -2, -3], [], 100),
+    ([1, -2], [], 3),
+    ([1, -2], [], 1),
+    ([0, -1], [], 2),
+    ([0, 0, -1], [-0.2], 1),
+    ([1j, -1j, -1], [], 0.5),
+    ([-1 + 2j, -1 - 2j, -0.5], [-3], 20),
+    ([2, 3], [-1], 10),
+    ([0, -1, -5], [], 50),
+]
+
+
+@pytest.mark.parametrize("polos, zeros, ganho", CASOS)
+def test_contagem_igual_ao_python_control(polos, zeros, ganho):
+    resultado = sf.diagrama_nyquist(polos, zeros, ganho)
+    L = ctl.zpk(zeros, polos, ganho)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        voltas = ctl.nyquist_response(L).count
+    instaveis_fechada = int(np.sum(ctl.feedback(L, 1).poles().real > 1e-9))
+    assert resultado["voltas"] == voltas
+    assert resultado["polos_instaveis_aberta"] == int(np.sum(np.real(polos) > 1e-9))
+    assert resultado["polos_instaveis_fechada"] == instaveis_fechada
+    assert resultado["polos_instaveis_fechada"] == resultado["polos_instaveis_aberta"] + resultado["voltas"]
@@ -0,0 +1,120 @@
+"""Malha PID: realização em espaço de estados, atuador limitado e anti-windup."""
+import numpy as np
+import pytest
+
+import simulador_flask as sf
+
+
+def _malha_linear(num, den, ctrl_type, T, r, d):
+    A, B, C, D = sf.ss_malha_pid(num, den, ctrl_type, 3.0, 0.8, 0.2, 10, 0.5, 0.0)
+    return sf.simular_ss(A, B, C, D, T, np.stack([r, d]))
+
+
+@pytest.mark.parametrize("ctrl_type", ["P", "PI", "PID"])
+def test_sem_limites_reproduz_a_malha_linear(ctrl_type):
+    num, den = sf.obter_modelo([-1, -2]).polinomios("planta")
+    erros = []
+    for dt in (1e-2, 1e-3):
+        T = np.arange(0, 10 + dt / 2, dt)
+        r, d = np.ones_like(T), 0.5 * (T >= 5)
+        y, u, v, e = sf.simular_pid_saturado(num, den, ctrl_type, 3.0, 0.8, 0.2, 10, 0.5, 0.0, T, r, d)
+        y_lin, u_lin, e_lin = _malha_linear(num, den, ctrl_type, T, r, d)
+        np.testing.assert_array_equal(u, v)
+        erros.append(max(np.abs(y - y_lin).max(), np.abs(u - u_lin).max(), np.abs(e - e_lin).max()))
+    # o controlador discretizado com a entrada retida converge em O(dt)
+    assert erros[1] < 2e-3
+    assert erros[0] / erros[1] == pytest.approx(10, rel=0.2)
+
+
+def _degrau_saturado(antiwindup, **limites):
+    T = np.arange(0, 10 + 5e-4, 1e-3)
+    return sf.simular_pid_saturado([1.0], [1.0, 1.0], "PI", 5.0, 0.5, 0.0, 10, 1.0, 0.0, T,
+                                   np.ones_like(T), np.zeros_like(T), antiwindup=antiwindup, **limites)
+
+
+def test_anti_windup_reduz_o_sobressinal():
+    picos = {}
+    for antiwindup in ("nenhum", "condicional", "retrocalculo"):
+        y, u, v, e = _degrau_saturado(antiwindup, u_min=-1.2, u_max=1.2)
+        assert u.max() <= 1.2 and u.min() >= -1.2
+        picos[antiwindup] = y.max()
+    assert picos["nenhum"] > 1.15
+    assert picos["condicional"] < 1.01
+    assert picos["retrocalculo"] < 1.05
+
+
+def test_limite_de_taxa():
+    y, u, v, e = _degrau_saturado("retrocalculo", taxa_max=2.0)
+    assert np.abs(np.diff(u)).max() <= 2.0 * 1e-3 * (1 + 1e-9)
+    assert np.abs(y[-1] - 1.0) < 1e-2
+
+
+def test_rota_com_saturacao(cliente, json_estrito):
+    dados = json_estrito(cliente.post('/pid_simular', json={
+        "polos_planta": [-1], "ctrl_type": "PI", "ctrl_k": 5, "ctrl_ti": 0.5,
+        "saturacao": {"u_min": -1.2, "u_max": 1.2, "antiwindup": "condicional"}}))
+    atuador = next(t for t in dados["plot_controlador"]["data"] if t["name"] == "Saída do Atuador")
+    assert max(atuador["y"]) <= 1.2 + 1e-12
+    assert 0 < dados["saturacao"]["fracao_saturado"] < 1
+
+
+@pytest.mark.parametrize("ctrl_type", ["P", "I", "PI", "PD", "PID"])
+@pytest.mark.parametrize("planta", [([1.0], [1.0, 3.0, 2.0]), ([1.0, 2.0], [1.0, 1.0]), ([-1.0, 1.0], [1.0, 0.5, 0.0])])
+def test_espaco_de_estados_igual_as_fts_da_malha(ctrl_type, planta):
+    num_p, den_p = planta
+    K, Ti, Td, N, b, c = 2.0, 1.5, 0.3, 8.0, 0.6, 0.2
+    A, B, C, D = sf.ss_malha_pid(num_p, den_p, ctrl_type, K, Ti, Td, N, b, c)
+    num_y, den_c = sf.polinomios_pid(ctrl_type, K, Ti, Td, N)
+    num_r, _ = sf.polinomios_pid(ctrl_type, K, Ti, Td, N, b, c)
+    for s in (0.3j, 1.0 + 2.0j, 7.0j, -0.2 + 0.5j):
+        P = np.polyval(num_p, s) / np.polyval(den_p, s)
+        Cr, Cy = np.polyval(num_r, s) / np.polyval(den_c, s), np.polyval(num_y, s) / np.polyval(den_c, s)
+        S = 1.0 / (1.0 + Cy * P)
+        # linhas [y, u, e], colunas [r, d]
+        esperado = np.array([[Cr * P * S, P * S],
+                             [Cr * S, -Cy * P * S],
+                             [1.0 - Cr * P * S, -P * S]])
+        H = C @ np.linalg.solve(s * np.eye(len(A)) - A, B) + D
+        np.testing.assert_allclose(H, esperado, rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("ctrl_type, polos", [("PID", [-1, -2, -3]), ("PI", [-0.5, -4]), ("PID", [-1, -1, -1, -1])])
+def test_sintonia_automatica_cumpre_as_restricoes(ctrl_type, polos):
+    dados = {"polos_planta": polos, "zeros_planta": [], "ctrl_type": ctrl_type, "semente": 3,
+             "iteracoes": 6, "lote": 64, "tempo_max": 60, "sobressinal_max": 10, "ms_max": 1.6}
+    resultado = sf.calcular_pid_autotune(dados)
+    melhor = resultado["melhor"]
+    assert melhor["viavel"]
+    N, b, c = 10.0, 0.5, 0.0
+    num_p, den_p = np.array([1.0]), np.poly(polos)
+    num_y, den_c = sf.polinomios_pid(ctrl_type, melhor["K"], melhor["Ti"], melhor["Td"], N)
+    num_r, _ = sf.polinomios_pid(ctrl_type, melhor["K"], melhor["Ti"], melhor["Td"], N, b, c)
+    den_malha = np.polyadd(np.polymul(den_c, den_p), np.polymul(num_y, num_p))
+    # malha fechada estável
+    assert np.all(np.roots(den_malha).real < 0)
+    # sobressinal exato da resposta à referência (a busca o mede na grade de tempo)
+    info = sf.info_degrau(np.polymul(num_r, num_p), den_malha)
+    assert info["sobressinal"] <= dados["sobressinal_max"] + 0.5
+    # Ms numa grade fina, independente da grade da busca
+    s = 1j * np.logspace(-3, 3, 20000)
+    L = np.polyval(num_y, s) * np.polyval(num_p, s) / (np.polyval(den_c, s) * np.polyval(den_p, s))
+    assert np.abs(1 / (1 + L)).max() <= dados["ms_max"] * 1.01
+    assert melhor["Ms"] == pytest.approx(np.abs(1 / (1 + L)).max(), rel=1e-2)
+
+    # fronteira de Pareto: nenhum ponto domina outro em (critério, Ms)
+    pareto = [(p["IAE"], p["Ms"]) for p in resultado["pareto"]]
+    assert pareto
+    for i, (a_i, m_i) in enumerate(pareto):
+        for j, (a_j, m_j) in enumerate(pareto):
+            if i != j:
+                assert not (a_j <= a_i and m_j <= m_i and (a_j < a_i or m_j < m_i))
+
+    # com a mesma semente e sem limite de tempo efetivo, o resultado se repete
+    assert sf.calcular_pid_autotune(dados)["melhor"] == melhor
+
+
+def test_sintonia_respeita_o_orcamento_de_tempo():
+    resultado = sf.calcular_pid_autotune({"polos_planta": [-1, -2, -3], "zeros_planta": [], "lote": 32,
+                                          "iteracoes": 50, "tempo_max": 0})
+    # uma iteração só: as regras clássicas mais um lote
+    assert resultado["avaliados"] == len(resultado["regras"]) + 32
@@ -0,0 +1,151 @@
+"""Resposta das rotas: envelope binário (ida e volta) e redução de curvas por LTTB."""
+import base64
+
+import numpy as np
+import pytest
+
+import simulador_flask as sf
+
+MODELO = {"polos_planta": [-1.0, -2.0], "zeros_planta": [-3.0], "polos_controlador": [-5.0],
+          "zeros_controlador": [-0.5], "ganho_controlador": 4.0}
+ANALISES = ["atualizar_pagina4", "atualizar_bode", "nyquist_pagina4", "step_backend", "lgr_backend",
+            {"nome": "robustez", "parametros": {"amostras": 100}}]
+
+
+def decodificar(envelope):
+    """O mesmo que o decodificarResposta do navegador: $array → lista."""
+    assert envelope["formato"] == "binario/1"
+    arrays = []
+    for descricao in envelope["arrays"]:
+        if "eixo" in descricao:
+            inicio, fim, n = descricao["eixo"]
+            arrays.append(np.linspace(inicio, fim, n))
+        else:
+            dados = np.frombuffer(base64.b64decode(descricao["dados"]), dtype=descricao["dtype"])
+            arrays.append(dados.reshape(descricao["shape"]).astype(float))
+
+    def visitar(v):
+        if isinstance(v, dict):
+            if set(v) == {"$array"}:
+                return arrays[v["$array"]].tolist()
+            return {k: visitar(x) for k, x in v.items()}
+        if isinstance(v, list):
+            return [visitar(x) for x in v]
+        return v
+    return visitar(envelope["dados"])
+
+
+def _comparar(a, b, rtol, caminho=""):
+    if isinstance(a, dict):
+        assert set(a) == set(b), caminho
+        for k in a:
+            _comparar(a[k], b[k], rtol, f"{caminho}.{k}")
+    elif isinstance(a, list):
+        assert len(a) == len(b), caminho
+        for i, (x, y) in enumerate(zip(a, b)):
+            _comparar(x, y, rtol, f"{caminho}[{i}]")
+    elif isinstance(a, float) and rtol:
+        assert b == pytest.approx(a, rel=rtol, abs=1e-30), caminho
+    else:
+        assert a == b, caminho
+
+
+def _analisar(cliente, consulta=""):
+    resposta = cliente.post('/analisar' + consulta, json={"modelo": MODELO, "analises": ANALISES})
+    assert resposta.status_code == 200
+    return resposta.get_json()
+
+
+@pytest.mark.parametrize("consulta, rtol", [("?binario=1", 0), ("?binario=f4", 2e-7)])
+def test_envelope_binario_reproduz_o_json(cliente, consulta, rtol):
+    json_comum = _analisar(cliente)
+    envelope = _analisar(cliente, consulta)
+    if rtol == 0:
+        assert any("eixo" in d for d in envelope["arrays"])
+    assert any(d.get("dtype") == ("<f8" if rtol == 0 else "<f4") for d in envelope["arrays"])
+    _comparar(json_comum, decodificar(envelope), rtol)
+
+
+def test_envelope_pelo_cabecalho_accept(cliente):
+    resposta = cliente.post('/analisar', json={"modelo": MODELO, "analises": ["atualizar_bode"]},
+                            headers={"Accept": sf.TIPO_BINARIO})
+    assert resposta.get_json()["formato"] == "binario/1"
+
+
+def test_eixos_uniformes_e_arrays_repetidos():
+    T = np.linspace(0, 2, 101)
+    y = np.sin(T) ** 2
+    envelope = sf.codificar_binario({"a": {"x": T, "y": y}, "b": {"x": T, "y": y.copy()}, "curta": [1.0, 2.0]})
+    assert envelope["arrays"][0] == {"eixo": [0.0, 2.0, 101]}
+    # a segunda ocorrência de T e de y aponta para a mesma entrada
+    assert envelope["dados"]["a"] == envelope["dados"]["b"]
+    assert len(envelope["arrays"]) == 2
+    assert envelope["dados"]["curta"] == [1.0, 2.0]
+    np.testing.assert_array_equal(decodificar(envelope)["b"]["y"], y)
+
+
+def _curvas(rng, n=5000):
+    x = np.cumsum(rng.uniform(0.5, 1.5, n))
+    y1 = np.cumsum(rng.standard_normal(n))
+    y2 = np.sin(x / 50) + 0.01 * rng.standard_normal(n)
+    y2[rng.integers(n)] = 7.0  # pico isolado
+    return x, y1, y2
+
+
+@pytest.mark.parametrize("semente", range(5))
+def test_lttb_mantem_extremos_e_alinhamento(semente):
+    x, y1, y2 = _curvas(np.random.default_rng(semente))
+    reduzido = sf.reduzir_curvas({"x": x, "y1": y1, "y2": y2, "rotulo": "curva"}, 200)
+    indices = np.searchsorted(x, reduzido["x"])
+    np.testing.assert_array_equal(x[indices], reduzido["x"])
+    # séries no mesmo eixo: mesmos índices para todas
+    np.testing.assert_array_equal(reduzido["y1"], y1[indices])
+    np.testing.assert_array_equal(reduzido["y2"], y2[indices])
+    for original, serie in ((y1, reduzido["y1"]), (y2, reduzido["y2"])):
+        assert serie.max() == original.max() and serie.min() == original.min()
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert len(indices) <= 2 * (200 + 2)
+    assert reduzido["rotulo"] == "curva"
+
+
+def test_curvas_com_nao_finitos_ficam_inteiras():
+    x = np.arange(1000.0)
+    y = np.sin(x)
+    y[10] = np.inf
+    reduzido = sf.reduzir_curvas({"x": x, "y": y}, 50)
+    assert len(reduzido["x"]) == 1000
+
+
+def _grupos(cheio, reduzido, caminho=""):
+    """Pares (caminho, dict completo, dict reduzido) com eixo x e séries do mesmo tamanho."""
+    if isinstance(cheio, list):
+        for i, (a, b) in enumerate(zip(cheio, reduzido)):
+            yield from _grupos(a, b, f"{caminho}[{i}]")
+        return
+    if not isinstance(cheio, dict):
+        return
+    for k in cheio:
+        yield from _grupos(cheio[k], reduzido[k], f"{caminho}.{k}")
+    eixo = next((k for k in sf._EIXOS_X if k in cheio), None)
+    if eixo is not None and isinstance(cheio[eixo], list):
+        yield caminho, eixo, cheio, reduzido
+
+
+def test_pontos_reduz_cada_grupo_alinhado(cliente):
+    cheio = _analisar(cliente)
+    reduzido = _analisar(cliente, "?pontos=40")
+    reduzidos = 0
+    for caminho, eixo, a, b in _grupos(cheio, reduzido):
+        n, m = len(a[eixo]), len(b[eixo])
+        series = [k for k, v in a.items()
+                  if k != eixo and isinstance(v, list) and len(v) == n and v and all(
+                      isinstance(x, (int, float)) for x in v)]
+        for k in series:
+            assert len(b[k]) == m, (caminho, k)
+        if m < n:
+            reduzidos += 1
+            indices = [a[eixo].index(x) for x in b[eixo]]
+            for k in series:
+                assert b[k] == [a[k][i] for i in indices], (caminho, k)
+                assert max(b[k]) == max(a[k]) and min(b[k]) == min(a[k]), (caminho, k)
+    assert reduzidos > 5
@@ -0,0 +1,28 @@
+"""Monte Carlo de robustez: envelopes alinhados ao próprio eixo e JSON estrito."""
+import numpy as np
+import pytest
+
+PLANTA_INCERTA = {"polos_planta": [-1, -2], "amostras": 200,
+                  "incertezas": {"polos_planta": {"distribuicao": "normal", "desvio": 0.6}}}
+
+
+@pytest.mark.parametrize("consulta", ["", "?pontos=40"])
+def test_percentis_acompanham_o_proprio_eixo(cliente, json_estrito, consulta):
+    dados = json_estrito(cliente.post('/robustez' + consulta, json=PLANTA_INCERTA))
+    assert len(dados["nominal"]) == len(dados["T"])
+    percentis = dados["percentis"]
+    for chave in ("5", "50", "95"):
+        assert len(percentis[chave]) == len(percentis["T"])
+    assert np.all(np.diff(percentis["T"]) > 0)
+    assert np.all(np.asarray(percentis["5"]) <= np.asarray(percentis["95"]) + 1e-9)
+    if consulta:
+        assert len(percentis["T"]) < 200
+
+
+@pytest.mark.parametrize("consulta", ["", "?pontos=40"])
+def test_todas_instaveis_devolve_percentis_nulos(cliente, json_estrito, consulta):
+    dados = json_estrito(cliente.post('/robustez' + consulta, json={"polos_planta": [1, 2], "amostras": 50}))
+    assert dados["instaveis"] == 50
+    assert [dados["percentis"][c] for c in ("5", "50", "95")] == [None] * 3
+    assert dados["sobressinal"]["percentis"] == []
+    assert [traco["name"] for traco in dados["plot_envelope"]["data"]] == ["Nominal"]
@@ -0,0 +1,87 @@
+"""Sessões de modelo: sintaxe das alterações, base não cumulativa e equivalência ao modelo completo."""
+import pytest
+
+import simulador_flask as sf
+
+MODELO = {"polos_planta": [-1.0, -2.0], "zeros_planta": [], "polos_controlador": [-5.0],
+          "zeros_controlador": [-0.5], "ganho_controlador": 2.0, "t_perturb_fechada": 5.0}
+ANALISES = ["atualizar_pagina4", "atualizar_bode", "nyquist_pagina4",
+            {"nome": "atualizar_pz_closed", "parametros": {"tipo": "fechada"}}]
+
+
+@pytest.fixture
+def sessao(cliente):
+    resposta = cliente.post('/sessoes', json={"modelo": MODELO})
+    assert resposta.status_code == 201
+    return resposta.get_json()["id"]
+
+
+def _analisar(cliente, modelo):
+    return cliente.post('/analisar', json={"modelo": modelo, "analises": ANALISES})
+
+
+def _modelo_resolvido(sessao, alteracoes):
+    """Parâmetros completos que as rotas recebem para essas alterações."""
+    with sf.app.test_request_context():
+        return sf.resolver_sessao({"sessao": sessao, "alteracoes": alteracoes})
+
+
+@pytest.mark.parametrize("alteracoes, esperado", [
+    ({"ganho_controlador": 7.0}, {"ganho_controlador": 7.0}),
+    ({"polos_planta": [-3.0]}, {"polos_planta": [-3.0]}),
+    ({"polos_planta[1]": -4.0}, {"polos_planta": [-1.0, -4.0]}),
+    ({"polos_planta[0]": None}, {"polos_planta": [-2.0]}),
+    ({"zeros_planta[0]": -6.0}, {"zeros_planta": [-6.0]}),
+    ({"polos_controlador[1]": -9.0, "zeros_controlador[0]": None},
+     {"polos_controlador": [-5.0, -9.0], "zeros_controlador": []}),
+    ({"ctrl_k": 3.0}, {"ctrl_k": 3.0}),
+])
+def test_sintaxe_das_alteracoes(cliente, sessao, alteracoes, esperado):
+    assert _modelo_resolvido(sessao, alteracoes) == dict(MODELO, **esperado)
+
+
+@pytest.mark.parametrize("alteracoes", [
+    {"polos_planta[3]": -1.0},
+    {"polos_planta[2]": None},
+    {"nao_existe": 3},
+    {"masses[0]": 1.0},
+])
+def test_alteracoes_invalidas_sao_recusadas(cliente, sessao, alteracoes):
+    resposta = _analisar(cliente, {"sessao": sessao, "alteracoes": alteracoes})
+    assert resposta.status_code == 400
+    assert "error" in resposta.get_json()
+    resposta = cliente.patch(f'/sessoes/{sessao}', json={"alteracoes": alteracoes})
+    assert resposta.status_code == 400
+    # a base não muda com um PATCH recusado
+    assert cliente.get(f'/sessoes/{sessao}').get_json() == {"id": sessao, "versao": 0, "modelo": MODELO}
+
+
+def test_alteracoes_nao_se_acumulam_e_patch_muda_a_base(cliente, sessao):
+    assert _modelo_resolvido(sessao, {"polos_planta[0]": -3.0})["polos_planta"] == [-3.0, -2.0]
+    # relativas à base registrada, não ao pedido anterior
+    assert _modelo_resolvido(sessao, {"polos_planta[1]": -4.0})["polos_planta"] == [-1.0, -4.0]
+    assert _modelo_resolvido(sessao, {})["polos_planta"] == [-1.0, -2.0]
+
+    resposta = cliente.patch(f'/sessoes/{sessao}', json={"alteracoes": {"polos_planta[0]": -3.0}})
+    assert resposta.get_json() == {"id": sessao, "versao": 1, "modelo": dict(MODELO, polos_planta=[-3.0, -2.0])}
+    assert _modelo_resolvido(sessao, {"polos_planta[1]": -4.0})["polos_planta"] == [-3.0, -4.0]
+
+
+def test_resposta_igual_a_do_modelo_completo(cliente, sessao):
+    alteracoes = {"polos_planta[1]": -4.0, "ganho_controlador": 3.5, "zeros_controlador[1]": -2.0}
+    completo = dict(MODELO, polos_planta=[-1.0, -4.0], ganho_controlador=3.5, zeros_controlador=[-0.5, -2.0])
+    por_sessao = _analisar(cliente, {"sessao": sessao, "alteracoes": alteracoes})
+    direto = _analisar(cliente, completo)
+    assert por_sessao.status_code == direto.status_code == 200
+    assert por_sessao.get_data() == direto.get_data()
+
+
+def test_sessao_removida_devolve_404_e_pode_ser_registrada_de_novo(cliente, sessao):
+    assert cliente.delete(f'/sessoes/{sessao}').status_code == 200
+    assert cliente.get(f'/sessoes/{sessao}').status_code == 404
+    resposta = _analisar(cliente, {"sessao": sessao, "alteracoes": {}})
+    assert resposta.status_code == 404
+    # como o sessao.js faz ao receber 404: registra de novo e repete o pedido
+    nova = cliente.post('/sessoes', json={"modelo": MODELO}).get_json()["id"]
+    assert nova != sessao
+    assert _analisar(cliente, {"sessao": nova, "alteracoes": {"ganho_controlador": 3.0}}).status_code == 200
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+import scipy.linalg
+import scipy.signal
+
+from simulador_flask import obter_modelo, simular_ss, simular_tf
+
+
+def _dlsim(num, den, T, u):
+    sistema = scipy.signal.cont2discrete((num, den), T[1] - T[0], method="zoh")
+    return scipy.signal.dlsim(sistema, u, t=T)[1][:, 0]
+
+
+@pytest.mark.parametrize("num, den", [
+    ([1], [1, 1]),
+    ([1, 2], [1, 2, 5]),
+    ([2, 1, 3], [1, 3, 3, 1]),
+    ([1], [1, 0]),          # integrador: raio espectral 1
+    ([1], [1, -1]),         # instável: a resposta cresce como e^t
+])
+def test_simular_tf_igual_a_dlsim(num, den):
+    T = np.linspace(0, 20, 801)
+    u = np.sin(T) + (T > 3)
+    esperado = _dlsim(num, den, T, u)
+    obtido = simular_tf(num, den, T, u)
+    escala = np.maximum(np.abs(esperado), 1.0)
+    assert np.all(np.abs(obtido - esperado) <= 1e-9 * escala)
+
+
+def test_resposta_crescente_preserva_amostras_iniciais():
+    # Pela FFT, o erro absoluto nas primeiras amostras seria da ordem de 1e6
+    T = np.linspace(0, 50, 1001)
+    y = simular_tf([1], [1, -1], T, np.ones_like(T))
+    exato = np.expm1(T)
+    assert np.all(np.abs(y - exato) <= 1e-9 * np.maximum(exato, 1.0))
+
+
+def test_simular_ss_em_lote():
+    T = np.linspace(0, 10, 401)
+    A = np.array([[[-1.0]], [[-3.0]]])
+    B = np.ones((2, 1, 1))
+    C = np.array([[[2.0]], [[1.0]]])
+    D = np.zeros((2, 1, 1))
+    U = np.stack([np.ones_like(T), np.cos(T)])[:, None, :]
+    y = simular_ss(A, B, C, D, T, U, memorizar=False)
+    assert np.allclose(y[0, 0], _dlsim([2], [1, 1], T, U[0, 0]), atol=1e-12)
+    assert np.allclose(y[1, 0], _dlsim([1], [1, 3], T, U[1, 0]), atol=1e-12)
+
+
+def _simular_por_trechos(num, den, T, degraus):
+    """
+    Simulação direta de u(t) = Σ aᵢ·1(t − tᵢ): em cada trecho de entrada
+    constante, o estado sai exato da exponencial do sistema aumentado
+    [[A, B], [0, 0]], partindo do estado alcançado em tᵢ.
+    """
+    A, B, C, D = scipy.signal.tf2ss(num, den)
+    n = len(A)
+    aumentada = np.zeros((n + 1, n + 1))
+    aumentada[:n, :n], aumentada[:n, n:] = A, B
+    instantes = sorted(t for t, _ in degraus)
+    y = np.zeros(len(T))
+    for k, t in enumerate(T):
+        z, inicio = np.zeros(n + 1), 0.0
+        for tk in instantes:
+            if tk > t:
+                break
+            z = scipy.linalg.expm(aumentada * (tk - inicio)) @ z
+            z[n] += sum(a for ti, a in degraus if ti == tk)
+            inicio = tk
+        z = scipy.linalg.expm(aumentada * (t - inicio)) @ z
+        y[k] = C[0] @ z[:n] + D[0, 0] * z[n]
+    return y
+
+
+@pytest.mark.parametrize("qual", ["planta", "fechada"])
+@pytest.mark.parametrize("t_perturb", [2.0, 2.0 + 0.37 * 0.05, 3.1234])
+def test_degrau_deslocado_igual_a_simulacao_direta(qual, t_perturb):
+    modelo = obter_modelo([-1.0, -0.4], [-3.0], 2.0, [-6.0], [-0.8], 1.5)
+    T = np.linspace(0, 20, 401)
+    degraus = [(0.0, 1.0), (t_perturb, -0.6)]
+    superposta = modelo.degraus(qual, T, degraus)
+    direta = _simular_por_trechos(*modelo.polinomios(qual), T, degraus)
+    # o degrau age em t_perturb mesmo entre amostras; só resta o erro da interpolação linear (O(dt²))
+    np.testing.assert_allclose(superposta, direta, rtol=0, atol=1e-9 * np.abs(direta).max())
+    # antes do degrau de perturbação, é exatamente a resposta ao degrau
+    antes = T < t_perturb
+    np.testing.assert_allclose(superposta[antes], modelo.degrau(qual, T)[antes], rtol=0, atol=1e-12)
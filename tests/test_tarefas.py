@@ -0,0 +1,152 @@
+"""Tarefas assíncronas: ciclo 202 → progresso → resultado, cancelamento e eventos SSE."""
+import json
+import threading
+import time
+
+import pytest
+
+import simulador_flask as sf
+
+
+def _esperar(cliente, ident, condicao, timeout=10.0):
+    limite = time.monotonic() + timeout
+    while True:
+        situacao = cliente.get(f'/tarefas/{ident}').get_json()
+        if condicao(situacao):
+            return situacao
+        assert time.monotonic() < limite, situacao
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def analise_controlada(monkeypatch):
+    """Análise de teste que informa 25%, espera `liberar` e informa 75% antes de terminar."""
+    liberar = threading.Event()
+
+    def analise(dados):
+        sf.reportar_progresso(0.25, "começou")
+        assert liberar.wait(10)
+        sf.reportar_progresso(0.75, "quase")
+        if dados.get("falhar"):
+            raise ValueError("falha pedida")
+        return {"dobro": 2 * dados["valor"]}
+
+    monkeypatch.setitem(sf.ANALISES, "teste_controlada", analise)
+    yield liberar
+    liberar.set()
+
+
+def _submeter(cliente, analise, parametros):
+    resposta = cliente.post('/tarefas', json={"analise": analise, "parametros": parametros})
+    assert resposta.status_code == 202
+    dados = resposta.get_json()
+    assert dados["url"] == f"/tarefas/{dados['id']}" and dados["eventos"] == f"/tarefas/{dados['id']}/eventos"
+    return dados["id"]
+
+
+def test_ciclo_completo_igual_a_rota_direta(cliente):
+    parametros = {"polos_planta": [-1, -2], "amostras": 200,
+                  "incertezas": {"ganho_planta": {"distribuicao": "normal", "desvio": 0.1}}}
+    ident = _submeter(cliente, "robustez", parametros)
+    situacao = _esperar(cliente, ident, lambda s: s["estado"] in sf.Tarefa.ESTADOS_FINAIS)
+    assert situacao["estado"] == "concluida" and situacao["progresso"] == 1.0
+    assert situacao["resultado"] == f"/tarefas/{ident}/resultado"
+    resultado = cliente.get(situacao["resultado"])
+    assert resultado.status_code == 200
+    assert resultado.get_json() == cliente.post('/robustez', json=parametros).get_json()
+
+
+def test_progresso_intermediario(cliente, analise_controlada):
+    ident = _submeter(cliente, "teste_controlada", {"valor": 21})
+    situacao = _esperar(cliente, ident, lambda s: s["progresso"] == 0.25)
+    assert situacao["estado"] == "executando" and situacao["mensagem"] == "começou"
+    assert cliente.get(f'/tarefas/{ident}/resultado').status_code == 409
+    analise_controlada.set()
+    _esperar(cliente, ident, lambda s: s["estado"] == "concluida")
+    assert cliente.get(f'/tarefas/{ident}/resultado').get_json() == {"dobro": 42}
+
+
+def test_cancelamento_durante_a_execucao(cliente, analise_controlada):
+    ident = _submeter(cliente, "teste_controlada", {"valor": 1})
+    _esperar(cliente, ident, lambda s: s["progresso"] == 0.25)
+    situacao = cliente.delete(f'/tarefas/{ident}').get_json()
+    # o pedido fica registrado; a tarefa só para no próximo reportar_progresso
+    assert situacao["cancelamento_pedido"] and situacao["estado"] == "executando"
+    analise_controlada.set()
+    situacao = _esperar(cliente, ident, lambda s: s["estado"] in sf.Tarefa.ESTADOS_FINAIS)
+    assert situacao["estado"] == "cancelada" and situacao["progresso"] == 0.25
+    assert situacao["resultado"] is None
+    assert cliente.get(f'/tarefas/{ident}/resultado').status_code == 409
+
+
+def test_cancelamento_na_fila(cliente, analise_controlada):
+    # ocupa os trabalhadores; a próxima tarefa fica na fila e é cancelada na hora
+    ocupadas = [_submeter(cliente, "teste_controlada", {"valor": i}) for i in range(sf._executor_tarefas._max_workers)]
+    for ident in ocupadas:
+        _esperar(cliente, ident, lambda s: s["estado"] == "executando")
+    na_fila = _submeter(cliente, "teste_controlada", {"valor": 9})
+    assert cliente.get(f'/tarefas/{na_fila}').get_json()["estado"] == "pendente"
+    assert cliente.delete(f'/tarefas/{na_fila}').get_json()["estado"] == "cancelada"
+    assert cliente.get(f'/tarefas/{na_fila}/resultado').status_code == 409
+    analise_controlada.set()
+    for ident in ocupadas:
+        _esperar(cliente, ident, lambda s: s["estado"] == "concluida")
+    assert cliente.get(f'/tarefas/{na_fila}').get_json()["estado"] == "cancelada"
+
+
+def test_erro_na_analise(cliente, analise_controlada):
+    analise_controlada.set()
+    ident = _submeter(cliente, "teste_controlada", {"valor": 1, "falhar": True})
+    situacao = _esperar(cliente, ident, lambda s: s["estado"] in sf.Tarefa.ESTADOS_FINAIS)
+    assert situacao["estado"] == "erro" and situacao["erro"] == "falha pedida"
+    resposta = cliente.get(f'/tarefas/{ident}/resultado')
+    assert resposta.status_code == 500 and resposta.get_json() == {"error": "falha pedida"}
+
+
+def test_tarefa_e_analise_desconhecidas(cliente):
+    assert cliente.post('/tarefas', json={"analise": "nao_existe"}).status_code == 400
+    for url in ('/tarefas/nao_existe', '/tarefas/nao_existe/resultado', '/tarefas/nao_existe/eventos'):
+        assert cliente.get(url).status_code == 404
+    assert cliente.delete('/tarefas/nao_existe').status_code == 404
+
+
+def test_reportar_progresso_fora_de_tarefa_nao_faz_nada():
+    sf.reportar_progresso(0.5, "sem tarefa")
+
+
+def _eventos(resposta):
+    """Decodifica o fluxo SSE em (evento, dados), ignorando os comentários de keep-alive."""
+    for bloco in resposta.response:
+        bloco = bloco.decode() if isinstance(bloco, bytes) else bloco
+        assert bloco.endswith("\n\n")
+        if bloco.startswith(":"):
+            continue
+        linhas = dict(linha.split(": ", 1) for linha in bloco.strip().split("\n"))
+        yield linhas["event"], json.loads(linhas["data"])
+
+
+def test_eventos_sse(cliente, analise_controlada):
+    ident = _submeter(cliente, "teste_controlada", {"valor": 5})
+    _esperar(cliente, ident, lambda s: s["progresso"] == 0.25)
+    resposta = cliente.get(f'/tarefas/{ident}/eventos')
+    assert resposta.status_code == 200
+    assert resposta.mimetype == "text/event-stream"
+    assert resposta.headers["Cache-Control"] == "no-cache"
+    recebidos = []
+    for evento, situacao in _eventos(resposta):
+        recebidos.append((evento, situacao["estado"], situacao["progresso"]))
+        # o primeiro evento é o estado atual; libera a tarefa para gerar os seguintes
+        analise_controlada.set()
+    resposta.close()
+    assert recebidos[0] == ("progresso", "executando", 0.25)
+    assert recebidos[-1] == ("fim", "concluida", 1.0)
+    assert all(evento == "progresso" for evento, _, _ in recebidos[:-1])
+    progressos = [p for _, _, p in recebidos]
+    assert progressos == sorted(progressos)
+
+
+def test_eventos_de_tarefa_ja_terminada(cliente, analise_controlada):
+    analise_controlada.set()
+    ident = _submeter(cliente, "teste_controlada", {"valor": 5})
+    _esperar(cliente, ident, lambda s: s["estado"] == "concluida")
+    assert [(e, s["estado"]) for e, s in _eventos(cliente.get(f'/tarefas/{ident}/eventos'))] == [("fim", "concluida")]